@@ -0,0 +1,36 @@
+"""Add respondent, type, period index
+
+Revision ID: 3f6c2a9d1b47
+Revises: 8d8b323fc0f8
+Create Date: 2026-10-19 09:12:31.482115
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = "3f6c2a9d1b47"
+down_revision: Union[str, None] = "8d8b323fc0f8"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index(
+        "ix_energy_data_respondent_type_period",
+        "energy_data",
+        ["respondent", "type", "period"],
+        unique=False,
+        if_not_exists=True,
+    )
+
+
+def downgrade() -> None:
+    op.drop_index(
+        "ix_energy_data_respondent_type_period",
+        table_name="energy_data",
+        if_exists=True,
+    )
@@ -0,0 +1,137 @@
+import asyncio
+import logging
+import os
+import secrets
+from datetime import datetime
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Query
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import PlainTextResponse
+
+from energy_dashboard.admission import admission
+from energy_dashboard.cluster import cluster
+from energy_dashboard.hot_store import hot_store
+from energy_dashboard.profiler import (
+    PROFILE_INTERVAL_MS,
+    PROFILE_MAX_REQUESTS,
+    profiler,
+)
+from energy_dashboard.slow_queries import slow_query_log
+from energy_dashboard.snapshot import snapshot
+
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+log = logging.getLogger(__name__)
+
+# Admin endpoints need it in the X-Admin-Token header; while it is unset
+# they are not served at all
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
+
+
+def require_admin(x_admin_token: str = Header(None)):
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not secrets.compare_digest(x_admin_token or "", ADMIN_TOKEN):
+        raise HTTPException(status_code=403, detail="Admin token required")
+
+
+router = APIRouter(prefix="/api/v1/admin", dependencies=[Depends(require_admin)])
+
+
+@router.get("/slow-queries")
+async def list_slow_queries(
+    limit: int = Query(50, ge=1, le=1000),
+    min_seconds: float = Query(0.0, ge=0),
+    since: datetime = Query(None),
+    contains: str = Query(None),
+):
+    """
+    The newest statements over the slow query threshold, with their plans.
+    """
+    return await run_in_threadpool(
+        slow_query_log.recent, limit, min_seconds, since, contains
+    )
+
+
+@router.get("/slow-queries/top")
+async def top_slow_queries(
+    limit: int = Query(20, ge=1, le=1000),
+    since: datetime = Query(None),
+):
+    """
+    Slow statements grouped by text, by total time spent.
+    """
+    return await run_in_threadpool(slow_query_log.top, limit, since)
+
+
+@router.delete("/slow-queries")
+async def clear_slow_queries():
+    return {"deleted": await run_in_threadpool(slow_query_log.clear)}
+
+
+@router.get("/admission")
+async def admission_status():
+    """
+    Slots in use and queue depth per admission lane.
+    """
+    return admission.status()
+
+
+@router.get("/cluster")
+async def cluster_status():
+    """
+    This worker's place in the cluster and the state of its caches.
+    """
+    return dict(
+        cluster.status(),
+        hot_store=hot_store.stats(),
+        snapshot_version=snapshot.version,
+    )
+
+
+@router.post("/profile")
+async def start_profile(
+    path: str = Query(...),
+    requests: int = Query(1, ge=1, le=PROFILE_MAX_REQUESTS),
+    interval_ms: float = Query(PROFILE_INTERVAL_MS, ge=0.1, le=1000),
+):
+    """
+    Sample stacks while the next ``requests`` requests to ``path`` run.
+    """
+    return profiler.arm(path, requests, interval_ms).status()
+
+
+@router.get("/profile/status")
+async def profile_status():
+    session = profiler.session
+    if session is None:
+        raise HTTPException(status_code=404, detail="Profiler is not armed")
+    return session.status()
+
+
+@router.get("/profile", response_class=PlainTextResponse)
+async def get_profile(wait: float = Query(0.0, ge=0, le=600)):
+    """
+    The samples so far as folded stacks, for flamegraph.pl or speedscope.
+    With ``wait``, first wait up to that many seconds for the profiled
+    requests to finish.
+    """
+    session = profiler.session
+    if session is None:
+        raise HTTPException(status_code=404, detail="Profiler is not armed")
+    if wait and not session.finished:
+        await asyncio.to_thread(session.done.wait, wait)
+    return PlainTextResponse(
+        session.folded(),
+        headers={
+            "X-Profile-Samples": str(session.samples),
+            "X-Profile-Finished": str(session.finished).lower(),
+        },
+    )
+
+
+@router.delete("/profile")
+async def stop_profile():
+    profiler.disarm()
+    return {"armed": False}
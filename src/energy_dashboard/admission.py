@@ -0,0 +1,341 @@
+import asyncio
+import collections
+import logging
+import math
+import os
+import time
+from typing import Callable, Deque, Dict, List, Optional, Tuple
+
+from fastapi import Request
+from fastapi.responses import JSONResponse
+
+from energy_dashboard.metrics import (
+    ADMISSION_IN_FLIGHT,
+    ADMISSION_QUEUE_DEPTH,
+    ADMISSION_REJECTED_TOTAL,
+    ADMISSION_WAIT_SECONDS,
+)
+
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+log = logging.getLogger(__name__)
+
+ADMISSION_ENABLED = os.getenv("ADMISSION_ENABLED", "true").lower() == "true"
+# Requests admitted at once over every lane
+ADMISSION_CAPACITY = int(os.getenv("ADMISSION_CAPACITY", "32"))
+# Header naming the client, such as X-Forwarded-For behind a proxy; the peer
+# address is used when unset or missing
+ADMISSION_CLIENT_HEADER = os.getenv("ADMISSION_CLIENT_HEADER")
+
+INTERACTIVE = "interactive"
+PROMPT = "prompt"
+BATCH = "batch"
+
+# Scope key of the callback that hands a request's slot back early
+RELEASE_SCOPE_KEY = "admission.release"
+
+# Lane of each admission-controlled path; paths ending in "/" also cover
+# everything below them. Anything else, like pages, assets, /metrics and
+# the admin API, is never held back.
+ROUTE_LANES = {
+    "/stream-chart": INTERACTIVE,
+    "/analytics-chart": INTERACTIVE,
+    "/api/v1/analytics/": INTERACTIVE,
+    "/energy_data": INTERACTIVE,
+    "/energy_data/rows": INTERACTIVE,
+    "/api/v1/stream-energy-data": INTERACTIVE,
+    "/instruct-stream-chart": PROMPT,
+    "/api/v1/seed-data/": BATCH,
+    "/api/v1/gaps": BATCH,
+    "/api/v1/backfill": BATCH,
+}
+
+
+def lane_setting(lane: str, name: str, default: float) -> float:
+    return float(os.getenv(f"ADMISSION_{lane.upper()}_{name}", default))
+
+
+class Lane:
+    """
+    One class of requests: how many may run at once, how many may wait and
+    for how long, and how many of either one client may have.
+
+    A request keeps its slot until its response is complete, unless the
+    handler hands it back earlier through ``admission_release``.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        priority: int,
+        limit: int,
+        queue_size: int,
+        timeout: float,
+        client_limit: int,
+    ):
+        self.name = name
+        self.priority = priority
+        self.limit = limit
+        self.queue_size = queue_size
+        self.timeout = timeout
+        self.client_limit = client_limit
+        self.active = 0
+        self.waiters: Deque[Tuple[str, asyncio.Future]] = collections.deque()
+        self.clients: collections.Counter = collections.Counter()
+
+    @classmethod
+    def from_env(
+        cls,
+        name: str,
+        priority: int,
+        limit: int,
+        queue_size: int,
+        timeout: float,
+        client_limit: int,
+    ) -> "Lane":
+        return cls(
+            name,
+            priority,
+            int(lane_setting(name, "LIMIT", limit)),
+            int(lane_setting(name, "QUEUE", queue_size)),
+            lane_setting(name, "TIMEOUT", timeout),
+            int(lane_setting(name, "CLIENT_LIMIT", client_limit)),
+        )
+
+    def status(self) -> Dict:
+        return {
+            "priority": self.priority,
+            "limit": self.limit,
+            "active": self.active,
+            "queued": len(self.waiters),
+            "queue_size": self.queue_size,
+            "timeout": self.timeout,
+            "client_limit": self.client_limit,
+            "clients": len(self.clients),
+        }
+
+
+class Rejected(Exception):
+    def __init__(self, status_code: int, reason: str, retry_after: float):
+        super().__init__(reason)
+        self.status_code = status_code
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    """
+    Admits requests to a shared pool of slots by lane priority. A slot that
+    frees up goes to the oldest waiter of the most important lane that is
+    under its own limit, so interactive reads overtake queued prompts and
+    prompts overtake batch jobs, while each lane's limit keeps a burst of
+    one class from taking every slot.
+
+    Load is shed before any work is done: a client over its quota gets 429,
+    a full queue or a wait past the lane's timeout gets 503.
+    """
+
+    def __init__(self, capacity: int, lanes: List[Lane]):
+        self.capacity = capacity
+        self.lanes = {lane.name: lane for lane in lanes}
+        self.active = 0
+        self._by_priority = sorted(lanes, key=lambda lane: lane.priority)
+
+    def _can_run(self, lane: Lane) -> bool:
+        return lane.active < lane.limit and self.active < self.capacity
+
+    def _waiting_before(self, lane: Lane) -> bool:
+        """
+        Whether a waiter of this or a more important lane could take a slot.
+        """
+        for other in self._by_priority:
+            if other.priority > lane.priority:
+                return False
+            if other.waiters and self._can_run(other):
+                return True
+        return False
+
+    async def acquire(self, lane: Lane, client: str):
+        """
+        Wait for a slot in ``lane``, raising Rejected if the request is shed.
+        """
+        if lane.clients[client] >= lane.client_limit:
+            raise Rejected(429, "client_quota", 1)
+        if self._can_run(lane) and not self._waiting_before(lane):
+            self._grant(lane, client)
+            return
+        if len(lane.waiters) >= lane.queue_size:
+            raise Rejected(503, "queue_full", lane.timeout)
+
+        waiter = asyncio.get_running_loop().create_future()
+        lane.waiters.append((client, waiter))
+        lane.clients[client] += 1
+        began = time.perf_counter()
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter), lane.timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as exc:
+            if waiter.done():
+                # Granted as the wait ended; hand the slot on
+                self.release(lane, client)
+            else:
+                waiter.cancel()
+                lane.waiters.remove((client, waiter))
+                self._forget(lane, client)
+            if isinstance(exc, asyncio.CancelledError):
+                raise
+            raise Rejected(503, "timeout", lane.timeout) from None
+        finally:
+            ADMISSION_WAIT_SECONDS.observe(time.perf_counter() - began, lane=lane.name)
+
+    def _grant(self, lane: Lane, client: str, waiter: Optional[asyncio.Future] = None):
+        lane.active += 1
+        self.active += 1
+        if waiter is None:
+            lane.clients[client] += 1
+        else:
+            waiter.set_result(None)
+
+    def release(self, lane: Lane, client: str):
+        lane.active -= 1
+        self.active -= 1
+        self._forget(lane, client)
+        self._dispatch()
+
+    def _forget(self, lane: Lane, client: str):
+        lane.clients[client] -= 1
+        if lane.clients[client] <= 0:
+            del lane.clients[client]
+
+    def _dispatch(self):
+        for lane in self._by_priority:
+            while lane.waiters and self._can_run(lane):
+                client, waiter = lane.waiters.popleft()
+                self._grant(lane, client, waiter)
+
+    def status(self) -> Dict:
+        return {
+            "capacity": self.capacity,
+            "active": self.active,
+            "lanes": {name: lane.status() for name, lane in self.lanes.items()},
+        }
+
+
+def route_lane(path: str) -> Optional[str]:
+    lane = ROUTE_LANES.get(path)
+    if lane is not None:
+        return lane
+    for prefix, lane in ROUTE_LANES.items():
+        if prefix.endswith("/") and path.startswith(prefix):
+            return lane
+    return None
+
+
+def admission_release(request: Request) -> Callable[[], None]:
+    """
+    The callback handing the request's slot back before its response ends,
+    for streams whose expensive part finishes early: a chart stream once it
+    has read its rows, after which it only paces and relays frames. Does
+    nothing for requests that were not held.
+    """
+    return request.scope.get(RELEASE_SCOPE_KEY, _held_nothing)
+
+
+def _held_nothing():
+    pass
+
+
+def client_key(scope) -> str:
+    if ADMISSION_CLIENT_HEADER:
+        header = ADMISSION_CLIENT_HEADER.lower().encode("latin-1")
+        for name, value in scope.get("headers", ()):
+            if name == header:
+                return value.decode("latin-1").split(",")[0].strip()
+    client = scope.get("client")
+    return client[0] if client else "unknown"
+
+
+class AdmissionMiddleware:
+    """
+    ASGI middleware holding requests to admission-controlled paths until
+    their lane admits them.
+    """
+
+    def __init__(self, app, controller: Optional[AdmissionController] = None):
+        self.app = app
+        self.controller = controller or admission
+
+    async def __call__(self, scope, receive, send):
+        lane_name = route_lane(scope["path"]) if scope["type"] == "http" else None
+        if not ADMISSION_ENABLED or lane_name is None:
+            await self.app(scope, receive, send)
+            return
+
+        lane = self.controller.lanes[lane_name]
+        client = client_key(scope)
+        try:
+            await self.controller.acquire(lane, client)
+        except Rejected as exc:
+            ADMISSION_REJECTED_TOTAL.inc(lane=lane.name, reason=exc.reason)
+            log.warning(f"Shed {scope['path']} from {client}: {exc.reason}")
+            response = JSONResponse(
+                status_code=exc.status_code,
+                content={"message": f"Server busy ({exc.reason}), retry later"},
+                headers={"Retry-After": str(math.ceil(exc.retry_after))},
+            )
+            await response(scope, receive, send)
+            return
+
+        held = True
+
+        def release():
+            nonlocal held
+            if held:
+                held = False
+                self.controller.release(lane, client)
+
+        # Set on the scope itself, which the handler's Request wraps
+        scope[RELEASE_SCOPE_KEY] = release
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            release()
+
+
+admission = AdmissionController(
+    ADMISSION_CAPACITY,
+    [
+        Lane.from_env(
+            INTERACTIVE,
+            priority=0,
+            limit=ADMISSION_CAPACITY,
+            queue_size=128,
+            timeout=5,
+            client_limit=16,
+        ),
+        Lane.from_env(
+            PROMPT,
+            priority=1,
+            limit=4,
+            queue_size=16,
+            timeout=20,
+            client_limit=2,
+        ),
+        Lane.from_env(
+            BATCH,
+            priority=2,
+            limit=1,
+            queue_size=4,
+            timeout=30,
+            client_limit=1,
+        ),
+    ],
+)
+ADMISSION_IN_FLIGHT.collect_with(
+    lambda: [({"lane": name}, lane.active) for name, lane in admission.lanes.items()]
+)
+ADMISSION_QUEUE_DEPTH.collect_with(
+    lambda: [
+        ({"lane": name}, len(lane.waiters)) for name, lane in admission.lanes.items()
+    ]
+)
@@ -0,0 +1,235 @@
+import logging
+import os
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from energy_dashboard.database import EnergyDataTable
+from energy_dashboard.models import EnergyType
+
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+log = logging.getLogger(__name__)
+
+# Trailing hours an hour is compared against, and the |z| that flags it
+ANOMALY_WINDOW = int(os.getenv("ANOMALY_WINDOW", "168"))
+ANOMALY_THRESHOLD = float(os.getenv("ANOMALY_THRESHOLD", "3.0"))
+
+HOURS_PER_DAY = 24
+
+
+async def load_frame(
+    async_db: AsyncSession,
+    type_name: EnergyType,
+    start: datetime,
+    end: datetime,
+    respondents: Optional[Sequence[str]] = None,
+) -> pd.DataFrame:
+    """
+    Hourly values between start and end as a period x respondent frame, read
+    as raw columns straight from the database. Missing hours are NaN.
+    """
+    table = EnergyDataTable.__table__
+    stmt = select(table.c.period, table.c.respondent, table.c.value).where(
+        table.c.type_name == type_name.value,
+        table.c.period >= start,
+        table.c.period <= end,
+    )
+    if respondents:
+        stmt = stmt.where(table.c.respondent.in_(respondents))
+    else:
+        stmt = stmt.where(table.c.respondent != "US48")
+    result = await async_db.execute(stmt)
+    rows = pd.DataFrame(result.all(), columns=["period", "respondent", "value"])
+
+    hours = pd.date_range(
+        pd.Timestamp(start).ceil("h"), pd.Timestamp(end).floor("h"), freq="h"
+    )
+    frame = rows.pivot(index="period", columns="respondent", values="value")
+    frame = frame.reindex(hours).astype("float64")
+    if respondents:
+        frame = frame.reindex(columns=list(respondents))
+    frame.index.name = "period"
+    frame.columns.name = "respondent"
+    return frame
+
+
+def _daily_cube(frame: pd.DataFrame):
+    """
+    Reshape a frame into a (day, hour, respondent) array covering whole days.
+    """
+    first = frame.index[0].floor("D")
+    last = frame.index[-1].floor("D") + pd.Timedelta(hours=HOURS_PER_DAY - 1)
+    full = frame.reindex(pd.date_range(first, last, freq="h"))
+    days = full.index[::HOURS_PER_DAY]
+    cube = full.to_numpy().reshape(len(days), HOURS_PER_DAY, len(frame.columns))
+    return days, cube
+
+
+def _long(frame: pd.DataFrame, name: str) -> pd.DataFrame:
+    """
+    Turn a wide frame into one row per index value and respondent, named
+    ``name``, dropping NaN.
+    """
+    index = frame.index.name
+    return (
+        frame.reset_index()
+        .melt(id_vars=index, var_name="respondent", value_name=name)
+        .dropna(subset=[name])
+        .sort_values([index, "respondent"], kind="stable")
+        .reset_index(drop=True)
+    )
+
+
+def _argmax(values: np.ndarray, axis: int):
+    """
+    Index of the largest value along axis, ignoring NaN, and whether the
+    slice had any value at all.
+    """
+    missing = np.isnan(values)
+    index = np.where(missing, -np.inf, values).argmax(axis=axis)
+    return index, ~missing.all(axis=axis)
+
+
+def ramp_rates(frame: pd.DataFrame) -> pd.DataFrame:
+    """
+    Hour-over-hour change per respondent, summarised as the steepest ramp up
+    and down with the hour it ended on, and the mean absolute ramp.
+    """
+    if frame.empty:
+        return pd.DataFrame(
+            columns=[
+                "respondent",
+                "max_ramp_up",
+                "max_ramp_up_at",
+                "max_ramp_down",
+                "max_ramp_down_at",
+                "mean_abs_ramp",
+            ]
+        )
+    ramps = frame.diff().to_numpy()
+    periods = frame.index.to_numpy()
+    up, has_up = _argmax(ramps, axis=0)
+    down, has_down = _argmax(-ramps, axis=0)
+    columns = np.arange(ramps.shape[1])
+    no_period = np.datetime64("NaT", "ns")
+    with np.errstate(all="ignore"):
+        mean_abs = pd.DataFrame(np.abs(ramps)).mean().to_numpy()
+    return pd.DataFrame(
+        {
+            "respondent": frame.columns,
+            "max_ramp_up": np.where(has_up, ramps[up, columns], np.nan),
+            "max_ramp_up_at": np.where(has_up, periods[up], no_period),
+            "max_ramp_down": np.where(has_down, ramps[down, columns], np.nan),
+            "max_ramp_down_at": np.where(has_down, periods[down], no_period),
+            "mean_abs_ramp": mean_abs,
+        }
+    )
+
+
+def daily_load_factor(frame: pd.DataFrame) -> pd.DataFrame:
+    """
+    Average over peak load per respondent and day.
+    """
+    daily = frame.resample("D")
+    peak = daily.max()
+    factor = daily.mean() / peak.where(peak > 0)
+    factor.index.name = "day"
+    return _long(factor, "load_factor")
+
+
+def daily_peaks(frame: pd.DataFrame) -> pd.DataFrame:
+    """
+    The hour and value of each respondent's daily peak.
+    """
+    if frame.empty:
+        return pd.DataFrame(columns=["day", "respondent", "peak_at", "peak_value"])
+    days, cube = _daily_cube(frame)
+    hour, has_peak = _argmax(cube, axis=1)
+    peak_value = np.take_along_axis(cube, hour[:, None, :], axis=1)[:, 0, :]
+    day_index, column_index = np.nonzero(has_peak)
+    return pd.DataFrame(
+        {
+            "day": days[day_index],
+            "respondent": frame.columns[column_index],
+            "peak_at": days[day_index]
+            + pd.to_timedelta(hour[day_index, column_index], unit="h"),
+            "peak_value": peak_value[day_index, column_index],
+        }
+    )
+
+
+def anomalies(
+    frame: pd.DataFrame,
+    window: int = ANOMALY_WINDOW,
+    threshold: float = ANOMALY_THRESHOLD,
+) -> pd.DataFrame:
+    """
+    Hours whose value lies more than ``threshold`` standard deviations from
+    the mean of the preceding ``window`` hours of the same respondent.
+    """
+    baseline = frame.shift(1).rolling(window, min_periods=window // 2)
+    std = baseline.std()
+    zscore = (frame - baseline.mean()) / std.where(std > 0)
+    points = _long(zscore.where(zscore.abs() > threshold), "zscore")
+    values = frame.to_numpy()[
+        frame.index.get_indexer(points["period"]),
+        frame.columns.get_indexer(points["respondent"]),
+    ]
+    points.insert(2, "value", values)
+    return points
+
+
+def to_records(frame: pd.DataFrame) -> List[Dict]:
+    """
+    Rows as JSON-ready dicts, with NaN and NaT as None.
+    """
+    return frame.astype(object).where(frame.notna(), None).to_dict("records")
+
+
+def chart_overlays(
+    frame: pd.DataFrame, respondent: str, start: datetime
+) -> Dict[str, Dict[str, List]]:
+    """
+    Points to mark on one respondent's chart: daily peaks, the steepest ramps
+    and anomalous hours. The frame may start before ``start`` to give the
+    anomaly baseline some history.
+    """
+    series = frame[[respondent]]
+    visible = series.loc[start:]
+    overlays = {}
+
+    peaks = daily_peaks(visible)
+    overlays["peaks"] = {
+        "hours": list(peaks["peak_at"]),
+        "values": peaks["peak_value"].tolist(),
+    }
+
+    ramps = ramp_rates(visible).iloc[0] if not visible.empty else None
+    hours, values = [], []
+    if ramps is not None:
+        for column in ("max_ramp_up_at", "max_ramp_down_at"):
+            if pd.notna(ramps[column]):
+                hours.append(ramps[column])
+                values.append(float(visible.at[ramps[column], respondent]))
+    overlays["ramps"] = {"hours": hours, "values": values}
+
+    flagged = anomalies(series)
+    flagged = flagged[flagged["period"] >= start]
+    overlays["anomalies"] = {
+        "hours": list(flagged["period"]),
+        "values": flagged["value"].tolist(),
+    }
+    return overlays
+
+
+def history_start(start: datetime, window: int = ANOMALY_WINDOW) -> datetime:
+    """
+    Where to start loading so the first hour already has a full baseline.
+    """
+    return start - timedelta(hours=window)
@@ -1,42 +1,97 @@
-import asyncio
+import contextlib
 import logging
-from typing import Annotated, Dict, List, AsyncGenerator
+import math
+from datetime import datetime
+from typing import Annotated, AsyncGenerator, Callable, List, NamedTuple, Optional
 
 import httpx
-from fastapi import APIRouter, Depends, FastAPI, Request, Query, Form
+from dotenv import load_dotenv
+from fastapi import APIRouter, Depends, FastAPI, HTTPException, Request, Query, Form
 from fastapi import Body
 from fastapi.exceptions import RequestValidationError
-from fastapi.responses import JSONResponse, StreamingResponse, HTMLResponse
+from fastapi.responses import (
+    HTMLResponse,
+    JSONResponse,
+    PlainTextResponse,
+    Response,
+    StreamingResponse,
+)
 from fastapi.templating import Jinja2Templates
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
-from energy_dashboard.database import AsyncSessionLocal, SessionLocal
+from energy_dashboard import admin
+from energy_dashboard.admission import AdmissionMiddleware, admission_release
+from energy_dashboard.cluster import CLUSTER_ENABLED, cluster
+from energy_dashboard.database import AsyncSessionLocal, SessionLocal, init_db
+from energy_dashboard.gaps import MERGE_HOURS, backfill, plan_windows, scan_gaps
+from energy_dashboard.hot_store import load_hot_store
+from energy_dashboard.hub import ChartBroadcast, hub, stream_key
+from energy_dashboard.ingest import LIVE_TAIL_ENABLED, LiveTailPoller, live_feed
+from energy_dashboard.metrics import (
+    PROMETHEUS_CONTENT_TYPE,
+    MetricsMiddleware,
+    render_metrics,
+)
 from energy_dashboard.models import (
+    ChartMode,
+    PacingPolicy,
     RetrieveEnergyDataRequest,
     SeedEnergyDataRequest,
     EnergyData,
     EnergyType,
 )
+from energy_dashboard.pacing import paced_batches, pacing_policy
+from energy_dashboard.profiler import ProfilingMiddleware
+from energy_dashboard.rendering import RenderBusy, renderer
 from energy_dashboard.services import EnergyDataService
-from energy_dashboard.utils import TEMPLATES_DIR
-from energy_dashboard.chart import (
-    create_chart,
-    create_context,
+from energy_dashboard.snapshot import load_snapshot, snapshot, sync_snapshot
+from energy_dashboard.streaming import (
+    CHART_TOPIC,
+    DELTA_TOPIC,
+    HX_SSE_LISTENER,
+    TERMINATE,
+    ChartEncoder,
+    chart_frames,
+    guard_stream,
 )
+from energy_dashboard.utils import TEMPLATES_DIR, parse_date_range
+from energy_dashboard.versions import data_versions
 
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 log = logging.getLogger(__name__)
 
-HX_SSE_LISTENER = "hx-sse-listener"
-CHART_TOPIC = "chart"
-TERMINATE = "Terminate"
-
 BUFFER_SIZE = 10
 
-app = FastAPI()
+poller = LiveTailPoller()
+
+
+@contextlib.asynccontextmanager
+async def lifespan(app: FastAPI):
+    load_dotenv()
+    init_db()
+    if CLUSTER_ENABLED:
+        # Only the elected worker runs the poller
+        await cluster.start(poller if LIVE_TAIL_ENABLED else None)
+        # The hot store and snapshot only stay current where every ingest is
+        # replayed; otherwise rows stored by other processes would be missed
+        await load_hot_store()
+        await load_snapshot()
+    if LIVE_TAIL_ENABLED and not CLUSTER_ENABLED:
+        poller.start()
+    yield
+    if CLUSTER_ENABLED:
+        await cluster.stop()
+    await poller.stop()
+    renderer.shutdown()
+
+
+app = FastAPI(lifespan=lifespan)
+app.add_middleware(AdmissionMiddleware)
+app.add_middleware(MetricsMiddleware)
+app.add_middleware(ProfilingMiddleware)
 router = APIRouter()
 templates = Jinja2Templates(directory=TEMPLATES_DIR)
 
@@ -67,14 +122,6 @@ def get_energy_service(
     return EnergyDataService(async_db, db, httpx.AsyncClient())
 
 
-def render_sse_html_chunk(event, chunk, attrs=None):
-    if attrs is None:
-        attrs = {}
-    tmpl = templates.get_template("partials/streaming_chunk.jinja2")
-    html_chunk = tmpl.render(event=event, chunk=chunk, attrs=attrs)
-    return html_chunk
-
-
 @app.get("/stream", name="stream", response_class=StreamingResponse)
 async def stream_energy_data(
     request: Request, service: EnergyDataService = Depends(get_energy_service)
@@ -82,7 +129,7 @@ async def stream_energy_data(
     sse_config = dict(
         listener=HX_SSE_LISTENER,
         path=f"/instruct-stream-chart?prompt={prompt}",
-        topics=[CHART_TOPIC, TERMINATE],
+        topics=[CHART_TOPIC, DELTA_TOPIC, TERMINATE],
     )
     return templates.TemplateResponse(
         "instruct.jinja2", {"request": request, "sse_config": sse_config}
@@ -97,7 +144,7 @@ async def instruct_trigger_streaming(
     sse_config = dict(
         listener=HX_SSE_LISTENER,
         path=f"/instruct-stream-chart?prompt={prompt}",
-        topics=[CHART_TOPIC, TERMINATE],
+        topics=[CHART_TOPIC, DELTA_TOPIC, TERMINATE],
     )
     return templates.TemplateResponse(
         "instruct.jinja2", {"request": request, "sse_config": sse_config}
@@ -111,11 +158,12 @@ async def trigger_streaming(
     type_name: Annotated[str, Form()],
     start_date: Annotated[str, Form()],
     end_date: Annotated[str, Form()],
+    live: Annotated[bool, Form()] = False,
 ):
     sse_config = dict(
         listener=HX_SSE_LISTENER,
-        path=f"/stream-chart?respondent={respondent}&type_name={type_name}&start_date={start_date}&end_date={end_date}",
-        topics=[CHART_TOPIC, TERMINATE],
+        path=f"/stream-chart?respondent={respondent}&type_name={type_name}&start_date={start_date}&end_date={end_date}&live={str(live).lower()}",
+        topics=[CHART_TOPIC, DELTA_TOPIC, TERMINATE],
     )
     return templates.TemplateResponse(
         "index.jinja2", {"request": request, "sse_config": sse_config}
@@ -124,8 +172,11 @@ async def trigger_streaming(
 
 @app.get("/instruct-stream-chart", response_class=StreamingResponse)
 async def instruct_stream_chart(
+    request: Request,
     service: EnergyDataService = Depends(get_energy_service),
     prompt: str = Query(None),
+    mode: ChartMode = Query(ChartMode.STREAM),
+    pacing: PacingPolicy = Depends(pacing_policy),
 ):
     if not prompt:
         return JSONResponse(
@@ -134,43 +185,32 @@ async def instruct_stream_chart(
         )
 
     async def streaming_data(prompt: str):
-        chart_state = {
-            "x_state": [],
-            "y_state": [],
-        }
-
-        nrgstrm = service.stream_all_from_prompt(prompt)
-        async for energy_data, query in nrgstrm:
-            log.info(f"Sending {energy_data} to client...")
-            if energy_data is None:
-                yield render_chunk(
-                    TERMINATE,
-                    {},
-                    attrs={"id": HX_SSE_LISTENER, "hx-swap-oob": "true"},
-                )
-                await nrgstrm.aclose()
-            else:
-                chart_state["y_state"].append(energy_data.value)
-                chart_state["x_state"].append(energy_data.period)
-                div, script = create_chart(chart_state, query, title=prompt)
-                context = create_context(div, script)
-                yield render_chunk(
-                    CHART_TOPIC,
-                    context,
-                    attrs={"id": "linechart", "hx-swap-oob": "true"},
-                )
-                await asyncio.sleep(2)
-
-    return StreamingResponse(streaming_data(prompt), media_type="text/event-stream")
+        query = await service.generate_query(prompt)
+        points = service.stream_query(query, row_count=BUFFER_SIZE)
+        # Once the query is drained the stream only paces what it has read
+        batches = paced_batches(points, pacing, on_drained=admission_release(request))
+        async with contextlib.aclosing(
+            chart_frames(batches, query, title=prompt, mode=mode)
+        ) as frames:
+            async for frame in frames:
+                yield frame
+
+    return StreamingResponse(
+        guard_stream(request, streaming_data(prompt), "instruct-stream-chart"),
+        media_type="text/event-stream",
+    )
 
 
 @app.get("/stream-chart", response_class=StreamingResponse)
 async def energy_stream(
-    service: EnergyDataService = Depends(get_energy_service),
+    request: Request,
     respondent: str = Query(None),
     type_name: str = Query(None),
     start_date: str = Query(None),
     end_date: str = Query(None),
+    mode: ChartMode = Query(ChartMode.STREAM),
+    pacing: PacingPolicy = Depends(pacing_policy),
+    live: bool = Query(False),
 ):
     if not all([respondent, type_name, start_date, end_date]):
         return JSONResponse(
@@ -185,57 +225,266 @@ async def energy_stream(
         end_date=end_date,
     )
 
-    async def streaming_data(chart_params=params):
-        # TODO: Highlight stored chart state for appending buffer data
-        chart_state = {
-            "x_state": [],
-            "y_state": [],
-        }
-
-        nrgstrm = buffer_stream(service, chart_params)
-        async for energy_data in nrgstrm:
-            log.info(f"Sending {energy_data} to client...")
-            if energy_data is None:
-                yield render_chunk(
-                    TERMINATE,
-                    {},
-                    attrs={"id": HX_SSE_LISTENER, "hx-swap-oob": "true"},
-                )
-                await nrgstrm.aclose()
-            else:
-                chart_state["y_state"].append(energy_data.value)
-                chart_state["x_state"].append(energy_data.period)
-                div, script = create_chart(chart_state, params, title=respondent)
-                context = create_context(div, script)
-                yield render_chunk(
-                    CHART_TOPIC,
-                    context,
-                    attrs={"id": "linechart", "hx-swap-oob": "true"},
-                )
-                await asyncio.sleep(2)
-
-    return StreamingResponse(streaming_data(), media_type="text/event-stream")
-
-
-def render_chunk(event: str, context: Dict, attrs: Dict):
-    chunk = render_sse_html_chunk(
-        event,
-        context,
-        attrs=attrs,
+    # Viewers of the same chart share one producer through the hub
+    key = stream_key(params, mode, pacing, live)
+
+    def broadcast():
+        key_params = key.params()
+        encoder = ChartEncoder(key_params, key.respondent, mode, keep_history=True)
+        chart = ChartBroadcast(
+            key,
+            encoder,
+            lambda: stored_batches(key_params, pacing, live, chart.rows_read),
+        )
+        return chart
+
+    async def streaming_data():
+        async with hub.subscribe(key, broadcast) as subscriber:
+            # Hold the admission slot until the stored rows have been read
+            subscriber.broadcast.when_rows_read(admission_release(request))
+            async for frame in subscriber.frames():
+                yield frame
+
+    return StreamingResponse(
+        guard_stream(request, streaming_data(), "stream-chart"),
+        media_type="text/event-stream",
     )
-    return f"{chunk}\n\n".encode("utf-8")
+
+
+async def stored_batches(
+    chart_params: RetrieveEnergyDataRequest,
+    pacing: PacingPolicy,
+    live=False,
+    on_read: Optional[Callable[[], None]] = None,
+) -> AsyncGenerator[List[EnergyData], None]:
+    """
+    Paced batches of stored rows, read with a session owned by the stream
+    rather than by any one request. ``on_read`` is called once the rows have
+    been read. A live stream then stays open and yields newly ingested points
+    of the requested range as they arrive.
+    """
+    respondent = chart_params.respondent
+    type_name = chart_params.type_name.value
+    start, end = parse_date_range(chart_params.start_date, chart_params.end_date)
+    # Subscribe before reading history so nothing ingested meanwhile is missed
+    updates = live_feed.subscribe(respondent, type_name) if live else None
+    try:
+        last_period = None
+        async with AsyncSessionLocal() as async_db:
+            service = EnergyDataService(async_db, None, None)
+            batches = paced_batches(
+                buffer_stream(service, chart_params), pacing, on_drained=on_read
+            )
+            async with contextlib.aclosing(batches):
+                async for batch in batches:
+                    last_period = max(point.period for point in batch)
+                    yield batch
+
+        while updates is not None:
+            points = [
+                point
+                for point in await updates.get()
+                if start <= point.period <= end
+                and (last_period is None or point.period > last_period)
+            ]
+            if points:
+                last_period = points[-1].period
+                yield points
+    finally:
+        if updates is not None:
+            live_feed.unsubscribe(respondent, type_name, updates)
 
 
 async def buffer_stream(
     service: EnergyDataService,
     chart_params: RetrieveEnergyDataRequest,
     row_count=BUFFER_SIZE,
-) -> AsyncGenerator[List[RetrieveEnergyDataRequest], None]:
+) -> AsyncGenerator[EnergyData, None]:
     nrgstream = service.stream_all(chart_params, row_count=row_count)
-    async for energy_data in nrgstream:
-        for data in energy_data:
-            yield data
-    yield None
+    async with contextlib.aclosing(nrgstream):
+        async for energy_data in nrgstream:
+            for data in energy_data:
+                yield data
+
+
+class AnalyticsRange(NamedTuple):
+    start: datetime
+    end: datetime
+    type_name: EnergyType
+    respondent: Optional[List[str]]
+    # Where to start reading, before start for summaries that need a baseline
+    history: datetime
+
+
+def analytics_range(
+    start_date: str = Query(...),
+    end_date: str = Query(...),
+    type_name: EnergyType = Query(EnergyType.D),
+    respondent: List[str] = Query(None),
+) -> AnalyticsRange:
+    """
+    Dependency reading the range, type and respondents of an analytics query.
+    """
+    start, end = parse_date_range(start_date, end_date)
+    return AnalyticsRange(start, end, type_name, respondent, start)
+
+
+async def fresh_range(
+    request: Request, response: Response, query: AnalyticsRange
+) -> AnalyticsRange:
+    """
+    Answer with 304 Not Modified if the client's copy of the summary still
+    matches the stored rows it is computed from, and set the validators on
+    the response otherwise.
+    """
+    validators = await data_versions.validators(
+        request, query.history, query.end, query.respondent, query.type_name.value
+    )
+    if validators.matches(request):
+        raise HTTPException(status_code=304, headers=validators.headers)
+    response.headers.update(validators.headers)
+    return query
+
+
+async def fresh_analytics(
+    request: Request,
+    response: Response,
+    query: AnalyticsRange = Depends(analytics_range),
+) -> AnalyticsRange:
+    """
+    Dependency of the analytics summaries computed from the range alone.
+    """
+    return await fresh_range(request, response, query)
+
+
+def anomaly_window(
+    window: int = Query(None, ge=2, description="Defaults to ANOMALY_WINDOW"),
+) -> int:
+    """
+    Dependency reading the hours each hour is judged against for anomalies.
+    """
+    from energy_dashboard import analytics
+
+    return window or analytics.ANOMALY_WINDOW
+
+
+async def fresh_anomalies(
+    request: Request,
+    response: Response,
+    query: AnalyticsRange = Depends(analytics_range),
+    window: int = Depends(anomaly_window),
+) -> AnalyticsRange:
+    """
+    Dependency of the anomaly summary, whose first hours are judged against
+    the ``window`` hours before the range.
+    """
+    from energy_dashboard import analytics
+
+    history = analytics.history_start(query.start, window)
+    return await fresh_range(request, response, query._replace(history=history))
+
+
+@app.get("/api/v1/analytics/ramps")
+async def analytics_ramps(
+    query: AnalyticsRange = Depends(fresh_analytics),
+    async_db: AsyncSession = Depends(get_async_db),
+):
+    from energy_dashboard import analytics
+
+    frame = await analytics.load_frame(
+        async_db, query.type_name, query.start, query.end, query.respondent
+    )
+    return analytics.to_records(analytics.ramp_rates(frame))
+
+
+@app.get("/api/v1/analytics/load-factor")
+async def analytics_load_factor(
+    query: AnalyticsRange = Depends(fresh_analytics),
+    async_db: AsyncSession = Depends(get_async_db),
+):
+    from energy_dashboard import analytics
+
+    frame = await analytics.load_frame(
+        async_db, query.type_name, query.start, query.end, query.respondent
+    )
+    return analytics.to_records(analytics.daily_load_factor(frame))
+
+
+@app.get("/api/v1/analytics/peaks")
+async def analytics_peaks(
+    query: AnalyticsRange = Depends(fresh_analytics),
+    async_db: AsyncSession = Depends(get_async_db),
+):
+    from energy_dashboard import analytics
+
+    frame = await analytics.load_frame(
+        async_db, query.type_name, query.start, query.end, query.respondent
+    )
+    return analytics.to_records(analytics.daily_peaks(frame))
+
+
+@app.get("/api/v1/analytics/anomalies")
+async def analytics_anomalies(
+    query: AnalyticsRange = Depends(fresh_anomalies),
+    window: int = Depends(anomaly_window),
+    threshold: float = Query(None, gt=0, description="Defaults to ANOMALY_THRESHOLD"),
+    async_db: AsyncSession = Depends(get_async_db),
+):
+    from energy_dashboard import analytics
+
+    threshold = threshold or analytics.ANOMALY_THRESHOLD
+    frame = await analytics.load_frame(
+        async_db, query.type_name, query.history, query.end, query.respondent
+    )
+    flagged = analytics.anomalies(frame, window, threshold)
+    return analytics.to_records(flagged[flagged["period"] >= query.start])
+
+
+@app.get("/analytics-chart", response_class=HTMLResponse)
+async def analytics_chart(
+    request: Request,
+    respondent: str = Query(...),
+    type_name: EnergyType = Query(EnergyType.D),
+    start_date: str = Query(...),
+    end_date: str = Query(...),
+    async_db: AsyncSession = Depends(get_async_db),
+):
+    """
+    Render one respondent's chart with its peaks, steepest ramps and
+    anomalies marked on it.
+    """
+    from energy_dashboard import analytics
+
+    params = RetrieveEnergyDataRequest(
+        respondent=respondent,
+        type_name=type_name,
+        start_date=start_date,
+        end_date=end_date,
+    )
+    start, end = parse_date_range(start_date, end_date)
+    history = analytics.history_start(start)
+    validators = await data_versions.validators(
+        request, history, end, [respondent], type_name.value
+    )
+    if validators.matches(request):
+        return validators.not_modified()
+
+    frame = await analytics.load_frame(async_db, type_name, history, end, [respondent])
+    series = frame[respondent].loc[start:]
+    chart_state = {"x_state": list(series.index), "y_state": series.tolist()}
+    div, script = await renderer.render_analytics_chart(
+        chart_state,
+        params,
+        analytics.chart_overlays(frame, respondent, start),
+        title=respondent,
+    )
+    response = templates.TemplateResponse(
+        request=request,
+        name="partials/chart.jinja2",
+        context={"chart": {"div": div, "script": script}},
+    )
+    response.headers.update(validators.headers)
+    return response
 
 
 @app.get("/instruct", name="instruct")
@@ -257,6 +506,94 @@ async def seed_energy_data(
     return await service.fetch_data(params=request_body.params)
 
 
+async def gap_plan(
+    async_db: AsyncSession,
+    start_date: Optional[str],
+    end_date: Optional[str],
+    respondent: Optional[List[str]],
+    type_code: Optional[List[str]],
+    merge_hours: int,
+):
+    start, end = (
+        parse_date_range(start_date, end_date)
+        if start_date and end_date
+        else (None, None)
+    )
+    gaps = await scan_gaps(async_db, start, end, respondent, type_code)
+    return gaps, plan_windows(gaps, merge_hours)
+
+
+@app.get("/api/v1/snapshot")
+async def grid_snapshot(request: Request):
+    """
+    The latest value, the value a day earlier and a 24 hour sparkline of
+    every series, for the wallboard.
+    """
+    if not CLUSTER_ENABLED:
+        # Nothing replays other processes' ingests here, so check the
+        # database for rows they stored first
+        await sync_snapshot()
+    validators = snapshot.validators()
+    if validators.matches(request):
+        return validators.not_modified()
+    return Response(
+        snapshot.body(), media_type="application/json", headers=validators.headers
+    )
+
+
+@app.get("/api/v1/gaps")
+async def find_gaps(
+    start_date: str = Query(None),
+    end_date: str = Query(None),
+    respondent: List[str] = Query(None),
+    type_code: List[str] = Query(None, alias="type"),
+    merge_hours: int = Query(MERGE_HOURS, ge=0),
+    async_db: AsyncSession = Depends(get_async_db),
+):
+    """
+    List the missing hours per series and the EIA requests that would fill them.
+    """
+    gaps, windows = await gap_plan(
+        async_db, start_date, end_date, respondent, type_code, merge_hours
+    )
+    return {
+        "gaps": [dict(gap._asdict(), hours=gap.hours) for gap in gaps],
+        "windows": [
+            dict(window._asdict(), rows=window.rows, pages=window.pages)
+            for window in windows
+        ],
+    }
+
+
+@app.post("/api/v1/backfill")
+async def backfill_gaps(
+    start_date: str = Query(None),
+    end_date: str = Query(None),
+    respondent: List[str] = Query(None),
+    type_code: List[str] = Query(None, alias="type"),
+    merge_hours: int = Query(MERGE_HOURS, ge=0),
+    service: EnergyDataService = Depends(get_energy_service),
+):
+    """
+    Fetch just the missing hours from the EIA API.
+    """
+    gaps, windows = await gap_plan(
+        service.async_db, start_date, end_date, respondent, type_code, merge_hours
+    )
+    stored = await backfill(service, windows)
+    return {
+        "gaps": len(gaps),
+        "missing_hours": sum(gap.hours for gap in gaps),
+        "requests": len(windows),
+        "stored": stored,
+    }
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    return PlainTextResponse(render_metrics(), media_type=PROMETHEUS_CONTENT_TYPE)
+
+
 @app.exception_handler(RequestValidationError)
 async def validation_exception_handler(request: Request, exc: RequestValidationError):
     logging.error(f"Validation error: {exc} in request: {request}")
@@ -266,5 +603,16 @@ async def validation_exception_handler(request: Request, exc: RequestValidationE
     )
 
 
+@app.exception_handler(RenderBusy)
+async def render_busy_handler(request: Request, exc: RenderBusy):
+    log.warning(f"Refused {request.url.path}: {exc}")
+    return JSONResponse(
+        status_code=503,
+        content={"message": "Server busy (render_queue), retry later"},
+        headers={"Retry-After": str(math.ceil(renderer.wait_timeout))},
+    )
+
+
 # Include the router for API endpoints
 app.include_router(router)
+app.include_router(admin.router)
@@ -0,0 +1,405 @@
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List
+
+# Benchmark suite for the data path. Run it with
+#   python -m energy_dashboard.bench --respondents 20 --years 2 -o bench.json
+# and compare two runs, e.g. before and after a change, with
+#   python -m energy_dashboard.bench -o after.json --compare bench.json
+# It works on its own SQLite file and an in-process fake EIA API, so it needs
+# no network and never touches the dashboard's database. Startup alone is
+# checked, failing on a slow import or an eagerly imported heavy module, with
+#   python -m energy_dashboard.bench --import-only --max-import-ms 1500
+
+RANGE_SPANS = {"day": 1, "week": 7, "month": 30}
+CHART_SPANS = {"week": 7, "month": 30}
+
+IMPORT_TARGET = "energy_dashboard.app"
+# Loaded on first use only; importing the app must not pull these in
+LAZY_MODULES = ("pandas", "bokeh", "instructor", "anthropic", "groq", "openai")
+IMPORT_PROBE = """
+import json, sys, time
+began = time.perf_counter()
+import {module}
+seconds = time.perf_counter() - began
+eager = [name for name in {lazy!r} if name in sys.modules]
+print(json.dumps({{"seconds": seconds, "eager": eager}}))
+"""
+
+
+def summarize(samples: List[float]) -> Dict:
+    """
+    Latency statistics in milliseconds for samples in seconds.
+    """
+    ordered = sorted(samples)
+    return {
+        "runs": len(ordered),
+        "mean_ms": statistics.fmean(ordered) * 1000,
+        "p50_ms": ordered[len(ordered) // 2] * 1000,
+        "p95_ms": ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] * 1000,
+        "min_ms": ordered[0] * 1000,
+        "max_ms": ordered[-1] * 1000,
+    }
+
+
+def throughput(rows: int, seconds: float) -> Dict:
+    return {"rows": rows, "seconds": seconds, "rows_per_s": rows / seconds}
+
+
+def import_time(module=IMPORT_TARGET, runs=5) -> Dict:
+    """
+    Import time of ``module``, each run in a fresh interpreter, and which of
+    the LAZY_MODULES it imported eagerly.
+    """
+    package_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ, PYTHONPATH=package_root)
+    probe = IMPORT_PROBE.format(module=module, lazy=LAZY_MODULES)
+    samples, eager = [], set()
+    for _ in range(runs):
+        output = subprocess.run(
+            [sys.executable, "-c", probe],
+            capture_output=True,
+            text=True,
+            check=True,
+            env=env,
+        ).stdout
+        result = json.loads(output.splitlines()[-1])
+        samples.append(result["seconds"])
+        eager.update(result["eager"])
+    return dict(summarize(samples), module=module, eager=sorted(eager))
+
+
+def import_regressions(result: Dict, max_ms: float = None) -> List[str]:
+    """
+    Why an ``import_time`` result fails the startup budget, if it does.
+    """
+    problems = [
+        f"{result['module']} imports {name} eagerly" for name in result["eager"]
+    ]
+    if max_ms is not None and result["p50_ms"] > max_ms:
+        problems.append(
+            f"{result['module']} takes {result['p50_ms']:.0f} ms to import, "
+            f"over the {max_ms:.0f} ms budget"
+        )
+    return problems
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+class Bench:
+    """
+    Runs each benchmark against a database of ``respondents`` x ``years`` of
+    synthetic hourly data starting at ``start``.
+    """
+
+    def __init__(self, args: argparse.Namespace):
+        from energy_dashboard.synthetic import HOURS_PER_YEAR, respondent_codes
+
+        self.args = args
+        self.random = random.Random(args.seed)
+        self.respondents = respondent_codes(args.respondents)
+        self.start = datetime.strptime(args.start, "%Y-%m-%d")
+        self.hours = int(args.years * HOURS_PER_YEAR)
+        self.end = self.start + timedelta(hours=self.hours - 1)
+
+    def random_request(self, days: int, after: datetime = None):
+        from energy_dashboard.models import EnergyType, RetrieveEnergyDataRequest
+
+        first = after or self.start
+        span = (self.end - first).days - days
+        start = first + timedelta(days=self.random.randint(0, max(0, span)))
+        return RetrieveEnergyDataRequest(
+            respondent=self.random.choice(self.respondents),
+            type_name=self.random.choice(list(EnergyType)),
+            start_date=start.strftime("%Y-%m-%d"),
+            end_date=(start + timedelta(days=days)).strftime("%Y-%m-%d"),
+        )
+
+    def generate(self) -> Dict:
+        from energy_dashboard.database import engine, init_db
+        from energy_dashboard.synthetic import populate
+
+        init_db()
+        began = time.perf_counter()
+        rows = populate(engine, self.respondents, self.start, self.hours)
+        return throughput(rows, time.perf_counter() - began)
+
+    async def ingest(self) -> Dict:
+        """
+        fetch_data for ``ingest_hours`` after the generated range, served by
+        the fake EIA API through an in-process transport.
+        """
+        import httpx
+        from sqlalchemy import delete
+
+        from energy_dashboard.database import AsyncSessionLocal, EnergyDataTable
+        from energy_dashboard.fakes import FakeEIA, create_eia_app
+        from energy_dashboard.ingest import EIA_PAGE_LENGTH, EIA_PERIOD_FORMAT
+        from energy_dashboard.services import EnergyDataService
+
+        first = self.end + timedelta(hours=1)
+        last = first + timedelta(hours=self.args.ingest_hours - 1)
+        # Everything up to ``last`` is published right away
+        fake = FakeEIA(start=first, speedup=1e9)
+        transport = httpx.ASGITransport(app=create_eia_app(fake))
+        params = {
+            "frequency": "hourly",
+            "data[0]": "value",
+            "facets[respondent][]": self.respondents,
+            "start": first.strftime(EIA_PERIOD_FORMAT),
+            "end": last.strftime(EIA_PERIOD_FORMAT),
+            "offset": 0,
+            "length": EIA_PAGE_LENGTH,
+        }
+        async with (
+            AsyncSessionLocal() as async_db,
+            httpx.AsyncClient(transport=transport) as client,
+        ):
+            # Start from an empty window so reruns measure real inserts
+            await async_db.execute(
+                delete(EnergyDataTable).where(EnergyDataTable.period >= first)
+            )
+            await async_db.commit()
+            service = EnergyDataService(async_db, None, client)
+            began = time.perf_counter()
+            await service.fetch_data(params)
+            seconds = time.perf_counter() - began
+        rows = self.args.ingest_hours * len(self.respondents) * 2
+        return dict(throughput(rows, seconds), requests=fake.requests)
+
+    async def range_queries(self, after: datetime = None) -> Dict:
+        """
+        Latency of list_all, and of executing prepare_stmt alone, per span.
+        """
+        from energy_dashboard.database import AsyncSessionLocal
+        from energy_dashboard.services import EnergyDataService
+
+        results = {}
+        async with AsyncSessionLocal() as async_db:
+            service = EnergyDataService(async_db, None, None)
+            for name, days in RANGE_SPANS.items():
+                sql, listed = [], []
+                for _ in range(self.args.repeat):
+                    params = self.random_request(days, after)
+                    began = time.perf_counter()
+                    stmt = service.prepare_stmt(params, None)
+                    (await async_db.execute(stmt)).scalars().all()
+                    sql.append(time.perf_counter() - began)
+                    async_db.expunge_all()
+
+                    began = time.perf_counter()
+                    await service.list_all(None, params)
+                    listed.append(time.perf_counter() - began)
+                    async_db.expunge_all()
+                results[name] = {"sql": summarize(sql), "list_all": summarize(listed)}
+        return results
+
+    async def streaming(self) -> Dict:
+        """
+        Rows per second through stream_all over ``stream_days`` of one series.
+        """
+        from energy_dashboard.database import AsyncSessionLocal
+        from energy_dashboard.services import EnergyDataService
+
+        rows, seconds = 0, 0.0
+        async with AsyncSessionLocal() as async_db:
+            service = EnergyDataService(async_db, None, None)
+            for _ in range(self.args.repeat):
+                params = self.random_request(self.args.stream_days)
+                began = time.perf_counter()
+                async for batch in service.stream_all(params, row_count=100):
+                    rows += len(batch)
+                seconds += time.perf_counter() - began
+        return throughput(rows, seconds)
+
+    async def charts(self) -> Dict:
+        """
+        create_chart render time for a week and a month of points.
+        """
+        from energy_dashboard.chart import create_chart
+        from energy_dashboard.database import AsyncSessionLocal
+        from energy_dashboard.services import EnergyDataService
+
+        results = {}
+        async with AsyncSessionLocal() as async_db:
+            service = EnergyDataService(async_db, None, None)
+            for name, days in CHART_SPANS.items():
+                params = self.random_request(days)
+                points = [
+                    point
+                    async for batch in service.stream_all(params, row_count=1000)
+                    for point in batch
+                ]
+                chart_state = {
+                    "x_state": [point.period for point in points],
+                    "y_state": [point.value for point in points],
+                }
+                # The first render pays for Bokeh's lazy setup
+                create_chart(chart_state, params, title=params.respondent)
+                samples = []
+                for _ in range(self.args.repeat):
+                    began = time.perf_counter()
+                    create_chart(chart_state, params, title=params.respondent)
+                    samples.append(time.perf_counter() - began)
+                results[name] = dict(summarize(samples), points=len(points))
+        return results
+
+    async def hot_store(self) -> Dict:
+        """
+        Load time of the hot store, then list_all latency for ranges it serves.
+        """
+        from energy_dashboard.database import AsyncSessionLocal
+        from energy_dashboard.hot_store import hot_store
+
+        async with AsyncSessionLocal() as async_db:
+            began = time.perf_counter()
+            await hot_store.load(async_db)
+            load_seconds = time.perf_counter() - began
+        # Whole days inside the window, as requests are by date
+        first_day = (hot_store.origin + timedelta(days=1)).replace(hour=0)
+        results = await self.range_queries(after=first_day)
+        stats = hot_store.stats()
+        return {
+            "load_seconds": load_seconds,
+            "bytes": stats["bytes"],
+            "series": stats["series"],
+            "ranges": results,
+        }
+
+    async def run(self) -> Dict:
+        results = {"import": import_time(runs=self.args.import_runs)}
+        results["generate"] = self.generate()
+        results["ingest"] = await self.ingest()
+        results["range_query"] = await self.range_queries()
+        results["stream_all"] = await self.streaming()
+        results["create_chart"] = await self.charts()
+        results["hot_store"] = await self.hot_store()
+        return results
+
+
+def flatten(results: Dict, prefix="") -> Dict[str, float]:
+    flat = {}
+    for key, value in results.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            flat.update(flatten(value, f"{name}."))
+        elif isinstance(value, (int, float)):
+            flat[name] = value
+    return flat
+
+
+def compare(current: Dict, baseline: Dict) -> Dict[str, float]:
+    """
+    Ratio of each latency and throughput figure to the baseline run; below 1
+    is faster for ``_ms`` figures, above 1 is faster for ``_per_s`` ones.
+    """
+    now, before = flatten(current["results"]), flatten(baseline["results"])
+    return {
+        name: now[name] / before[name]
+        for name in sorted(now.keys() & before.keys())
+        if name.endswith(("mean_ms", "p95_ms", "rows_per_s")) and before[name]
+    }
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Benchmark the data path")
+    parser.add_argument("--respondents", type=int, default=7)
+    parser.add_argument("--years", type=float, default=1.0)
+    parser.add_argument("--start", default="2022-01-01")
+    parser.add_argument("--ingest-hours", type=int, default=24 * 7)
+    parser.add_argument("--stream-days", type=int, default=90)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--import-runs", type=int, default=5)
+    parser.add_argument(
+        "--import-only",
+        action="store_true",
+        help="Only time importing the app, e.g. as a startup check in CI",
+    )
+    parser.add_argument(
+        "--max-import-ms",
+        type=float,
+        help="Exit with an error when the median app import is slower",
+    )
+    parser.add_argument(
+        "--db", help="SQLite file to use; defaults to a new temporary file"
+    )
+    parser.add_argument("-o", "--output", help="Write results here, not stdout")
+    parser.add_argument("--compare", help="Results of an earlier run to compare")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    workdir = None
+    if not args.db:
+        workdir = tempfile.TemporaryDirectory(prefix="energy-bench-")
+        args.db = os.path.join(workdir.name, "bench.db")
+    # The database module reads these on import
+    os.environ["DATABASE_PATH"] = args.db
+    os.environ["DATABASE_ECHO"] = "false"
+
+    if args.import_only:
+        results = {"import": import_time(runs=args.import_runs)}
+    else:
+        results = asyncio.run(Bench(args).run())
+
+    import bokeh
+    import pandas
+    import sqlalchemy
+
+    report = {
+        "meta": {
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "sqlalchemy": sqlalchemy.__version__,
+            "pandas": pandas.__version__,
+            "bokeh": bokeh.__version__,
+            "args": {key: value for key, value in vars(args).items() if key != "db"},
+        },
+        "results": results,
+    }
+    if args.compare:
+        with open(args.compare) as baseline:
+            report["comparison"] = compare(report, json.load(baseline))
+
+    output = json.dumps(report, indent=2, default=str)
+    if args.output:
+        with open(args.output, "w") as file:
+            file.write(output + "\n")
+    else:
+        sys.stdout.write(output + "\n")
+    if workdir is not None:
+        workdir.cleanup()
+
+    problems = import_regressions(results["import"], args.max_import_ms)
+    for problem in problems:
+        sys.stderr.write(f"Startup regression: {problem}\n")
+    if problems:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
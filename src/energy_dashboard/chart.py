@@ -11,13 +11,15 @@ from bokeh.plotting import figure, curdoc
 
 from energy_dashboard.models import RetrieveEnergyDataRequest
 
+# Name of the data source the client-side delta handler streams points into
+STREAM_SOURCE_NAME = "energy-stream-source"
 
-def create_context(div, script):
-    context = {
-        "script": script.replace("\n", " "),
-        "div": div.replace("\n", " "),
-    }
-    return context
+# Marker styles for the analytics overlays, keyed by overlay name
+OVERLAY_STYLES = {
+    "peaks": dict(marker="triangle", size=10, color="#f5a623", legend="Daily peak"),
+    "ramps": dict(marker="diamond", size=12, color="#7ed321", legend="Steepest ramp"),
+    "anomalies": dict(marker="x", size=14, color="#d0021b", legend="Anomaly"),
+}
 
 
 def prepare_data(chart_state):
@@ -28,12 +30,14 @@ def prepare_data(chart_state):
 
 
 def create_figure(hours, title):
+    if hours:
+        title = f"{title}: {max(hours)}"
     fig = figure(
         x_axis_type="datetime",
         height=500,
         tools="xpan",
         width=1250,
-        title=f"{title}: {max(hours)}",
+        title=title,
     )
     return fig
 
@@ -90,3 +94,53 @@ def create_chart(chart_state: Dict, params: RetrieveEnergyDataRequest, title="Ch
     fig = add_line_and_hover(fig, source)
     script, div = components(fig)
     return div, script
+
+
+def add_overlays(fig, overlays: Dict[str, Dict]):
+    """
+    Mark analytics results, each a dict of hours and values, on the figure.
+    """
+    for name, points in overlays.items():
+        style = dict(OVERLAY_STYLES[name])
+        legend = style.pop("legend")
+        fig.scatter(
+            x="hours",
+            y="values",
+            source=ColumnDataSource(data=points),
+            legend_label=legend,
+            **style,
+        )
+    if overlays:
+        fig.legend.location = "top_left"
+        fig.legend.click_policy = "hide"
+    return fig
+
+
+def create_analytics_chart(
+    chart_state: Dict,
+    params: RetrieveEnergyDataRequest,
+    overlays: Dict[str, Dict],
+    title="Chart Title",
+):
+    curdoc().theme = "dark_minimal"
+    source = prepare_data(chart_state)
+    fig = create_figure(chart_state["x_state"], title=title)
+    fig = format_figure(fig, params)
+    fig = add_line_and_hover(fig, source)
+    fig = add_overlays(fig, overlays)
+    script, div = components(fig)
+    return div, script
+
+
+def create_streaming_chart(params: RetrieveEnergyDataRequest, title="Chart Title"):
+    """
+    Render an empty chart once; points are appended client-side from
+    ``chart_delta`` payloads into the source named ``STREAM_SOURCE_NAME``.
+    """
+    curdoc().theme = "dark_minimal"
+    source = ColumnDataSource(data=dict(hours=[], values=[]), name=STREAM_SOURCE_NAME)
+    fig = create_figure([], title=title)
+    fig = format_figure(fig, params)
+    fig = add_line_and_hover(fig, source)
+    script, div = components(fig)
+    return div, script
@@ -0,0 +1,383 @@
+import asyncio
+import fcntl
+import functools
+import json
+import logging
+import os
+import queue
+import socket
+import threading
+import time
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from sqlalchemy import (
+    Column,
+    Float,
+    Integer,
+    MetaData,
+    String,
+    Table,
+    Text,
+    create_engine,
+    delete,
+    func,
+    insert,
+    select,
+)
+from sqlalchemy.engine import Engine
+
+from energy_dashboard.database import configure_sqlite, create_tables
+from energy_dashboard.hot_store import load_hot_store
+from energy_dashboard.ingest import LiveTailPoller, on_ingest, publish_ingest
+from energy_dashboard.metrics import (
+    CLUSTER_CHANGES_TOTAL,
+    CLUSTER_LEADER,
+    SHARED_CACHE_LOOKUPS_TOTAL,
+)
+from energy_dashboard.models import EnergyData
+from energy_dashboard.rendering import renderer
+from energy_dashboard.snapshot import load_snapshot, snapshot
+from energy_dashboard.utils import ROOT_DIR
+
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+log = logging.getLogger(__name__)
+
+# Run as one of several worker processes sharing the database
+CLUSTER_ENABLED = os.getenv("CLUSTER_ENABLED", "false").lower() == "true"
+CLUSTER_DB_PATH = os.getenv("CLUSTER_DB_PATH", f"{ROOT_DIR}/cluster.db")
+CLUSTER_LOCK_PATH = os.getenv("CLUSTER_LOCK_PATH", f"{ROOT_DIR}/ingest-leader.lock")
+# Seconds between reads of the change log
+CLUSTER_POLL_INTERVAL = float(os.getenv("CLUSTER_POLL_INTERVAL", 1))
+# Seconds between attempts to take over ingest from a lost leader
+CLUSTER_LEADER_RETRY = float(os.getenv("CLUSTER_LEADER_RETRY", 5))
+# Seconds changes stay in the log; a worker further behind reloads its caches
+CLUSTER_CHANGES_KEEP = float(os.getenv("CLUSTER_CHANGES_KEEP", 3600))
+# Seconds an entry of the shared cache is served
+SHARED_CACHE_TTL = float(os.getenv("SHARED_CACHE_TTL", 24 * 3600))
+
+# Changes read per poll
+READ_BATCH_SIZE = 100
+
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+
+metadata = MetaData()
+
+changes = Table(
+    "changes",
+    metadata,
+    Column("id", Integer, primary_key=True, autoincrement=True),
+    Column("worker", String, nullable=False),
+    Column("created_at", Float, nullable=False, index=True),
+    Column("points", Text, nullable=False),
+    sqlite_autoincrement=True,
+)
+
+shared_entries = Table(
+    "shared_cache",
+    metadata,
+    Column("key", String, primary_key=True),
+    Column("value", Text, nullable=False),
+    Column("expires_at", Float, nullable=False),
+)
+
+
+class SharedStore:
+    """
+    The SQLite file the workers on one machine share: the change log and a
+    small key-value cache.
+    """
+
+    def __init__(self, path: str = CLUSTER_DB_PATH):
+        self.path = path
+
+    @functools.cached_property
+    def engine(self) -> Engine:
+        """
+        The file's engine, created with its tables on first use.
+        """
+        store = create_engine(f"sqlite:///{self.path}")
+        configure_sqlite(store)
+        create_tables(metadata, store)
+        return store
+
+
+class SharedCache:
+    """
+    Values computed by one worker and reused by the others, such as rendered
+    chart templates. Reads and writes block, so call them off the event loop.
+    """
+
+    def __init__(self, store: SharedStore, ttl: float = SHARED_CACHE_TTL):
+        self.store = store
+        self.ttl = ttl
+
+    def get(self, key: str) -> Optional[str]:
+        with self.store.engine.connect() as connection:
+            value = connection.execute(
+                select(shared_entries.c.value).where(
+                    shared_entries.c.key == key,
+                    shared_entries.c.expires_at > time.time(),
+                )
+            ).scalar()
+        SHARED_CACHE_LOOKUPS_TOTAL.inc(outcome="miss" if value is None else "hit")
+        return value
+
+    def set(self, key: str, value: str):
+        with self.store.engine.begin() as connection:
+            connection.execute(
+                insert(shared_entries)
+                .prefix_with("OR REPLACE")
+                .values(key=key, value=value, expires_at=time.time() + self.ttl)
+            )
+
+    def expire(self) -> int:
+        with self.store.engine.begin() as connection:
+            return connection.execute(
+                delete(shared_entries).where(shared_entries.c.expires_at <= time.time())
+            ).rowcount
+
+
+class ChangeLog:
+    """
+    Every ingest of every worker, in the order it was stored. Each worker
+    appends what it ingested and replays what the others did through its
+    own ingest listeners, so hot stores, snapshots and live charts stay
+    coherent whichever worker fetched the data.
+
+    Appends go through a writer thread in order, so ingest never waits on
+    the shared file.
+    """
+
+    def __init__(self, store: SharedStore, worker: str = WORKER_ID):
+        self.store = store
+        self.worker = worker
+        self.applied = 0
+        self.resyncs = 0
+        self._replaying = False
+        self._queue: "queue.Queue[List[Dict]]" = queue.Queue()
+        self._writer: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def head(self) -> int:
+        with self.store.engine.connect() as connection:
+            return connection.execute(select(func.max(changes.c.id))).scalar() or 0
+
+    def publish(self, points: Sequence):
+        """
+        Ingest listener appending this worker's new points to the log.
+        """
+        if self._replaying or not points:
+            return
+        self._queue.put([point.model_dump(mode="json") for point in points])
+        with self._lock:
+            if self._writer is None:
+                self._writer = threading.Thread(
+                    target=self._write, name="change-log", daemon=True
+                )
+                self._writer.start()
+
+    def flush(self):
+        """
+        Wait until every change published so far is in the log.
+        """
+        self._queue.join()
+
+    def _write(self):
+        while True:
+            points = self._queue.get()
+            try:
+                with self.store.engine.begin() as connection:
+                    connection.execute(
+                        insert(changes).values(
+                            worker=self.worker,
+                            created_at=time.time(),
+                            points=json.dumps(points),
+                        )
+                    )
+                CLUSTER_CHANGES_TOTAL.inc(direction="published")
+            except Exception:
+                log.exception("Could not append to the change log")
+            finally:
+                self._queue.task_done()
+
+    def read(self, after: int) -> Tuple[List, Optional[int]]:
+        """
+        Up to READ_BATCH_SIZE changes after ``after``, and the oldest id
+        still in the log.
+        """
+        with self.store.engine.connect() as connection:
+            rows = connection.execute(
+                select(changes.c.id, changes.c.worker, changes.c.points)
+                .where(changes.c.id > after)
+                .order_by(changes.c.id)
+                .limit(READ_BATCH_SIZE)
+            ).all()
+            oldest = connection.execute(select(func.min(changes.c.id))).scalar()
+        return rows, oldest
+
+    async def catch_up(self) -> int:
+        """
+        Replay the changes other workers logged since the last call.
+        """
+        replayed = 0
+        while True:
+            rows, oldest = await asyncio.to_thread(self.read, self.applied)
+            if oldest is not None and oldest > self.applied + 1 and self.applied:
+                await self.resync(oldest - 1)
+                continue
+            for change_id, worker, points in rows:
+                if worker != self.worker:
+                    self.replay(
+                        [
+                            EnergyData.model_validate(point)
+                            for point in json.loads(points)
+                        ]
+                    )
+                    replayed += 1
+                self.applied = change_id
+            if len(rows) < READ_BATCH_SIZE:
+                return replayed
+
+    def replay(self, points: List[EnergyData]):
+        self._replaying = True
+        try:
+            publish_ingest(points)
+        finally:
+            self._replaying = False
+        CLUSTER_CHANGES_TOTAL.inc(direction="applied")
+
+    async def resync(self, applied: int):
+        """
+        Reload the caches after falling behind changes pruned from the log.
+        """
+        log.warning(f"Change log pruned past change {self.applied}, reloading caches")
+        self.applied = applied
+        self.resyncs += 1
+        await load_hot_store()
+        if snapshot.loaded:
+            await load_snapshot()
+
+    def prune(self, keep: float = CLUSTER_CHANGES_KEEP) -> int:
+        with self.store.engine.begin() as connection:
+            return connection.execute(
+                delete(changes).where(changes.c.created_at < time.time() - keep)
+            ).rowcount
+
+
+class LeaderLock:
+    """
+    An exclusive flock on a file. The kernel releases it when the holding
+    process exits, however it exits, so a crashed leader is replaced by the
+    next worker to try.
+    """
+
+    def __init__(self, path: str = CLUSTER_LOCK_PATH):
+        self.path = path
+        self._fd: Optional[int] = None
+
+    @property
+    def held(self) -> bool:
+        return self._fd is not None
+
+    def acquire(self) -> bool:
+        if self._fd is not None:
+            return True
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(fd)
+            return False
+        os.ftruncate(fd, 0)
+        os.write(fd, f"{WORKER_ID}\n".encode("utf-8"))
+        self._fd = fd
+        return True
+
+    def release(self):
+        if self._fd is not None:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+            os.close(self._fd)
+            self._fd = None
+
+
+class Cluster:
+    """
+    Shared state for running several worker processes on one machine:
+
+    - one worker, holding the leader lock, runs scheduled ingest and prunes
+      the shared file; processes that only serve reads never contend for it;
+    - every worker follows the change log to keep its caches coherent;
+    - rendered chart templates are shared through the shared cache.
+    """
+
+    def __init__(self, path: str = CLUSTER_DB_PATH, lock_path: str = CLUSTER_LOCK_PATH):
+        self.store = SharedStore(path)
+        self.changes = ChangeLog(self.store)
+        self.cache = SharedCache(self.store)
+        self.leader = LeaderLock(lock_path)
+        self.poller: Optional[LiveTailPoller] = None
+        self._tasks: List[asyncio.Task] = []
+
+    async def start(self, poller: Optional[LiveTailPoller] = None, lead: bool = True):
+        """
+        Join the cluster. Call before the caches load, so changes logged
+        while they load are replayed rather than missed. Without ``lead``
+        the process only follows, so it can never take the leader lock from
+        a worker that would run ``poller``.
+        """
+        self.changes.applied = await asyncio.to_thread(self.changes.head)
+        self.poller = poller
+        renderer.shared_cache = self.cache
+        self._tasks = [asyncio.create_task(self._follow())]
+        if lead:
+            self._tasks.append(asyncio.create_task(self._lead()))
+        log.info(f"Worker {WORKER_ID} joined at change {self.changes.applied}")
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        if self.poller is not None:
+            await self.poller.stop()
+        await asyncio.to_thread(self.changes.flush)
+        self.leader.release()
+
+    async def _follow(self):
+        while True:
+            try:
+                await self.changes.catch_up()
+            except Exception:
+                log.exception("Could not follow the change log")
+            await asyncio.sleep(CLUSTER_POLL_INTERVAL)
+
+    async def _lead(self):
+        while not self.leader.acquire():
+            await asyncio.sleep(CLUSTER_LEADER_RETRY)
+        log.info(f"Worker {WORKER_ID} is the ingest leader")
+        if self.poller is not None:
+            self.poller.start()
+        while True:
+            try:
+                await asyncio.to_thread(self.changes.prune)
+                await asyncio.to_thread(self.cache.expire)
+            except Exception:
+                log.exception("Could not prune the shared store")
+            await asyncio.sleep(CLUSTER_CHANGES_KEEP / 10)
+
+    def status(self) -> Dict:
+        return {
+            "worker": WORKER_ID,
+            "pid": os.getpid(),
+            "leader": self.leader.held,
+            "applied": self.changes.applied,
+            "resyncs": self.changes.resyncs,
+        }
+
+
+cluster = Cluster()
+if CLUSTER_ENABLED:
+    on_ingest(cluster.changes.publish)
+CLUSTER_LEADER.collect_with(lambda: [({}, int(cluster.leader.held))])
@@ -0,0 +1,308 @@
+import argparse
+import json
+import os
+import secrets
+import signal
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+import httpx
+
+from energy_dashboard.loadtest import STARTUP_TIMEOUT, free_port
+from energy_dashboard.synthetic import respondent_codes
+
+# Runs several dashboard workers on one synthetic database, with a fake EIA
+# API whose clock runs fast, and checks that they behave as one deployment:
+# a single worker ingests, every worker sees what it ingested, and another
+# worker takes over when the leader dies. A fast_api process joins first and
+# must never lead, as it runs no poller. tests/test_cluster.py runs it with
+# two workers; run it on its own with
+#   python -m energy_dashboard.cluster_check --workers 3
+# Each worker is its own uvicorn process on its own port, so every one of
+# them can be asked for its state; under gunicorn or ``uvicorn --workers``
+# they would share one port but coordinate the same way.
+
+
+class Check:
+    def __init__(self, name: str):
+        self.name = name
+        self.ok = False
+        self.seconds = 0.0
+        self.detail: Dict = {}
+
+
+class ClusterStack:
+    """
+    The fake EIA API, a fast_api process and ``workers`` dashboard processes
+    sharing one database, change log and leader lock in a temporary
+    directory.
+    """
+
+    def __init__(self, args: argparse.Namespace):
+        self.args = args
+        self.workdir = tempfile.TemporaryDirectory(prefix="energy-cluster-")
+        self.database = os.path.join(self.workdir.name, "energy.db")
+        self.cluster_db = os.path.join(self.workdir.name, "cluster.db")
+        self.processes: Dict[str, subprocess.Popen] = {}
+        self.worker_urls: List[str] = []
+        self.follower = f"http://127.0.0.1:{free_port()}"
+        self.respondents = respondent_codes(args.respondents)
+        self.admin_token = secrets.token_hex(16)
+
+    def __enter__(self):
+        fakes_url = f"http://127.0.0.1:{free_port()}"
+        self.env = dict(
+            os.environ,
+            DATABASE_PATH=self.database,
+            DATABASE_ECHO="false",
+            SLOW_QUERY_DB_PATH=os.path.join(self.workdir.name, "slow_queries.db"),
+            ADMIN_TOKEN=self.admin_token,
+            CLUSTER_ENABLED="true",
+            CLUSTER_DB_PATH=self.cluster_db,
+            CLUSTER_LOCK_PATH=os.path.join(self.workdir.name, "leader.lock"),
+            CLUSTER_POLL_INTERVAL="0.5",
+            CLUSTER_LEADER_RETRY="1",
+            LIVE_TAIL_ENABLED="true",
+            LIVE_TAIL_INTERVAL=str(self.args.poll_interval),
+            LIVE_TAIL_RESPONDENTS=",".join(self.respondents),
+            EIA_BASE_URL=f"{fakes_url}/eia/v2",
+            API_KEY="offline",
+            FAKE_EIA_START=f"{self.args.start}T00",
+            FAKE_EIA_SPEEDUP=str(self.args.speedup),
+        )
+        self.populate()
+        self.start("energy_dashboard.fakes:offline_app", fakes_url)
+        # Started and ready first, so it would win the leader lock if it
+        # contended for it
+        self.start("energy_dashboard.fast_api:app", self.follower)
+        self.wait(self.follower)
+        for _ in range(self.args.workers):
+            url = f"http://127.0.0.1:{free_port()}"
+            self.worker_urls.append(url)
+            self.start("energy_dashboard.app:app", url)
+        for url in self.processes:
+            self.wait(url)
+        return self
+
+    def __exit__(self, *exc):
+        for process in self.processes.values():
+            if process.poll() is None:
+                process.terminate()
+        for process in self.processes.values():
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+        self.workdir.cleanup()
+
+    @property
+    def workers(self) -> List[str]:
+        return [url for url in self.worker_urls if self.processes[url].poll() is None]
+
+    def populate(self):
+        code = (
+            "from datetime import datetime\n"
+            "from energy_dashboard.database import engine, init_db\n"
+            "from energy_dashboard.synthetic import populate\n"
+            "init_db()\n"
+            f"populate(engine, {self.respondents!r}, "
+            f"datetime.strptime({self.args.start!r}, '%Y-%m-%d'), "
+            f"{self.args.days * 24})\n"
+        )
+        subprocess.run([sys.executable, "-c", code], env=self.env, check=True)
+
+    def start(self, target: str, url: str):
+        self.processes[url] = subprocess.Popen(
+            [
+                sys.executable,
+                "-m",
+                "uvicorn",
+                target,
+                "--port",
+                url.rsplit(":", 1)[1],
+                "--log-level",
+                "warning",
+            ],
+            env=self.env,
+        )
+
+    def wait(self, url: str):
+        deadline = time.monotonic() + STARTUP_TIMEOUT
+        while time.monotonic() < deadline:
+            try:
+                httpx.get(f"{url}/openapi.json", timeout=1)
+                return
+            except httpx.HTTPError:
+                time.sleep(0.2)
+        raise RuntimeError(f"{url} did not start within {STARTUP_TIMEOUT}s")
+
+    def kill(self, url: str):
+        os.kill(self.processes[url].pid, signal.SIGKILL)
+        self.processes[url].wait()
+
+    def status(self) -> Dict[str, Dict]:
+        return {
+            url: httpx.get(
+                f"{url}/api/v1/admin/cluster",
+                headers={"X-Admin-Token": self.admin_token},
+                timeout=10,
+            ).json()
+            for url in [self.follower, *self.workers]
+        }
+
+    def newest_stored(self) -> Dict[str, str]:
+        with sqlite3.connect(self.database) as connection:
+            rows = connection.execute(
+                "SELECT respondent, type_name, max(period) FROM energy_data "
+                "GROUP BY respondent, type_name"
+            ).fetchall()
+        return {
+            f"{respondent}/{type_name}": period.replace(" ", "T")[:19]
+            for respondent, type_name, period in rows
+        }
+
+    def newest_served(self, url: str) -> Dict[str, str]:
+        snapshot = httpx.get(f"{url}/api/v1/snapshot", timeout=10).json()
+        return {
+            f"{series['respondent']}/{series['type_name']}": series["period"][:19]
+            for series in snapshot["series"]
+        }
+
+    def change_writers(self) -> Dict[str, int]:
+        with sqlite3.connect(self.cluster_db) as connection:
+            return dict(
+                connection.execute(
+                    "SELECT worker, count(*) FROM changes GROUP BY worker"
+                ).fetchall()
+            )
+
+
+def until(check: Check, timeout: float, attempt: Callable[[], Optional[Dict]]):
+    """
+    Retry ``attempt`` until it returns details of a pass or time runs out.
+    """
+    began = time.monotonic()
+    while True:
+        try:
+            detail = attempt()
+        except httpx.HTTPError as exc:
+            detail, check.detail = None, {"error": repr(exc)}
+        if detail is not None:
+            check.ok, check.detail = True, detail
+            break
+        if time.monotonic() - began > timeout:
+            break
+        time.sleep(0.5)
+    check.seconds = time.monotonic() - began
+    return check
+
+
+def single_leader(stack: ClusterStack, check: Check) -> Optional[Dict]:
+    status = stack.status()
+    leaders = [url for url, worker in status.items() if worker["leader"]]
+    check.detail = {"leaders": leaders, "follower": stack.follower}
+    if len(leaders) != 1 or leaders[0] not in stack.workers:
+        return None
+    return {"leader": leaders[0], "workers": len(stack.workers)}
+
+
+def coherent(stack: ClusterStack, check: Check, after: Dict[str, str]):
+    """
+    Pass once the database has moved past ``after`` and every worker serves
+    at least what was stored when the attempt began.
+    """
+    stored = stack.newest_stored()
+    check.detail = {"stored": stored}
+    if not stored or any(stored[key] <= after.get(key, "") for key in stored):
+        return None
+    for url in stack.workers:
+        served = stack.newest_served(url)
+        if any(served.get(key, "") < period for key, period in stored.items()):
+            check.detail = {"stored": stored, "behind": url, "served": served}
+            return None
+    return {"stored": stored, "workers": len(stack.workers)}
+
+
+def run_checks(stack: ClusterStack, timeout: float) -> List[Check]:
+    leader = Check("single_leader")
+    checks = [until(leader, timeout, lambda: single_leader(stack, leader))]
+    if not leader.ok:
+        return checks
+
+    populated = stack.newest_stored()
+    sync = Check("coherent")
+    checks.append(until(sync, timeout, lambda: coherent(stack, sync, populated)))
+
+    writers = stack.change_writers()
+    status = stack.status()
+    only_leader = Check("only_leader_ingests")
+    only_leader.detail = {"writers": writers}
+    only_leader.ok = list(writers) == [status[leader.detail["leader"]]["worker"]]
+    checks.append(only_leader)
+
+    stack.kill(leader.detail["leader"])
+    failover = Check("failover")
+    checks.append(until(failover, timeout, lambda: single_leader(stack, failover)))
+    failover.detail["killed"] = leader.detail["leader"]
+    if not failover.ok:
+        return checks
+
+    before = stack.newest_stored()
+    resumed = Check("coherent_after_failover")
+    checks.append(until(resumed, timeout, lambda: coherent(stack, resumed, before)))
+    return checks
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Check several dashboard workers run as one deployment"
+    )
+    parser.add_argument("--workers", type=int, default=3)
+    parser.add_argument("--respondents", type=int, default=3)
+    parser.add_argument("--start", default="2023-01-01")
+    parser.add_argument("--days", type=int, default=2)
+    parser.add_argument(
+        "--speedup",
+        type=float,
+        default=10,
+        help="Simulated EIA hours per real second",
+    )
+    parser.add_argument("--poll-interval", type=float, default=1.0)
+    parser.add_argument("--timeout", type=float, default=30.0)
+    parser.add_argument("-o", "--output", help="Write results here, not stdout")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    with ClusterStack(args) as stack:
+        checks = run_checks(stack, args.timeout)
+    results = {
+        "generated_at": datetime.now().isoformat(timespec="seconds"),
+        "workers": args.workers,
+        "checks": {
+            check.name: {
+                "ok": check.ok,
+                "seconds": round(check.seconds, 2),
+                **check.detail,
+            }
+            for check in checks
+        },
+    }
+    report = json.dumps(results, indent=2, default=str)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(report + "\n")
+    else:
+        print(report)
+    if not all(check.ok for check in checks):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,5 @@
 import logging
+import os
 from pathlib import Path
 
 from databases import Database
@@ -8,15 +9,19 @@ from sqlalchemy import (
     String,
     Float,
     DateTime,
+    Index,
     MetaData,
     create_engine,
+    event,
     UniqueConstraint,
 )
+from sqlalchemy.exc import OperationalError
 from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.sql.ddl import CreateTable
 
+from energy_dashboard.metrics import DB_POOL_CONNECTIONS
 from energy_dashboard.utils import ROOT_DIR
 
 
@@ -25,8 +30,13 @@ logging.basicConfig(level=logging.INFO)
 log = logging.getLogger(__name__)
 
 # Define the URL for the SQLite database
-ASYNC_DATABASE_URL = f"sqlite+aiosqlite:///{ROOT_DIR}/energy.db"
-DATABASE_URL = f"sqlite:///{ROOT_DIR}/energy.db"
+DATABASE_PATH = os.getenv("DATABASE_PATH", f"{ROOT_DIR}/energy.db")
+ASYNC_DATABASE_URL = f"sqlite+aiosqlite:///{DATABASE_PATH}"
+DATABASE_URL = f"sqlite:///{DATABASE_PATH}"
+# Log every statement; turn off for benchmarks and production
+DATABASE_ECHO = os.getenv("DATABASE_ECHO", "true").lower() == "true"
+# Milliseconds a connection waits for another process's write lock
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", 10000))
 
 # Create a Database instance using the DATABASE_URL
 database = Database(DATABASE_URL)
@@ -54,6 +64,8 @@ class EnergyDataTable(Base):
         UniqueConstraint(
             "period", "respondent", "type", name="uix_period_respondent_type"
         ),
+        # Per-series scans in period order, e.g. gap detection
+        Index("ix_energy_data_respondent_type_period", "respondent", "type", "period"),
     )
 
     def __repr__(self):
@@ -63,17 +75,65 @@ class EnergyDataTable(Base):
 # Create an engine instance using the DATABASE_URL
 # TODO: Highlight the async and sync sessions
 ## Async engine for async queries (https://docs.sqlalchemy.org/en/20/orm/extensions/asyncio.html)
-async_engine = create_async_engine(ASYNC_DATABASE_URL, echo=True)
+async_engine = create_async_engine(ASYNC_DATABASE_URL, echo=DATABASE_ECHO)
 AsyncSessionLocal = async_sessionmaker(
     autocommit=False, autoflush=False, bind=async_engine
 )
 
 ## Sync engine for sync queries
-engine = create_engine(DATABASE_URL, echo=True)
+engine = create_engine(DATABASE_URL, echo=DATABASE_ECHO)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
-# Create the tables defined in the metadata
-Base.metadata.create_all(engine)
+
+def configure_sqlite(bound):
+    """
+    Put every connection of an engine in WAL mode with a busy timeout, so
+    several worker processes can share the file: readers never block the
+    writer, and a writer waits for the lock instead of failing at once.
+    """
+
+    @event.listens_for(bound, "connect")
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.close()
+
+
+configure_sqlite(async_engine.sync_engine)
+configure_sqlite(engine)
+
+
+def pool_connections():
+    for name, bound in (("async", async_engine.sync_engine), ("sync", engine)):
+        pool = bound.pool
+        if hasattr(pool, "checkedout"):
+            yield {"engine": name, "state": "checked_out"}, pool.checkedout()
+            yield {"engine": name, "state": "idle"}, pool.checkedin()
+
+
+DB_POOL_CONNECTIONS.collect_with(pool_connections)
+
+
+def create_tables(tables: MetaData, bound):
+    """
+    Create the missing tables of ``tables``. Worker processes starting
+    together race to create them, so a loser checks again.
+    """
+    try:
+        tables.create_all(bound)
+    except OperationalError as exc:
+        log.info(f"Tables created by another process meanwhile: {exc.orig}")
+        tables.create_all(bound)
+
+
+def init_db():
+    """
+    Create the tables defined in the metadata. Called on startup rather than
+    on import, so importing the package never touches the database file.
+    """
+    create_tables(Base.metadata, engine)
 
 
 def get_energy_data_schema() -> str:
@@ -0,0 +1,281 @@
+import asyncio
+import json
+import math
+import os
+import re
+import time
+import zlib
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from fastapi import FastAPI, Request
+
+from energy_dashboard.ingest import EIA_PERIOD_FORMAT, utc_hour
+from energy_dashboard.models import EnergyType
+
+# Local stand-ins for the external services the dashboard talks to, so it can
+# be developed, benchmarked and load tested offline. Run the fake EIA API with
+#   uvicorn energy_dashboard.fakes:eia_app --port 8001
+# and point the dashboard at it with EIA_BASE_URL=http://127.0.0.1:8001/v2
+# The fake LLM is an OpenAI-compatible API; run it, or both fakes at once, with
+#   uvicorn energy_dashboard.fakes:offline_app --port 8001
+# and EIA_BASE_URL=http://127.0.0.1:8001/eia/v2,
+# OPENAI_BASE_URL=http://127.0.0.1:8001/llm/v1 and any OPENAI_API_KEY.
+# The end-to-end tests serve offline_app in process through httpx.
+
+FAKE_EIA_START = datetime.strptime(
+    os.getenv("FAKE_EIA_START", "2023-01-01T00"), EIA_PERIOD_FORMAT
+)
+# Simulated hours that pass per real second; 0 follows the wall clock
+FAKE_EIA_SPEEDUP = float(os.getenv("FAKE_EIA_SPEEDUP", 0))
+EIA_MAX_LENGTH = 5000
+# Seconds the fake LLM takes per completion
+FAKE_LLM_LATENCY = float(os.getenv("FAKE_LLM_LATENCY", "0.5"))
+# Days a prompt without dates asks for
+FAKE_LLM_DAYS = 7
+
+RESPONDENTS = {
+    "CISO": ("California Independent System Operator", 26000),
+    "ERCO": ("Electric Reliability Council of Texas, Inc.", 48000),
+    "ISNE": ("ISO New England", 14000),
+    "MISO": ("Midcontinent Independent System Operator, Inc.", 80000),
+    "NYIS": ("New York Independent System Operator", 18000),
+    "PJM": ("PJM Interconnection, LLC", 90000),
+    "SWPP": ("Southwest Power Pool", 32000),
+}
+
+
+def respondent_info(respondent: str) -> Tuple[str, float]:
+    """
+    Name and base load of a respondent; unknown codes get a stable base
+    derived from the code so synthetic respondents differ from each other.
+    """
+    if respondent in RESPONDENTS:
+        return RESPONDENTS[respondent]
+    base = 10000 + zlib.crc32(respondent.encode("utf-8")) % 80000
+    return respondent, base
+
+
+def synthetic_value(respondent: str, type_code: str, period: datetime) -> float:
+    """
+    A deterministic, plausible hourly value: a daily and a seasonal cycle
+    around the respondent's base load, with a little per-hour noise.
+    """
+    _, base = respondent_info(respondent)
+    day = 0.12 * math.sin(2 * math.pi * (period.hour - 9) / 24)
+    season = 0.15 * math.cos(2 * math.pi * (period.timetuple().tm_yday - 200) / 365)
+    seed = f"{respondent}{type_code}{period:%Y%m%d%H}".encode("utf-8")
+    noise = (zlib.crc32(seed) % 1000) / 1000 * 0.04 - 0.02
+    value = base * (1 + day + season + noise)
+    if type_code == EnergyType.NG.name:
+        value *= 0.97
+    return round(value, 1)
+
+
+def synthetic_item(respondent: str, type_code: str, period: datetime) -> Dict:
+    name, _ = respondent_info(respondent)
+    return {
+        "period": period.strftime(EIA_PERIOD_FORMAT),
+        "respondent": respondent,
+        "respondent-name": name,
+        "type": type_code,
+        "type-name": EnergyType[type_code].value,
+        "value": synthetic_value(respondent, type_code, period),
+        "value-units": "megawatthours",
+    }
+
+
+class FakeEIA:
+    """
+    Serves synthetic region-data from ``start`` up to a clock that follows
+    real time, optionally sped up so new hours appear every few seconds.
+    """
+
+    def __init__(
+        self, start: datetime = FAKE_EIA_START, speedup: float = FAKE_EIA_SPEEDUP
+    ):
+        self.start = start
+        self.speedup = speedup
+        self.started = time.monotonic()
+        self.requests = 0
+
+    def latest_hour(self) -> datetime:
+        if self.speedup:
+            elapsed = (time.monotonic() - self.started) * self.speedup
+            return self.start + timedelta(hours=int(elapsed))
+        return utc_hour()
+
+    def region_data(
+        self,
+        respondents: List[str],
+        types: List[str],
+        start: Optional[str],
+        end: Optional[str],
+        offset: int,
+        length: int,
+        descending=False,
+    ) -> Dict:
+        self.requests += 1
+        first = (
+            max(self.start, datetime.strptime(start, EIA_PERIOD_FORMAT))
+            if start
+            else self.start
+        )
+        last = self.latest_hour()
+        if end:
+            last = min(last, datetime.strptime(end, EIA_PERIOD_FORMAT))
+        respondents = respondents or sorted(RESPONDENTS)
+        types = types or [energy_type.name for energy_type in EnergyType]
+        series = [
+            (respondent, type_code) for respondent in respondents for type_code in types
+        ]
+
+        hours = max(0, int((last - first).total_seconds() // 3600) + 1)
+        total = hours * len(series)
+        data = []
+        for index in range(offset, min(total, offset + min(length, EIA_MAX_LENGTH))):
+            hour, position = divmod(index, len(series))
+            if descending:
+                hour = hours - 1 - hour
+            respondent, type_code = series[position]
+            data.append(
+                synthetic_item(respondent, type_code, first + timedelta(hours=hour))
+            )
+        return {
+            "response": {
+                "total": str(total),
+                "dateFormat": 'YYYY-MM-DD"T"HH24',
+                "frequency": "hourly",
+                "data": data,
+            },
+            "apiVersion": "2.1.6",
+        }
+
+
+def create_eia_app(fake: FakeEIA) -> FastAPI:
+    eia = FastAPI()
+
+    @eia.get("/v2/electricity/rto/region-data/data/")
+    async def region_data(request: Request):
+        query = request.query_params
+        return fake.region_data(
+            respondents=query.getlist("facets[respondent][]"),
+            types=query.getlist("facets[type][]"),
+            start=query.get("start"),
+            end=query.get("end"),
+            offset=int(query.get("offset", 0)),
+            length=int(query.get("length", EIA_MAX_LENGTH)),
+            descending=query.get("sort[0][direction]") == "desc",
+        )
+
+    return eia
+
+
+class FakeLLM:
+    """
+    Answers SQL prompts like the model behind ``llm.gen_async_client`` would:
+    a select over energy_data for the respondent, type and dates named in
+    the prompt, after ``latency`` seconds.
+    """
+
+    def __init__(self, latency: float = FAKE_LLM_LATENCY, start=FAKE_EIA_START):
+        self.latency = latency
+        self.start = start
+        self.requests = 0
+
+    def select_query(self, prompt: str) -> Dict:
+        """
+        ``SqlSelectQuery`` fields for a prompt.
+        """
+        words = set(re.findall(r"[A-Z]+", prompt.upper()))
+        respondent = next(
+            (code for code in sorted(RESPONDENTS) if code in words), "PJM"
+        )
+        type_code = EnergyType.NG.name if "GENERATION" in words else EnergyType.D.name
+        dates = re.findall(r"\d{4}-\d{2}-\d{2}", prompt)
+        start = datetime.strptime(dates[0], "%Y-%m-%d") if dates else self.start
+        end = (
+            datetime.strptime(dates[1], "%Y-%m-%d")
+            if len(dates) > 1
+            else start + timedelta(days=FAKE_LLM_DAYS)
+        )
+        start, end = f"{start:%Y-%m-%d}", f"{end:%Y-%m-%d}"
+        select_stmt = (
+            f"SELECT * FROM energy_data WHERE respondent = '{respondent}' "
+            f"AND type = '{type_code}' "
+            f"AND period BETWEEN '{start}' AND '{end} 23:59:59' ORDER BY period"
+        )
+        return {
+            "select_stmt": select_stmt,
+            "explain_stmt": f"EXPLAIN QUERY PLAN {select_stmt}",
+            "start_date": start,
+            "end_date": end,
+        }
+
+    def completion(self, body: Dict) -> Dict:
+        """
+        An OpenAI chat completion for a request body, answering through the
+        requested tool when there is one and as JSON content otherwise.
+        """
+        self.requests += 1
+        prompt = next(
+            (
+                message["content"]
+                for message in reversed(body.get("messages", []))
+                if message.get("role") == "user"
+            ),
+            "",
+        )
+        arguments = json.dumps(self.select_query(str(prompt)))
+        tools = body.get("tools") or []
+        if tools:
+            message = {
+                "role": "assistant",
+                "content": None,
+                "tool_calls": [
+                    {
+                        "id": f"call_fake_{self.requests}",
+                        "type": "function",
+                        "function": {
+                            "name": tools[0]["function"]["name"],
+                            "arguments": arguments,
+                        },
+                    }
+                ],
+            }
+            finish_reason = "tool_calls"
+        else:
+            message = {"role": "assistant", "content": arguments}
+            finish_reason = "stop"
+        return {
+            "id": f"chatcmpl-fake-{self.requests}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "fake"),
+            "choices": [
+                {"index": 0, "message": message, "finish_reason": finish_reason}
+            ],
+            "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+        }
+
+
+def create_llm_app(fake: FakeLLM) -> FastAPI:
+    llm = FastAPI()
+
+    @llm.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        await asyncio.sleep(fake.latency)
+        return fake.completion(body)
+
+    return llm
+
+
+fake_eia = FakeEIA()
+eia_app = create_eia_app(fake_eia)
+fake_llm = FakeLLM()
+llm_app = create_llm_app(fake_llm)
+
+offline_app = FastAPI()
+offline_app.mount("/eia", eia_app)
+offline_app.mount("/llm", llm_app)
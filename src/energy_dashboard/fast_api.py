@@ -1,21 +1,79 @@
-import asyncio
+import contextlib
 import logging
+import os
 import typing
+from datetime import datetime
 from typing import Annotated
 
 import httpx
+from dotenv import load_dotenv
 from fastapi import Depends, Body, Form, FastAPI, Request, Query
 from fastapi.exceptions import RequestValidationError
 from sqlalchemy.ext.asyncio import AsyncSession
-from starlette.responses import StreamingResponse, JSONResponse, HTMLResponse
+from sqlalchemy.orm import Session
+from starlette.responses import (
+    HTMLResponse,
+    JSONResponse,
+    PlainTextResponse,
+    Response,
+    StreamingResponse,
+)
 from starlette.templating import Jinja2Templates
 
-from energy_dashboard.database import SessionLocal, AsyncSessionLocal
-from energy_dashboard.models import RetrieveEnergyDataRequest, SeedEnergyDataRequest
+from energy_dashboard import admin
+from energy_dashboard.admission import AdmissionMiddleware
+from energy_dashboard.cluster import CLUSTER_ENABLED, cluster
+from energy_dashboard.database import SessionLocal, AsyncSessionLocal, init_db
+from energy_dashboard.hot_store import load_hot_store
+from energy_dashboard.metrics import (
+    PROMETHEUS_CONTENT_TYPE,
+    MetricsMiddleware,
+    render_metrics,
+)
+from energy_dashboard.models import (
+    EnergyType,
+    RetrieveEnergyDataRequest,
+    SeedEnergyDataRequest,
+)
+from energy_dashboard.profiler import ProfilingMiddleware
 from energy_dashboard.services import EnergyDataService
-from energy_dashboard.sql_alchemy import Session
+from energy_dashboard.utils import TEMPLATES_DIR, parse_date_range
+from energy_dashboard.versions import data_versions
+from energy_dashboard.wire import (
+    WIRE_COLUMNS,
+    GzipStream,
+    UnsupportedWireFormat,
+    accepts_gzip,
+    negotiate,
+)
+
+# Rows of the /energy_data table rendered per request; the next page is
+# fetched as the last row scrolls into view
+TABLE_PAGE_SIZE = int(os.getenv("TABLE_PAGE_SIZE", 100))
+# Bytes of a rendered page collected before they are sent as one chunk
+TEMPLATE_CHUNK_BYTES = int(os.getenv("TEMPLATE_CHUNK_BYTES", 16 * 1024))
 
-app = FastAPI()
+
+@contextlib.asynccontextmanager
+async def lifespan(app: FastAPI):
+    load_dotenv()
+    init_db()
+    if CLUSTER_ENABLED:
+        # Follow only: this app runs no poller, so leading would stop the
+        # dashboard workers from ingesting
+        await cluster.start(lead=False)
+        # The hot store only stays current where every ingest is replayed;
+        # otherwise hours stored by the dashboard app would be missed
+        await load_hot_store()
+    yield
+    if CLUSTER_ENABLED:
+        await cluster.stop()
+
+
+app = FastAPI(lifespan=lifespan)
+app.add_middleware(AdmissionMiddleware)
+app.add_middleware(MetricsMiddleware)
+app.add_middleware(ProfilingMiddleware)
 
 
 # Dependency function to get an instance of the database
@@ -48,12 +106,65 @@ def app_context(request: Request) -> typing.Dict[str, typing.Any]:
     return {"app": request.app}
 
 
-templates = Jinja2Templates(
-    directory="templates",
-)
+templates = Jinja2Templates(directory=TEMPLATES_DIR)
+
 
+def stream_template(
+    request: Request,
+    name: str,
+    context: typing.Dict[str, typing.Any],
+    headers: typing.Dict[str, str],
+) -> StreamingResponse:
+    """
+    Send a template in chunks of about TEMPLATE_CHUNK_BYTES as it renders,
+    rather than rendering the whole page into memory first.
+    """
+    template = templates.get_template(name)
+    context = {"request": request, **context}
+
+    def chunks():
+        buffer, size = [], 0
+        for piece in template.generate(context):
+            buffer.append(piece)
+            size += len(piece)
+            if size >= TEMPLATE_CHUNK_BYTES:
+                yield "".join(buffer)
+                buffer, size = [], 0
+        if buffer:
+            yield "".join(buffer)
+
+    return StreamingResponse(chunks(), media_type="text/html", headers=headers)
 
-@app.get("/", response_class=HTMLResponse)
+
+async def table_page(
+    request: Request,
+    name: str,
+    params: RetrieveEnergyDataRequest,
+    after: typing.Optional[datetime],
+    service: EnergyDataService,
+    headers: typing.Dict[str, str],
+) -> StreamingResponse:
+    """
+    Stream one page of the table, ending in a row that loads the next page
+    while there is one.
+    """
+    rows = await service.list_page(params, after, TABLE_PAGE_SIZE + 1)
+    next_url = None
+    if len(rows) > TABLE_PAGE_SIZE:
+        rows = rows[:TABLE_PAGE_SIZE]
+        next_url = request.url_for("energy_data_rows").include_query_params(
+            respondent=params.respondent,
+            type_name=params.type_name.value,
+            start_date=params.start_date,
+            end_date=params.end_date,
+            after=rows[-1]["period"],
+        )
+    return stream_template(
+        request, name, {"energy_data": rows, "next_url": next_url}, headers
+    )
+
+
+@app.get("/", name="index", response_class=HTMLResponse)
 async def index(request: Request):
     return templates.TemplateResponse(
         request=request,
@@ -75,7 +186,9 @@ async def get_energy_data(
     service: EnergyDataService = Depends(get_energy_service),
 ):
     """
-    Endpoint to get energy data based on the provided parameters.
+    Endpoint to get energy data based on the provided parameters, as a table
+    page holding the first TABLE_PAGE_SIZE rows; the rest are loaded from
+    /energy_data/rows as the table is scrolled.
 
     Parameters:
     respondent (str): The respondent for the data entry.
@@ -85,7 +198,7 @@ async def get_energy_data(
     service (EnergyDataService): The service to fetch the data.
 
     Returns:
-    JSONResponse: The energy data.
+    StreamingResponse: The first page of the energy data table.
     """
 
     if not all([respondent, type_name, start_date, end_date]):
@@ -100,13 +213,63 @@ async def get_energy_data(
         start_date=start_date,
         end_date=end_date,
     )
+    start, end = parse_date_range(start_date, end_date)
+    validators = await data_versions.validators(
+        request, start, end, [respondent], params.type_name.value
+    )
+    if validators.matches(request):
+        return validators.not_modified()
+
+    return await table_page(
+        request, "fast_api.jinja2", params, None, service, validators.headers
+    )
 
-    data = await service.list_all(None, params)
 
-    return templates.TemplateResponse(
-        request=request,
-        name="fast_api.jinja2",
-        context={"energy_data": data},
+@app.get("/energy_data/rows", name="energy_data_rows", response_class=HTMLResponse)
+async def get_energy_data_rows(
+    request: Request,
+    respondent: str = Query(...),
+    type_name: EnergyType = Query(...),
+    start_date: str = Query(...),
+    end_date: str = Query(...),
+    after: datetime = Query(...),
+    service: EnergyDataService = Depends(get_energy_service),
+):
+    """
+    The rows of the energy data table following the period ``after``, for
+    the table's next page.
+
+    Parameters:
+    respondent (str): The respondent for the data entry.
+    type_name (EnergyType): The type_name of the data entry.
+    start_date (str): The start date for the data entry.
+    end_date (str): The end date for the data entry.
+    after (datetime): The period of the last row already shown.
+    service (EnergyDataService): The service to fetch the data.
+
+    Returns:
+    StreamingResponse: The table rows of the next page.
+    """
+    params = RetrieveEnergyDataRequest(
+        respondent=respondent,
+        type_name=type_name,
+        start_date=start_date,
+        end_date=end_date,
+    )
+    _, end = parse_date_range(start_date, end_date)
+    validators = await data_versions.validators(
+        request, after, end, [respondent], type_name.value
+    )
+    if validators.matches(request):
+        return validators.not_modified()
+
+    return await table_page(
+        request,
+        "partials/table_rows.jinja2",
+        params,
+        after,
+        service,
+        validators.headers,
     )
 
 
@@ -115,24 +278,76 @@ async def get_energy_data(
     name="stream-energy-data",
     response_class=StreamingResponse,
 )
-async def stream_energy_data(service: EnergyDataService = Depends(get_energy_service)):
+async def stream_energy_data(
+    request: Request,
+    respondent: str = Query(...),
+    type_name: EnergyType = Query(...),
+    start_date: str = Query(...),
+    end_date: str = Query(...),
+    format: typing.Optional[str] = Query(None),
+    compress: bool = Query(False),
+    batch_size: int = Query(1000, gt=0, le=50_000),
+    service: EnergyDataService = Depends(get_energy_service),
+):
     """
-    Stream the energy data as Server-Sent Events (SSE).
+    Stream the energy data as columnar batches for downstream consumers.
 
     Parameters:
+    respondent (str): The respondent for the data entry.
+    type_name (EnergyType): The type_name of the data entry.
+    start_date (str): The start date for the data entry.
+    end_date (str): The end date for the data entry.
+    format (str): ndjson, msgpack or arrow; negotiated from Accept if omitted.
+    compress (bool): Gzip the stream even if Accept-Encoding does not ask for it.
+    batch_size (int): The number of rows per batch.
     service (EnergyDataService): The service to fetch the data.
 
     Returns:
-    StreamingResponse: The energy data as SSE.
+    StreamingResponse: The energy data in the negotiated wire format.
     """
+    try:
+        wire_format, encoder = negotiate(request.headers.get("accept"), format)
+    except UnsupportedWireFormat as exc:
+        return JSONResponse(status_code=406, content={"message": str(exc)})
+
+    params = RetrieveEnergyDataRequest(
+        respondent=respondent,
+        type_name=type_name,
+        start_date=start_date,
+        end_date=end_date,
+    )
+    gzip = compress or accepts_gzip(request.headers.get("accept-encoding"))
+    start, end = parse_date_range(start_date, end_date)
+    validators = await data_versions.validators(
+        request,
+        start,
+        end,
+        [respondent],
+        type_name.value,
+        variant=f"{wire_format.value}|gzip={gzip}",
+    )
+    headers = {"Vary": "Accept, Accept-Encoding", **validators.headers}
+    if validators.matches(request):
+        return Response(status_code=304, headers=headers)
+    if gzip:
+        headers["Content-Encoding"] = "gzip"
 
     async def streaming_data():
-        strm = service.stream_all()
-        async for data in strm:
-            yield f"data: {data.model_dump_json(indent=4)}\n\n"
-            await asyncio.sleep(1)
+        compressor = GzipStream() if gzip else None
+        chunks = service.stream_columns(params, WIRE_COLUMNS, batch_size=batch_size)
+
+        def encoded(data: bytes) -> bytes:
+            return compressor.compress(data) if compressor else data
 
-    return StreamingResponse(streaming_data(), media_type="text/event-stream")
+        yield encoded(encoder.header())
+        async for batch in chunks:
+            yield encoded(encoder.encode(batch))
+        tail = encoder.footer()
+        yield compressor.compress(tail) + compressor.close() if compressor else tail
+
+    return StreamingResponse(
+        streaming_data(), media_type=wire_format.value, headers=headers
+    )
 
 
 @app.post("/api/v1/seed-data/")
@@ -153,6 +368,11 @@ async def seed_energy_data(
     return await service.fetch_data(params=request_body.params)
 
 
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    return PlainTextResponse(render_metrics(), media_type=PROMETHEUS_CONTENT_TYPE)
+
+
 @app.exception_handler(RequestValidationError)
 async def validation_exception_handler(request: Request, exc: RequestValidationError):
     logging.error(f"Validation error: {exc} in request: {request}")
@@ -163,6 +383,9 @@ async def validation_exception_handler(request: Request, exc: RequestValidationE
     )
 
 
+app.include_router(admin.router)
+
+
 if __name__ == "__main__":
     import uvicorn
 
@@ -0,0 +1,244 @@
+import logging
+import math
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, NamedTuple, Optional, Sequence, Tuple
+
+from sqlalchemy import DateTime, and_, func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from energy_dashboard.database import EnergyDataTable
+from energy_dashboard.ingest import EIA_PAGE_LENGTH, EIA_PERIOD_FORMAT
+from energy_dashboard.models import EnergyType
+
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+log = logging.getLogger(__name__)
+
+HOUR = timedelta(hours=1)
+# Stored hours worth refetching to save a request between two gaps
+MERGE_HOURS = 24
+
+
+class Gap(NamedTuple):
+    """
+    Missing hours of one series, both ends inclusive.
+    """
+
+    respondent: str
+    type: str
+    start: datetime
+    end: datetime
+
+    @property
+    def hours(self) -> int:
+        return int((self.end - self.start) / HOUR) + 1
+
+
+class FetchWindow(NamedTuple):
+    """
+    One EIA request: every hour from start to end, both inclusive, for each
+    combination of the respondent and type facets.
+    """
+
+    start: datetime
+    end: datetime
+    respondents: Tuple[str, ...]
+    types: Tuple[str, ...]
+
+    @property
+    def rows(self) -> int:
+        hours = int((self.end - self.start) / HOUR) + 1
+        return hours * len(self.respondents) * len(self.types)
+
+    @property
+    def pages(self) -> int:
+        return math.ceil(self.rows / EIA_PAGE_LENGTH)
+
+    def params(self) -> Dict:
+        """
+        EIA region-data query parameters for this window.
+        """
+        return {
+            "frequency": "hourly",
+            "data[0]": "value",
+            "facets[respondent][]": list(self.respondents),
+            "facets[type][]": list(self.types),
+            "start": self.start.strftime(EIA_PERIOD_FORMAT),
+            "end": self.end.strftime(EIA_PERIOD_FORMAT),
+            "sort[0][column]": "period",
+            "sort[0][direction]": "asc",
+            "offset": 0,
+            "length": EIA_PAGE_LENGTH,
+        }
+
+
+def _series_filter(
+    respondents: Optional[Sequence[str]], types: Optional[Sequence[str]]
+):
+    table = EnergyDataTable.__table__
+    clauses = []
+    if respondents:
+        clauses.append(table.c.respondent.in_(respondents))
+    if types:
+        clauses.append(table.c.type.in_(types))
+    return clauses
+
+
+async def scan_gaps(
+    async_db: AsyncSession,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    respondents: Optional[Sequence[str]] = None,
+    types: Optional[Sequence[str]] = None,
+) -> List[Gap]:
+    """
+    Find the missing hours of every (respondent, type) series between start
+    and end, which default to the oldest and newest stored hour.
+
+    Both queries walk the (respondent, type, period) index in order: a LAG
+    window pairs each row with the previous hour of its series to find
+    interior holes, and per-series MIN/MAX find the edges of the range.
+    Requested respondents without rows in the range are missing all of it,
+    for every requested type or, if none were given, every ``EnergyType``.
+    """
+    table = EnergyDataTable.__table__
+    clauses = _series_filter(respondents, types)
+
+    bounds = select(
+        table.c.respondent,
+        table.c.type,
+        func.min(table.c.period).label("first"),
+        func.max(table.c.period).label("last"),
+    ).group_by(table.c.respondent, table.c.type)
+    if clauses:
+        bounds = bounds.where(and_(*clauses))
+    series = {
+        (respondent, type_): (first, last)
+        for respondent, type_, first, last in await async_db.execute(bounds)
+    }
+    requested = {
+        (respondent, type_)
+        for respondent in respondents or ()
+        for type_ in types or [energy_type.name for energy_type in EnergyType]
+    }
+    # With nothing stored there is no range to default to
+    if not series and not (requested and start and end):
+        return []
+    start = start or min(first for first, _ in series.values())
+    end = end or max(last for _, last in series.values())
+
+    in_range = [*clauses, table.c.period >= start, table.c.period <= end]
+    previous = (
+        func.lag(table.c.period, type_=DateTime)
+        .over(
+            partition_by=(table.c.respondent, table.c.type),
+            order_by=table.c.period,
+        )
+        .label("previous")
+    )
+    ordered = (
+        select(table.c.respondent, table.c.type, table.c.period, previous)
+        .where(and_(*in_range))
+        .subquery()
+    )
+    holes = select(ordered).where(
+        ordered.c.previous.is_not(None),
+        (func.julianday(ordered.c.period) - func.julianday(ordered.c.previous)) * 24
+        > 1.5,
+    )
+
+    gaps = [
+        Gap(respondent, type_, previous + HOUR, period - HOUR)
+        for respondent, type_, period, previous in await async_db.execute(holes)
+    ]
+
+    # Edges, from the bounds of each series within the range
+    in_range_bounds = bounds.where(table.c.period >= start, table.c.period <= end)
+    covered = {
+        (respondent, type_): (first, last)
+        for respondent, type_, first, last in await async_db.execute(in_range_bounds)
+    }
+    for respondent, type_ in set(series) | requested:
+        first, last = covered.get((respondent, type_), (None, None))
+        if first is None:
+            gaps.append(Gap(respondent, type_, start, end))
+            continue
+        if first > start:
+            gaps.append(Gap(respondent, type_, start, first - HOUR))
+        if last < end:
+            gaps.append(Gap(respondent, type_, last + HOUR, end))
+
+    return sorted(gaps)
+
+
+def merge_series_gaps(gaps: Iterable[Gap], merge_hours=MERGE_HOURS) -> List[Gap]:
+    """
+    Join gaps of the same series that are at most merge_hours apart, since
+    refetching a few stored hours is cheaper than another request.
+    """
+    merged: List[Gap] = []
+    for gap in sorted(gaps):
+        last = merged[-1] if merged else None
+        if (
+            last is not None
+            and (last.respondent, last.type) == (gap.respondent, gap.type)
+            and gap.start - last.end <= (merge_hours + 1) * HOUR
+        ):
+            merged[-1] = last._replace(end=max(last.end, gap.end))
+        else:
+            merged.append(gap)
+    return merged
+
+
+def _combine(window: FetchWindow, gap: Gap) -> FetchWindow:
+    return FetchWindow(
+        start=min(window.start, gap.start),
+        end=max(window.end, gap.end),
+        respondents=tuple(sorted({*window.respondents, gap.respondent})),
+        types=tuple(sorted({*window.types, gap.type})),
+    )
+
+
+def plan_windows(gaps: Iterable[Gap], merge_hours=MERGE_HOURS) -> List[FetchWindow]:
+    """
+    Cover the gaps with as few EIA requests as possible. Gaps are taken in
+    start order and folded into the current window as long as the combined
+    window needs no more pages than fetching the two separately; refetched
+    hours that are already stored are skipped on ingest.
+    """
+    windows: List[FetchWindow] = []
+    current: Optional[FetchWindow] = None
+    for gap in sorted(
+        merge_series_gaps(gaps, merge_hours), key=lambda gap: (gap.start, gap.end)
+    ):
+        alone = FetchWindow(gap.start, gap.end, (gap.respondent,), (gap.type,))
+        if current is None:
+            current = alone
+            continue
+        combined = _combine(current, gap)
+        if combined.pages <= current.pages + alone.pages:
+            current = combined
+        else:
+            windows.append(current)
+            current = alone
+    if current is not None:
+        windows.append(current)
+    return windows
+
+
+async def backfill(service, windows: Iterable[FetchWindow]) -> int:
+    """
+    Fetch each window through ``EnergyDataService`` and return how many
+    missing rows were stored.
+    """
+    stored = 0
+    for window in windows:
+        inserted = await service.ingest_new(window.params())
+        log.info(
+            f"Backfilled {len(inserted)} of {window.rows} rows for "
+            f"{','.join(window.respondents)} {','.join(window.types)} "
+            f"{window.start} - {window.end}"
+        )
+        stored += len(inserted)
+    return stored
@@ -0,0 +1,279 @@
+import logging
+import math
+import os
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from energy_dashboard.database import AsyncSessionLocal, EnergyDataTable
+from energy_dashboard.ingest import on_ingest
+from energy_dashboard.models import EnergyData, RetrieveEnergyDataRequest
+from energy_dashboard.utils import parse_date_range
+
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+log = logging.getLogger(__name__)
+
+HOT_STORE_ENABLED = os.getenv("HOT_STORE_ENABLED", "true").lower() == "true"
+# Hours kept per series, counted back from the newest stored hour
+HOT_STORE_HOURS = int(os.getenv("HOT_STORE_HOURS", 24 * 42))
+HOT_STORE_MAX_BYTES = int(os.getenv("HOT_STORE_MAX_MB", 64)) * 1024 * 1024
+
+HOUR = timedelta(hours=1)
+# A float64 value and an int64 row id per series and hour
+BYTES_PER_HOUR = 16
+LOAD_BATCH_SIZE = 5000
+
+
+class HotSeries:
+    """
+    One (respondent, type) series as arrays indexed by hour offset from the
+    store's origin. An id of 0 marks an hour with no stored row.
+    """
+
+    __slots__ = (
+        "respondent",
+        "respondent_name",
+        "type",
+        "type_name",
+        "value_units",
+        "values",
+        "ids",
+    )
+
+    def __init__(self, point, hours: int):
+        self.respondent = point.respondent
+        self.respondent_name = point.respondent_name
+        self.type = point.type
+        self.type_name = point.type_name
+        self.value_units = point.value_units
+        self.values = np.full(hours, np.nan, dtype=np.float64)
+        self.ids = np.zeros(hours, dtype=np.int64)
+
+    def shift(self, hours: int):
+        """
+        Drop the oldest ``hours`` and open as many empty hours at the end.
+        """
+        if hours >= len(self.values):
+            self.values.fill(np.nan)
+            self.ids.fill(0)
+            return
+        self.values[:-hours] = self.values[hours:]
+        self.values[-hours:] = np.nan
+        self.ids[:-hours] = self.ids[hours:]
+        self.ids[-hours:] = 0
+
+    def trim(self, hours: int):
+        """
+        Keep only the newest ``hours``.
+        """
+        self.values = self.values[-hours:].copy() if hours else self.values[:0]
+        self.ids = self.ids[-hours:].copy() if hours else self.ids[:0]
+
+
+class HotStore:
+    """
+    The most recent hours of every series held in memory, so range queries
+    inside that window are answered by slicing arrays rather than by SQLite.
+    All series share one window ending at the newest stored hour; the window
+    shrinks when the series no longer fit the memory budget.
+    """
+
+    def __init__(self, hours: int = HOT_STORE_HOURS, max_bytes=HOT_STORE_MAX_BYTES):
+        self.hours = hours
+        self.max_bytes = max_bytes
+        self.origin: Optional[datetime] = None
+        self.loaded = False
+        self._series: Dict[Tuple[str, str], HotSeries] = {}
+        # Points ingested while loading, applied once the load has finished
+        self._pending: Optional[List] = None
+
+    @property
+    def nbytes(self) -> int:
+        return len(self._series) * self.hours * BYTES_PER_HOUR
+
+    def stats(self) -> Dict:
+        return {
+            "loaded": self.loaded,
+            "series": len(self._series),
+            "hours": self.hours,
+            "origin": self.origin,
+            "bytes": self.nbytes,
+        }
+
+    async def load(self, async_db: AsyncSession):
+        """
+        Fill the window from EnergyDataTable, ending at the newest stored hour.
+        """
+        self.loaded = False
+        self._pending = []
+        self._series.clear()
+        self.origin = None
+        latest = (
+            await async_db.execute(select(func.max(EnergyDataTable.period)))
+        ).scalar()
+        if latest is not None:
+            self.origin = latest - (self.hours - 1) * HOUR
+            stmt = (
+                select(EnergyDataTable)
+                .where(EnergyDataTable.period >= self.origin)
+                .execution_options(stream_results=True)
+            )
+            results = await async_db.stream_scalars(stmt)
+            try:
+                async for partition in results.partitions(LOAD_BATCH_SIZE):
+                    self._store(partition)
+            finally:
+                await results.close()
+        pending, self._pending = self._pending, None
+        self.loaded = True
+        self._store(pending)
+        log.info(f"Hot store loaded: {self.stats()}")
+
+    def add(self, points: Sequence):
+        """
+        Ingest listener keeping the loaded window current.
+        """
+        if self._pending is not None:
+            self._pending.extend(points)
+        elif self.loaded:
+            self._store(points)
+
+    def _store(self, points: Sequence):
+        """
+        Store points, advancing the window for hours newer than its end.
+        Points older than the window are left to the database.
+        """
+        if not points:
+            return
+        if self.origin is None:
+            newest = max(point.period for point in points)
+            self.origin = newest - (self.hours - 1) * HOUR
+        for point in points:
+            key = (point.respondent, point.type_name)
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = HotSeries(point, self.hours)
+                self._fit_budget()
+            offset = self._offset(point.period)
+            if offset >= self.hours:
+                self._advance(offset - self.hours + 1)
+                offset = self.hours - 1
+            if offset < 0 or point.value is None:
+                continue
+            series.values[offset] = point.value
+            series.ids[offset] = point.id
+
+    def _offset(self, period: datetime) -> int:
+        return int((period - self.origin) // HOUR)
+
+    def _advance(self, hours: int):
+        for series in self._series.values():
+            series.shift(hours)
+        self.origin += hours * HOUR
+
+    def _fit_budget(self):
+        hours = min(self.hours, self.max_bytes // (len(self._series) * BYTES_PER_HOUR))
+        if hours == self.hours:
+            return
+        log.warning(
+            f"Hot store over its {self.max_bytes} byte budget, "
+            f"keeping {hours} of {self.hours} hours"
+        )
+        for series in self._series.values():
+            series.trim(hours)
+        self.origin += (self.hours - hours) * HOUR
+        self.hours = hours
+
+    def _slice(
+        self, params: RetrieveEnergyDataRequest, after: Optional[datetime] = None
+    ):
+        """
+        The series and hour offsets matching params, or None when the range
+        starts before the window and has to come from the database. With
+        ``after`` only the hours following it are matched.
+        """
+        if not self.loaded or self.origin is None:
+            return None
+        start, end = parse_date_range(params.start_date, params.end_date)
+        if after is not None:
+            start = max(start, after + HOUR)
+        if start < self.origin:
+            return None
+        series = self._series.get((params.respondent, params.type_name.value))
+        first = math.ceil((start - self.origin) / HOUR)
+        last = min(self.hours, self._offset(end) + 1)
+        if series is None or last <= first:
+            return series, first, np.empty(0, dtype=np.int64)
+        return series, first, first + np.flatnonzero(series.ids[first:last])
+
+    def query(
+        self,
+        params: RetrieveEnergyDataRequest,
+        after: Optional[datetime] = None,
+        limit: Optional[int] = None,
+    ) -> Optional[List[EnergyData]]:
+        """
+        The stored points for params in period order, or None on a miss;
+        the first ``limit`` of those after ``after`` when given.
+        """
+        hit = self._slice(params, after)
+        if hit is None:
+            return None
+        series, _, offsets = hit
+        if limit is not None:
+            offsets = offsets[:limit]
+        return [
+            # Values were validated on their way into the store
+            EnergyData.model_construct(
+                id=int(series.ids[offset]),
+                period=self.origin + int(offset) * HOUR,
+                respondent=series.respondent,
+                respondent_name=series.respondent_name,
+                type=series.type,
+                type_name=series.type_name,
+                value=float(series.values[offset]),
+                value_units=series.value_units,
+            )
+            for offset in offsets
+        ]
+
+    def columns(
+        self, params: RetrieveEnergyDataRequest, columns: Sequence[str]
+    ) -> Optional[Dict[str, List]]:
+        """
+        The stored points for params as column lists, or None on a miss.
+        """
+        hit = self._slice(params)
+        if hit is None:
+            return None
+        series, _, offsets = hit
+        if series is None:
+            return {column: [] for column in columns}
+        count = len(offsets)
+        data = {}
+        for column in columns:
+            if column == "period":
+                data[column] = [self.origin + int(offset) * HOUR for offset in offsets]
+            elif column == "value":
+                data[column] = series.values[offsets].tolist()
+            elif column == "id":
+                data[column] = series.ids[offsets].tolist()
+            else:
+                data[column] = [getattr(series, column)] * count
+        return data
+
+
+async def load_hot_store():
+    if not HOT_STORE_ENABLED:
+        return
+    async with AsyncSessionLocal() as async_db:
+        await hot_store.load(async_db)
+
+
+hot_store = HotStore()
+on_ingest(hot_store.add)
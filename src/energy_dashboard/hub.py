@@ -0,0 +1,254 @@
+import asyncio
+import contextlib
+import logging
+import os
+from typing import AsyncIterator, Callable, Dict, Hashable, List, NamedTuple, Optional
+
+from energy_dashboard.models import (
+    ChartMode,
+    EnergyData,
+    PacingPolicy,
+    RetrieveEnergyDataRequest,
+)
+from energy_dashboard.rendering import RenderBusy
+from energy_dashboard.streaming import ChartEncoder
+
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+log = logging.getLogger(__name__)
+
+CLIENT_QUEUE_SIZE = int(os.getenv("HUB_CLIENT_QUEUE_SIZE", 32))
+# Times a client may fall behind and be caught up before it is dropped
+MAX_LAG_STRIKES = int(os.getenv("HUB_MAX_LAG_STRIKES", 3))
+
+
+class StreamKey(NamedTuple):
+    respondent: str
+    type_name: str
+    start_date: str
+    end_date: str
+    mode: ChartMode
+    pacing: tuple
+    live: bool
+
+    def params(self) -> RetrieveEnergyDataRequest:
+        """
+        The request the key stands for, so the producer started by the first
+        subscriber reads exactly what every subscriber of the key asked for.
+        """
+        return RetrieveEnergyDataRequest(
+            respondent=self.respondent,
+            type_name=self.type_name,
+            start_date=self.start_date,
+            end_date=self.end_date,
+        )
+
+
+def stream_key(
+    params: RetrieveEnergyDataRequest,
+    mode: ChartMode,
+    pacing: PacingPolicy,
+    live=False,
+) -> StreamKey:
+    """
+    Normalize chart stream parameters so equivalent views share a broadcast.
+    """
+    return StreamKey(
+        respondent=params.respondent.strip().upper(),
+        type_name=params.type_name.value,
+        start_date=params.start_date.strip(),
+        end_date=params.end_date.strip(),
+        mode=mode,
+        pacing=(pacing.mode, pacing.frame_rate, pacing.speedup),
+        live=live,
+    )
+
+
+class Subscriber:
+    """
+    One client of a broadcast, reading frames from a bounded queue.
+
+    A client whose queue fills up is downgraded: its queued frames are
+    discarded and it is sent a fresh snapshot the next time it reads. After
+    ``MAX_LAG_STRIKES`` downgrades it is dropped.
+    """
+
+    def __init__(self, broadcast: "ChartBroadcast", queue_size: int):
+        self.broadcast = broadcast
+        self.queue: asyncio.Queue[Optional[bytes]] = asyncio.Queue(queue_size)
+        self.lagging = False
+        self.strikes = 0
+        self.dropped = False
+
+    def offer(self, frame: Optional[bytes]):
+        if self.dropped:
+            return
+        if self.lagging:
+            # The snapshot taken on the next read already covers this frame
+            if frame is None:
+                self.queue.put_nowait(None)
+            return
+        try:
+            self.queue.put_nowait(frame)
+        except asyncio.QueueFull:
+            self._downgrade()
+            if frame is None and not self.dropped:
+                self.queue.put_nowait(None)
+
+    def _downgrade(self):
+        while not self.queue.empty():
+            self.queue.get_nowait()
+        self.strikes += 1
+        if self.strikes > MAX_LAG_STRIKES:
+            log.warning(f"Dropping slow subscriber of {self.broadcast.key}")
+            self.dropped = True
+            self.queue.put_nowait(None)
+        else:
+            log.info(f"Subscriber of {self.broadcast.key} fell behind, resyncing")
+            self.lagging = True
+
+    async def frames(self) -> AsyncIterator[bytes]:
+        while True:
+            if self.lagging and not self.dropped:
+                self.lagging = False
+                for frame in self.broadcast.snapshot():
+                    yield frame
+                continue
+            frame = await self.queue.get()
+            if frame is None:
+                return
+            yield frame
+
+
+class ChartBroadcast:
+    """
+    A single producer reading and encoding one chart stream, fanned out to
+    every subscriber of the same key.
+    """
+
+    def __init__(
+        self,
+        key: Hashable,
+        encoder: ChartEncoder,
+        batches: Callable[[], AsyncIterator[List[EnergyData]]],
+        queue_size: int = CLIENT_QUEUE_SIZE,
+    ):
+        self.key = key
+        self.encoder = encoder
+        self.batches = batches
+        self.queue_size = queue_size
+        self.subscribers: set[Subscriber] = set()
+        self.terminated: Optional[bytes] = None
+        self.started = asyncio.Event()
+        self.task: Optional[asyncio.Task] = None
+        self.read = False
+        self._on_read: List[Callable[[], None]] = []
+
+    def start(self, on_done: Callable[["ChartBroadcast"], None]):
+        self.task = asyncio.create_task(self._produce())
+        self.task.add_done_callback(lambda _: on_done(self))
+
+    def snapshot(self) -> List[bytes]:
+        frames = self.encoder.snapshot()
+        if self.terminated is not None:
+            frames.append(self.terminated)
+        return frames
+
+    def when_rows_read(self, callback: Callable[[], None]):
+        """
+        Call ``callback`` once the stored rows have been read, right away if
+        they already have been.
+        """
+        if self.read:
+            callback()
+        else:
+            self._on_read.append(callback)
+
+    def rows_read(self):
+        if not self.read:
+            self.read = True
+            callbacks, self._on_read = self._on_read, []
+            for callback in callbacks:
+                callback()
+
+    def subscribe(self) -> Subscriber:
+        subscriber = Subscriber(self, self.queue_size)
+        if self.started.is_set():
+            # Late joiner: start from a catch-up snapshot
+            subscriber.lagging = True
+        self.subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber):
+        self.subscribers.discard(subscriber)
+        if not self.subscribers and self.task is not None:
+            self.task.cancel()
+
+    def _publish(self, frame: Optional[bytes]):
+        for subscriber in list(self.subscribers):
+            subscriber.offer(frame)
+
+    async def _produce(self):
+        try:
+            frame = await self.encoder.start()
+            self.started.set()
+            if frame is not None:
+                self._publish(frame)
+            async with contextlib.aclosing(self.batches()) as batches:
+                async for batch in batches:
+                    log.info(f"Broadcasting {len(batch)} points for {self.key}...")
+                    self._publish(await self.encoder.encode(batch))
+            self.terminated = self.encoder.terminate()
+            self._publish(self.terminated)
+        except asyncio.CancelledError:
+            raise
+        except RenderBusy as exc:
+            # End the viewers' streams so they do not reconnect into the queue
+            log.warning(f"Broadcast {self.key} refused: {exc}")
+            self.terminated = self.encoder.terminate()
+            self._publish(self.terminated)
+        except Exception:
+            log.exception(f"Broadcast {self.key} failed")
+        finally:
+            self.rows_read()
+            self._publish(None)
+
+
+class BroadcastHub:
+    """
+    Registry of the running broadcasts, one per normalized stream key.
+    """
+
+    def __init__(self):
+        self._broadcasts: Dict[Hashable, ChartBroadcast] = {}
+
+    def __len__(self):
+        return len(self._broadcasts)
+
+    def _discard(self, broadcast: ChartBroadcast):
+        if self._broadcasts.get(broadcast.key) is broadcast:
+            del self._broadcasts[broadcast.key]
+
+    @contextlib.asynccontextmanager
+    async def subscribe(
+        self, key: Hashable, factory: Callable[[], ChartBroadcast]
+    ) -> AsyncIterator[Subscriber]:
+        """
+        Join the broadcast for ``key``, starting it with ``factory`` if no
+        other client is watching the same stream.
+        """
+        broadcast = self._broadcasts.get(key)
+        # A broadcast whose last subscriber left is winding down; start anew
+        if broadcast is None or broadcast.task.done() or broadcast.task.cancelling():
+            broadcast = factory()
+            self._broadcasts[key] = broadcast
+            broadcast.start(self._discard)
+        subscriber = broadcast.subscribe()
+        try:
+            yield subscriber
+        finally:
+            broadcast.unsubscribe(subscriber)
+
+
+hub = BroadcastHub()
@@ -0,0 +1,234 @@
+import asyncio
+import logging
+import os
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+import httpx
+from sqlalchemy import func, select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from energy_dashboard.database import AsyncSessionLocal, EnergyDataTable
+from energy_dashboard.metrics import INGEST_ROWS_TOTAL, STAGE_SECONDS
+from energy_dashboard.models import EnergyData, EnergyType
+
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+log = logging.getLogger(__name__)
+
+# Rows per INSERT, well below SQLite's bound-parameter limit
+INSERT_CHUNK_SIZE = 1000
+# Most rows the EIA API returns per request, whatever length asks for
+EIA_PAGE_LENGTH = 5000
+EIA_PERIOD_FORMAT = "%Y-%m-%dT%H"
+
+LIVE_TAIL_ENABLED = os.getenv("LIVE_TAIL_ENABLED", "false").lower() == "true"
+LIVE_TAIL_INTERVAL = float(os.getenv("LIVE_TAIL_INTERVAL", 300))
+LIVE_TAIL_RESPONDENTS = [
+    respondent.strip()
+    for respondent in os.getenv("LIVE_TAIL_RESPONDENTS", "").split(",")
+    if respondent.strip()
+]
+# Hours fetched for a respondent that has no stored data yet
+LIVE_TAIL_LOOKBACK = int(os.getenv("LIVE_TAIL_LOOKBACK", 24))
+
+IngestListener = Callable[[List[EnergyData]], None]
+_listeners: List[IngestListener] = []
+
+
+def on_ingest(listener: IngestListener) -> IngestListener:
+    """
+    Register a callback run with the newly stored points after every ingest.
+    """
+    _listeners.append(listener)
+    return listener
+
+
+def publish_ingest(points: List[EnergyData]):
+    for listener in _listeners:
+        try:
+            listener(points)
+        except Exception:
+            log.exception(f"Ingest listener {listener} failed")
+
+
+def utc_hour() -> datetime:
+    """
+    The current hour as a naive UTC datetime, matching stored periods.
+    """
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    return now.replace(minute=0, second=0, microsecond=0)
+
+
+def parse_item(item: Dict) -> Dict:
+    """
+    Map one EIA region-data item onto EnergyDataTable columns.
+    """
+    return dict(
+        # Convert the value to float, or 0.0 if it is None
+        value=float(item["value"]) if item["value"] is not None else 0.0,
+        period=datetime.strptime(item["period"], EIA_PERIOD_FORMAT),
+        respondent=item["respondent"],
+        respondent_name=item["respondent-name"],
+        type=item["type"],
+        type_name=item["type-name"],
+        value_units=item["value-units"],
+    )
+
+
+async def ingest_items(
+    async_db: AsyncSession, items: Iterable[Dict]
+) -> List[EnergyData]:
+    """
+    Store EIA items, skipping hours that are already stored, and publish the
+    rows that were actually new to the ingest listeners.
+    """
+    rows = [parse_item(item) for item in items]
+    if not rows:
+        return []
+    table = EnergyDataTable.__table__
+    inserted = []
+    with STAGE_SECONDS.time(stage="ingest"):
+        for start in range(0, len(rows), INSERT_CHUNK_SIZE):
+            stmt = (
+                sqlite_insert(table)
+                .values(rows[start : start + INSERT_CHUNK_SIZE])
+                .on_conflict_do_nothing(index_elements=["period", "respondent", "type"])
+                .returning(*table.c)
+            )
+            result = await async_db.execute(stmt)
+            inserted.extend(
+                EnergyData.model_validate(dict(row._mapping)) for row in result
+            )
+        await async_db.commit()
+    INGEST_ROWS_TOTAL.inc(len(inserted), outcome="inserted")
+    INGEST_ROWS_TOTAL.inc(len(rows) - len(inserted), outcome="duplicate")
+
+    if inserted:
+        publish_ingest(inserted)
+    return inserted
+
+
+class LiveFeed:
+    """
+    Fan-out of newly ingested points to in-process subscribers, keyed by
+    (respondent, type_name).
+    """
+
+    def __init__(self):
+        self._queues: Dict[Tuple[str, str], List[asyncio.Queue]] = {}
+
+    def publish(self, points: List[EnergyData]):
+        by_series: Dict[Tuple[str, str], List[EnergyData]] = {}
+        for point in points:
+            by_series.setdefault((point.respondent, point.type_name), []).append(point)
+        for series, series_points in by_series.items():
+            for queue in self._queues.get(series, []):
+                queue.put_nowait(sorted(series_points, key=lambda p: p.period))
+
+    def subscribe(self, respondent: str, type_name: str) -> asyncio.Queue:
+        queue = asyncio.Queue()
+        self._queues.setdefault((respondent, type_name), []).append(queue)
+        return queue
+
+    def unsubscribe(self, respondent: str, type_name: str, queue: asyncio.Queue):
+        queues = self._queues.get((respondent, type_name), [])
+        if queue in queues:
+            queues.remove(queue)
+        if not queues:
+            self._queues.pop((respondent, type_name), None)
+
+
+live_feed = LiveFeed()
+on_ingest(live_feed.publish)
+
+
+class LiveTailPoller:
+    """
+    Poll the EIA region-data route for hours newer than what is stored and
+    ingest them, so connected live charts receive them through ``live_feed``.
+    """
+
+    def __init__(
+        self,
+        interval: float = LIVE_TAIL_INTERVAL,
+        respondents: Optional[List[str]] = None,
+        types: Iterable[EnergyType] = tuple(EnergyType),
+        lookback: int = LIVE_TAIL_LOOKBACK,
+        client_factory: Callable[[], httpx.AsyncClient] = httpx.AsyncClient,
+    ):
+        self.interval = interval
+        self.respondents = respondents or LIVE_TAIL_RESPONDENTS
+        self.types = list(types)
+        self.lookback = lookback
+        self.client_factory = client_factory
+        self._task: Optional[asyncio.Task] = None
+
+    async def latest_periods(
+        self, async_db: AsyncSession
+    ) -> Dict[Tuple[str, str], datetime]:
+        stmt = select(
+            EnergyDataTable.respondent,
+            EnergyDataTable.type,
+            func.max(EnergyDataTable.period),
+        ).group_by(EnergyDataTable.respondent, EnergyDataTable.type)
+        result = await async_db.execute(stmt)
+        return {(respondent, type_): period for respondent, type_, period in result}
+
+    async def poll_once(self) -> int:
+        """
+        Fetch and store every new hour per respondent and type.
+        """
+        # services imports this module, so it is imported lazily
+        from energy_dashboard.services import EnergyDataService
+
+        ingested = 0
+        async with AsyncSessionLocal() as async_db, self.client_factory() as client:
+            latest = await self.latest_periods(async_db)
+            respondents = self.respondents or sorted({key[0] for key in latest})
+            service = EnergyDataService(async_db, None, client)
+            default_start = utc_hour() - timedelta(hours=self.lookback)
+            for respondent in respondents:
+                for energy_type in self.types:
+                    last = latest.get((respondent, energy_type.name))
+                    start = last + timedelta(hours=1) if last else default_start
+                    params = {
+                        "frequency": "hourly",
+                        "data[0]": "value",
+                        "facets[respondent][]": respondent,
+                        "facets[type][]": energy_type.name,
+                        "start": start.strftime(EIA_PERIOD_FORMAT),
+                        "sort[0][column]": "period",
+                        "sort[0][direction]": "asc",
+                        "offset": 0,
+                        "length": EIA_PAGE_LENGTH,
+                    }
+                    ingested += len(await service.ingest_new(params))
+        if ingested:
+            log.info(f"Live tail ingested {ingested} new rows")
+        return ingested
+
+    async def run(self):
+        while True:
+            try:
+                await self.poll_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                log.exception("Live tail poll failed")
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
@@ -1,11 +1,7 @@
 import logging
-import instructor
-from instructor import Instructor, AsyncInstructor
-
-from anthropic import Anthropic, AsyncAnthropic
-from groq import Groq, AsyncGroq
-from openai import OpenAI, AsyncOpenAI
+from typing import TYPE_CHECKING
 
+from energy_dashboard.metrics import LLM_REQUESTS_TOTAL, STAGE_SECONDS
 from energy_dashboard.models import LLMModel, SqlSelectQuery
 
 
@@ -13,31 +9,52 @@ from energy_dashboard.models import LLMModel, SqlSelectQuery
 logging.basicConfig(level=logging.INFO)
 log = logging.getLogger(__name__)
 
+# instructor and the provider SDKs take seconds to import, so they are only
+# loaded when a client is first needed
+if TYPE_CHECKING:
+    from instructor import AsyncInstructor, Instructor
+
+
+def gen_client(model=LLMModel.GPT4_Omni) -> "Instructor":
+    import instructor
 
-def gen_client(model=LLMModel.GPT4_Omni) -> Instructor:
     match model:
         case LLMModel.Claude3:
+            from anthropic import Anthropic
+
             client = instructor.from_anthropic(Anthropic())
         case LLMModel.GPT4_Omni:
+            from openai import OpenAI
+
             client = instructor.patch(OpenAI())
         case LLMModel.LLAMA3:
+            from groq import Groq
+
             client = instructor.patch(Groq())
     return client
 
 
-def gen_async_client(model=LLMModel.GPT4_Omni) -> AsyncInstructor:
+def gen_async_client(model=LLMModel.GPT4_Omni) -> "AsyncInstructor":
+    import instructor
+
     match model:
         case LLMModel.Claude3:
+            from anthropic import AsyncAnthropic
+
             client = instructor.from_anthropic(AsyncAnthropic())
         case LLMModel.GPT4_Omni:
+            from openai import AsyncOpenAI
+
             client = instructor.patch(AsyncOpenAI())
         case LLMModel.LLAMA3:
+            from groq import AsyncGroq
+
             client = instructor.patch(AsyncGroq())
     return client
 
 
 def gen_select_query(
-    ai_client: Instructor, schema, parametre: str, model=LLMModel.GPT4_Omni
+    ai_client: "Instructor", schema, parametre: str, model=LLMModel.GPT4_Omni
 ) -> SqlSelectQuery:
     system_msg = f"""
     Issue a valid SQL statement based on the following table schema:
@@ -47,19 +64,27 @@ def gen_select_query(
     """
     log.info(f"system_msg: {system_msg}")
     log.info(f"parametre: {parametre}")
-    query = ai_client.chat.completions.create(
-        model=model,
-        response_model=SqlSelectQuery,
-        messages=[
-            {"role": "system", "content": system_msg},
-            {"role": "user", "content": parametre},
-        ],
-    )
-    return query
+    outcome = "error"
+    try:
+        with STAGE_SECONDS.time(stage="llm"):
+            query = ai_client.chat.completions.create(
+                model=model,
+                response_model=SqlSelectQuery,
+                messages=[
+                    {"role": "system", "content": system_msg},
+                    {"role": "user", "content": parametre},
+                ],
+            )
+        outcome = "ok"
+    finally:
+        LLM_REQUESTS_TOTAL.inc(model=getattr(model, "value", model), outcome=outcome)
+    # instructor answers with an instance of its own copy of the response
+    # model, which cannot be pickled for the chart render workers
+    return SqlSelectQuery.model_validate(query.model_dump())
 
 
 async def streaming_gen_select_query(
-    ai_client: AsyncInstructor, schema, parametre: str, model=LLMModel.GPT4_Omni
+    ai_client: "AsyncInstructor", schema, parametre: str, model=LLMModel.GPT4_Omni
 ) -> SqlSelectQuery:
     system_msg = f"""
     Issue a valid SQL statement based on the following table schema:
@@ -69,12 +94,20 @@ async def streaming_gen_select_query(
     """
     log.info(f"system_msg: {system_msg}")
     log.info(f"parametre: {parametre}")
-    query = await ai_client.chat.completions.create(
-        model=model,
-        response_model=SqlSelectQuery,
-        messages=[
-            {"role": "system", "content": system_msg},
-            {"role": "user", "content": parametre},
-        ],
-    )
-    return query
+    outcome = "error"
+    try:
+        with STAGE_SECONDS.time(stage="llm"):
+            query = await ai_client.chat.completions.create(
+                model=model,
+                response_model=SqlSelectQuery,
+                messages=[
+                    {"role": "system", "content": system_msg},
+                    {"role": "user", "content": parametre},
+                ],
+            )
+        outcome = "ok"
+    finally:
+        LLM_REQUESTS_TOTAL.inc(model=getattr(model, "value", model), outcome=outcome)
+    # instructor answers with an instance of its own copy of the response
+    # model, which cannot be pickled for the chart render workers
+    return SqlSelectQuery.model_validate(query.model_dump())
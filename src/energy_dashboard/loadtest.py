@@ -0,0 +1,444 @@
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+import httpx
+
+# Load generator simulating dashboard users. Drive a running dashboard with
+#   python -m energy_dashboard.loadtest --url http://127.0.0.1:8000 \
+#       --table-url http://127.0.0.1:6543 --users 50 --duration 60
+# or start a throwaway offline stack, a synthetic database behind both apps
+# with the fake EIA and LLM APIs, and load it with
+#   python -m energy_dashboard.loadtest --offline --users 50 -o load.json
+# Each virtual user picks a scenario by weight, runs it, thinks for a while
+# and repeats until the test is over:
+#   chart   an SSE viewer of /stream-chart, who leaves after --view-seconds
+#   prompt  a /instruct-stream-chart prompt, answered by the LLM
+#   page    a /energy_data table page load (fast_api.py)
+#   seed    a POST /api/v1/seed-data/ job fetching --seed-hours from EIA
+#   probe   a GET /api/v1/snapshot, cheap and independent of chart rendering
+# The probe's latency shows what heavy chart streaming costs everyone else;
+# to saturate the render pool and watch it, run for example
+#   python -m energy_dashboard.loadtest --offline --users 60 \
+#       --mix chart=90,probe=10 --chart-mode full
+
+SCENARIOS = ("chart", "prompt", "page", "seed", "probe")
+DEFAULT_MIX = "chart=60,prompt=10,page=20,seed=5,probe=5"
+# Asked by prompt users, about a random respondent and range
+PROMPTS = (
+    "Show {respondent} demand from {start} to {end}",
+    "Hourly net generation for {respondent} between {start} and {end}",
+    "How did {respondent} demand look from {start} to {end}?",
+)
+TERMINATE_EVENT = "event: Terminate"
+STARTUP_TIMEOUT = 60
+
+
+def percentiles(samples: List[float]) -> Dict:
+    """
+    Latency percentiles in milliseconds for samples in seconds.
+    """
+    if not samples:
+        return {}
+    ordered = sorted(samples)
+
+    def at(quantile):
+        return ordered[min(len(ordered) - 1, int(len(ordered) * quantile))] * 1000
+
+    return {
+        "mean_ms": sum(ordered) / len(ordered) * 1000,
+        "p50_ms": at(0.5),
+        "p90_ms": at(0.9),
+        "p95_ms": at(0.95),
+        "p99_ms": at(0.99),
+        "max_ms": ordered[-1] * 1000,
+    }
+
+
+def parse_mix(mix: str) -> Dict[str, float]:
+    weights = {}
+    for part in mix.split(","):
+        name, _, weight = part.partition("=")
+        if name not in SCENARIOS:
+            raise argparse.ArgumentTypeError(f"Unknown scenario {name!r}")
+        weights[name] = float(weight or 1)
+    return weights
+
+
+class ScenarioStats:
+    """
+    Outcomes of one scenario. ``first`` is the time to the first SSE frame
+    for streams and to the response headers otherwise.
+    """
+
+    def __init__(self):
+        self.latency: List[float] = []
+        self.first: List[float] = []
+        self.errors: Counter = Counter()
+        self.frames = 0
+        self.bytes = 0
+
+    def report(self, seconds: float) -> Dict:
+        completed = len(self.latency)
+        failed = sum(self.errors.values())
+        requests = completed + failed
+        return {
+            "requests": requests,
+            "completed": completed,
+            "errors": dict(self.errors),
+            "error_rate": failed / requests if requests else 0.0,
+            "throughput_per_s": completed / seconds,
+            "latency": percentiles(self.latency),
+            "first_frame" if self.frames else "first_byte": percentiles(self.first),
+            "frames": self.frames,
+            "bytes": self.bytes,
+        }
+
+
+class LoadTest:
+    """
+    Runs ``users`` virtual users against the dashboard for ``duration``
+    seconds, starting them evenly over ``ramp`` seconds.
+    """
+
+    def __init__(self, args: argparse.Namespace, url: str, table_url: str):
+        from energy_dashboard.synthetic import respondent_codes
+
+        self.args = args
+        self.url = url.rstrip("/")
+        self.table_url = table_url.rstrip("/")
+        self.mix = parse_mix(args.mix)
+        self.respondents = respondent_codes(args.respondents)
+        self.start = datetime.strptime(args.start, "%Y-%m-%d")
+        self.stats = {name: ScenarioStats() for name in self.mix}
+        self.random = random.Random(args.seed)
+
+    def random_range(self, days: int):
+        offset = self.random.randint(0, max(0, self.args.days - days))
+        start = self.start + timedelta(days=offset)
+        return start, start + timedelta(days=days)
+
+    def chart_params(self) -> Dict:
+        start, end = self.random_range(self.args.range_days)
+        return {
+            "respondent": self.random.choice(self.respondents),
+            "type_name": self.random.choice(["Demand", "Net generation"]),
+            "start_date": f"{start:%Y-%m-%d}",
+            "end_date": f"{end:%Y-%m-%d}",
+        }
+
+    async def run(self) -> Dict:
+        timeout = httpx.Timeout(self.args.timeout, connect=10)
+        limits = httpx.Limits(max_connections=None, max_keepalive_connections=None)
+        began = time.perf_counter()
+        async with httpx.AsyncClient(timeout=timeout, limits=limits) as client:
+            deadline = time.monotonic() + self.args.duration
+            await asyncio.gather(
+                *(
+                    self.user(client, index, deadline)
+                    for index in range(self.args.users)
+                )
+            )
+        seconds = time.perf_counter() - began
+
+        total = ScenarioStats()
+        for stats in self.stats.values():
+            total.latency += stats.latency
+            total.errors += stats.errors
+            total.bytes += stats.bytes
+        report = {name: stats.report(seconds) for name, stats in self.stats.items()}
+        report["total"] = total.report(seconds)
+        report["total"].pop("first_byte")
+        report["total"]["seconds"] = seconds
+        return report
+
+    async def user(self, client: httpx.AsyncClient, index: int, deadline: float):
+        await asyncio.sleep(self.args.ramp * index / self.args.users)
+        names, weights = list(self.mix), list(self.mix.values())
+        while time.monotonic() < deadline:
+            name = self.random.choices(names, weights)[0]
+            scenario = getattr(self, name)
+            stats = self.stats[name]
+            began = time.perf_counter()
+            try:
+                ok = await scenario(client, stats, began)
+            except httpx.TimeoutException:
+                stats.errors["timeout"] += 1
+            except httpx.HTTPError as exc:
+                stats.errors[type(exc).__name__] += 1
+            else:
+                if ok:
+                    stats.latency.append(time.perf_counter() - began)
+            await asyncio.sleep(self.random.expovariate(1 / self.args.think))
+
+    async def stream(
+        self, client, stats: ScenarioStats, began: float, path: str, params: Dict
+    ) -> bool:
+        """
+        Read SSE frames until the stream ends or the viewer has seen enough.
+        """
+        async with client.stream("GET", self.url + path, params=params) as response:
+            if response.status_code != 200:
+                stats.errors[str(response.status_code)] += 1
+                return False
+            first = True
+            async for line in response.aiter_lines():
+                stats.bytes += len(line) + 1
+                if line.startswith("event:"):
+                    stats.frames += 1
+                    if first:
+                        stats.first.append(time.perf_counter() - began)
+                        first = False
+                    if line == TERMINATE_EVENT:
+                        break
+                if time.perf_counter() - began > self.args.view_seconds:
+                    break
+        return True
+
+    async def request(
+        self, client, stats: ScenarioStats, began: float, method: str, url: str, **kw
+    ) -> bool:
+        async with client.stream(method, url, **kw) as response:
+            stats.first.append(time.perf_counter() - began)
+            body = await response.aread()
+            stats.bytes += len(body)
+            if response.status_code >= 400:
+                stats.errors[str(response.status_code)] += 1
+                return False
+        return True
+
+    async def chart(self, client, stats, began) -> bool:
+        params = dict(
+            self.chart_params(), pace=self.args.pace, mode=self.args.chart_mode
+        )
+        return await self.stream(client, stats, began, "/stream-chart", params)
+
+    async def prompt(self, client, stats, began) -> bool:
+        params = self.chart_params()
+        prompt = self.random.choice(PROMPTS).format(
+            respondent=params["respondent"],
+            start=params["start_date"],
+            end=params["end_date"],
+        )
+        query = {"prompt": prompt, "pace": self.args.pace}
+        return await self.stream(client, stats, began, "/instruct-stream-chart", query)
+
+    async def page(self, client, stats, began) -> bool:
+        url = self.table_url + "/energy_data"
+        return await self.request(
+            client, stats, began, "GET", url, params=self.chart_params()
+        )
+
+    async def probe(self, client, stats, began) -> bool:
+        url = self.url + "/api/v1/snapshot"
+        return await self.request(client, stats, began, "GET", url)
+
+    async def seed(self, client, stats, began) -> bool:
+        from energy_dashboard.ingest import EIA_PAGE_LENGTH, EIA_PERIOD_FORMAT
+
+        start, _ = self.random_range(1)
+        start += timedelta(hours=self.random.randint(0, 23))
+        params = {
+            "frequency": "hourly",
+            "data[0]": "value",
+            "facets[respondent][]": [self.random.choice(self.respondents)],
+            "start": start.strftime(EIA_PERIOD_FORMAT),
+            "end": (start + timedelta(hours=self.args.seed_hours - 1)).strftime(
+                EIA_PERIOD_FORMAT
+            ),
+            "offset": 0,
+            "length": EIA_PAGE_LENGTH,
+        }
+        url = self.url + "/api/v1/seed-data/"
+        return await self.request(
+            client, stats, began, "POST", url, json={"params": params}
+        )
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class OfflineStack:
+    """
+    A synthetic database served by both dashboard apps, with the fake EIA and
+    LLM APIs behind them, each in its own uvicorn process.
+    """
+
+    def __init__(self, args: argparse.Namespace):
+        self.args = args
+        self.workdir = tempfile.TemporaryDirectory(prefix="energy-load-")
+        self.processes: List[subprocess.Popen] = []
+        self.url = self.table_url = ""
+
+    def __enter__(self):
+        database = os.path.join(self.workdir.name, "load.db")
+        fakes_url = f"http://127.0.0.1:{free_port()}"
+        env = dict(
+            os.environ,
+            DATABASE_PATH=database,
+            DATABASE_ECHO="false",
+            SLOW_QUERY_DB_PATH=os.path.join(self.workdir.name, "slow_queries.db"),
+            EIA_BASE_URL=f"{fakes_url}/eia/v2",
+            OPENAI_BASE_URL=f"{fakes_url}/llm/v1",
+            OPENAI_API_KEY="offline",
+            FAKE_EIA_START=f"{self.args.start}T00",
+            FAKE_LLM_LATENCY=str(self.args.llm_latency),
+            LIVE_TAIL_ENABLED="false",
+        )
+        self.populate(env)
+        self.start("energy_dashboard.fakes:offline_app", fakes_url, env)
+        self.url = f"http://127.0.0.1:{free_port()}"
+        self.start("energy_dashboard.app:app", self.url, env)
+        self.table_url = f"http://127.0.0.1:{free_port()}"
+        self.start("energy_dashboard.fast_api:app", self.table_url, env)
+        for url in (fakes_url, self.url, self.table_url):
+            self.wait(url)
+        return self
+
+    def __exit__(self, *exc):
+        for process in self.processes:
+            process.terminate()
+        for process in self.processes:
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+        self.workdir.cleanup()
+
+    def populate(self, env: Dict):
+        """
+        Write the synthetic history in a child process, as the database
+        settings are read on import.
+        """
+        code = (
+            "from datetime import datetime\n"
+            "from energy_dashboard.database import engine, init_db\n"
+            "from energy_dashboard.synthetic import populate, respondent_codes\n"
+            "init_db()\n"
+            f"populate(engine, respondent_codes({self.args.respondents}), "
+            f"datetime.strptime({self.args.start!r}, '%Y-%m-%d'), "
+            f"{self.args.days * 24})\n"
+        )
+        subprocess.run([sys.executable, "-c", code], env=env, check=True)
+
+    def start(self, target: str, url: str, env: Dict):
+        port = url.rsplit(":", 1)[1]
+        self.processes.append(
+            subprocess.Popen(
+                [
+                    sys.executable,
+                    "-m",
+                    "uvicorn",
+                    target,
+                    "--port",
+                    port,
+                    "--log-level",
+                    "warning",
+                ],
+                env=env,
+            )
+        )
+
+    def wait(self, url: str):
+        deadline = time.monotonic() + STARTUP_TIMEOUT
+        while time.monotonic() < deadline:
+            try:
+                httpx.get(f"{url}/openapi.json", timeout=1)
+                return
+            except httpx.HTTPError:
+                time.sleep(0.2)
+        raise RuntimeError(f"{url} did not start within {STARTUP_TIMEOUT}s")
+
+
+def scrape_metrics(url: str) -> Optional[str]:
+    try:
+        response = httpx.get(f"{url}/metrics", timeout=10)
+    except httpx.HTTPError:
+        return None
+    return response.text if response.status_code == 200 else None
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Load test the dashboard")
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument(
+        "--table-url", help="Where /energy_data is served; defaults to --url"
+    )
+    parser.add_argument(
+        "--offline",
+        action="store_true",
+        help="Start the apps on a synthetic database with fake EIA and LLM APIs",
+    )
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--duration", type=float, default=30.0)
+    parser.add_argument("--ramp", type=float, default=5.0)
+    parser.add_argument("--think", type=float, default=1.0, help="Mean seconds")
+    parser.add_argument("--mix", default=DEFAULT_MIX)
+    parser.add_argument("--view-seconds", type=float, default=20.0)
+    parser.add_argument("--pace", default="fps", choices=["asap", "fps", "replay"])
+    parser.add_argument(
+        "--chart-mode",
+        default="stream",
+        choices=["stream", "full"],
+        help="full re-renders the figure per frame in the render pool",
+    )
+    parser.add_argument("--range-days", type=int, default=7)
+    parser.add_argument("--seed-hours", type=int, default=24)
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--respondents", type=int, default=7)
+    parser.add_argument("--start", default="2023-01-01")
+    parser.add_argument("--days", type=int, default=60)
+    parser.add_argument("--llm-latency", type=float, default=0.5)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("-o", "--output", help="Write results here, not stdout")
+    parser.add_argument(
+        "--metrics",
+        action="store_true",
+        help="Include the app's /metrics scraped after the run",
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    offline = OfflineStack(args) if args.offline else contextlib.nullcontext()
+    with offline as stack:
+        url = stack.url if stack else args.url
+        table_url = stack.table_url if stack else args.table_url or args.url
+        results = asyncio.run(LoadTest(args, url, table_url).run())
+        report = {
+            "meta": {
+                "timestamp": datetime.now().isoformat(timespec="seconds"),
+                "url": None if stack else url,
+                "offline": args.offline,
+                "args": vars(args),
+            },
+            "results": results,
+        }
+        if args.metrics:
+            report["metrics"] = scrape_metrics(url)
+
+    output = json.dumps(report, indent=2, default=str)
+    if args.output:
+        with open(args.output, "w") as file:
+            file.write(output + "\n")
+    else:
+        sys.stdout.write(output + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,341 @@
+import bisect
+import contextlib
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Sequence, Tuple
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Upper bounds in seconds, from sub-millisecond statements to slow LLM calls
+DEFAULT_BUCKETS = (
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+    30.0,
+)
+
+Sample = Tuple[Dict[str, str], float]
+
+
+class Metric:
+    """
+    A named metric with optional labels, kept in process memory.
+    """
+
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels[label]) for label in self.labels)
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def samples(self) -> List[Sample]:
+        with self._lock:
+            items = list(self._values.items())
+        return [(dict(zip(self.labels, key)), value) for key, value in items]
+
+    def expose(self) -> List[str]:
+        return [
+            f"{self.name}{format_labels(labels)} {format_value(value)}"
+            for labels, value in self.samples()
+        ]
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels):
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+
+class CallbackGauge(Metric):
+    """
+    A gauge read from its collectors at scrape time, for values that other
+    objects already track, such as connection pool usage.
+    """
+
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()):
+        super().__init__(name, documentation, labels)
+        self._collectors: List[Callable[[], Iterable[Sample]]] = []
+
+    def collect_with(self, collector: Callable[[], Iterable[Sample]]):
+        self._collectors.append(collector)
+
+    def samples(self) -> List[Sample]:
+        return [sample for collector in self._collectors for sample in collector()]
+
+
+class Histogram(Metric):
+    """
+    Observations counted into cumulative buckets, with their sum and count.
+    """
+
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labels: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            state[0][index] += 1
+            state[1] += value
+
+    @contextlib.contextmanager
+    def time(self, **labels):
+        began = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - began, **labels)
+
+    def count(self, **labels) -> int:
+        state = self._values.get(self._key(labels))
+        return sum(state[0]) if state else 0
+
+    def expose(self) -> List[str]:
+        with self._lock:
+            items = [
+                (key, list(counts), total)
+                for key, (counts, total) in self._values.items()
+            ]
+        lines = []
+        for key, counts, total in items:
+            labels = dict(zip(self.labels, key))
+            cumulative = 0
+            for bound, count in zip((*self.buckets, float("inf")), counts):
+                cumulative += count
+                bucket = format_labels(dict(labels, le=format_value(bound)))
+                lines.append(f"{self.name}_bucket{bucket} {cumulative}")
+            lines.append(
+                f"{self.name}_sum{format_labels(labels)} {format_value(total)}"
+            )
+            lines.append(f"{self.name}_count{format_labels(labels)} {cumulative}")
+        return lines
+
+
+def escape_label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    pairs = ",".join(
+        f'{name}="{escape_label(str(value))}"' for name, value in labels.items()
+    )
+    return "{" + pairs + "}"
+
+
+def format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if value == float("-inf"):
+        return "-Inf"
+    if isinstance(value, int) or float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class StageTimer:
+    """
+    Splits the time of a multi-step operation, such as a row stream, between
+    stages. ``mark`` charges the time since the previous mark to a stage;
+    ``reset`` skips time that belongs to no stage, like a consumer holding a
+    yielded value. Totals are observed once, by ``observe``.
+    """
+
+    def __init__(self, histogram=None):
+        self.histogram = histogram or STAGE_SECONDS
+        self.totals: Dict[str, float] = {}
+        self._last = time.perf_counter()
+
+    def mark(self, stage: str):
+        now = time.perf_counter()
+        self.totals[stage] = self.totals.get(stage, 0.0) + now - self._last
+        self._last = now
+
+    def reset(self):
+        self._last = time.perf_counter()
+
+    def observe(self):
+        for stage, seconds in self.totals.items():
+            self.histogram.observe(seconds, stage=stage)
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware timing every HTTP request until its response body is
+    complete, so streamed responses count their full duration. Requests
+    are labelled with the route template to keep label values bounded.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        status = "500"
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = str(message["status"])
+            await send(message)
+
+        began = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            route = scope.get("route")
+            HTTP_REQUEST_SECONDS.observe(
+                time.perf_counter() - began,
+                method=scope["method"],
+                route=getattr(route, "path", "unmatched"),
+                status=status,
+            )
+
+
+def render_metrics() -> str:
+    """
+    Every registered metric in the Prometheus text exposition format. Values
+    are only formatted here, so recording stays cheap when nobody scrapes.
+    """
+    lines = []
+    for metric in REGISTRY:
+        lines.append(f"# HELP {metric.name} {metric.documentation}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        lines.extend(metric.expose())
+    return "\n".join(lines) + "\n"
+
+
+REGISTRY: List[Metric] = []
+
+HTTP_REQUEST_SECONDS = Histogram(
+    "http_request_seconds",
+    "Time from request to the end of the response body, by route",
+    ("method", "route", "status"),
+)
+STAGE_SECONDS = Histogram(
+    "stage_seconds",
+    "Time spent per pipeline stage: llm, sql, validation, render_wait, "
+    "render, sse_write and ingest",
+    ("stage",),
+)
+LLM_REQUESTS_TOTAL = Counter(
+    "llm_requests_total", "LLM completions by model and outcome", ("model", "outcome")
+)
+ROWS_STREAMED_TOTAL = Counter(
+    "rows_streamed_total",
+    "Rows read for callers, by operation and source: db or hot_store",
+    ("operation", "source"),
+)
+INGEST_ROWS_TOTAL = Counter(
+    "ingest_rows_total",
+    "Ingested EIA rows by outcome: inserted or duplicate",
+    ("outcome",),
+)
+SSE_FRAMES_TOTAL = Counter("sse_frames_total", "SSE frames written", ("endpoint",))
+DB_POOL_CONNECTIONS = CallbackGauge(
+    "db_pool_connections",
+    "Database pool connections by engine and state: checked_out or idle",
+    ("engine", "state"),
+)
+SLOW_QUERIES_TOTAL = Counter(
+    "slow_queries_total", "Statements over the slow query threshold", ("engine",)
+)
+CHART_RENDERS_IN_FLIGHT = CallbackGauge(
+    "chart_renders_in_flight", "Chart renders queued or running in the worker pool"
+)
+CHART_RENDERS_REJECTED_TOTAL = Counter(
+    "chart_renders_rejected_total",
+    "Chart renders refused after waiting too long for a saturated pool",
+)
+
+SSE_STREAMS_ACTIVE = Gauge(
+    "sse_streams_active", "SSE streams currently open", ("endpoint",)
+)
+SSE_STREAMS_TOTAL = Counter(
+    "sse_streams_total",
+    "SSE streams by outcome: completed, abandoned or failed",
+    ("endpoint", "outcome"),
+)
+ADMISSION_IN_FLIGHT = CallbackGauge(
+    "admission_in_flight", "Requests holding an admission slot, by lane", ("lane",)
+)
+ADMISSION_QUEUE_DEPTH = CallbackGauge(
+    "admission_queue_depth", "Requests waiting for an admission slot", ("lane",)
+)
+ADMISSION_WAIT_SECONDS = Histogram(
+    "admission_wait_seconds", "Time queued requests waited for a slot", ("lane",)
+)
+ADMISSION_REJECTED_TOTAL = Counter(
+    "admission_rejected_total",
+    "Requests shed by reason: client_quota, queue_full or timeout",
+    ("lane", "reason"),
+)
+CLUSTER_LEADER = CallbackGauge(
+    "cluster_leader", "1 on the worker that runs scheduled ingest"
+)
+CLUSTER_CHANGES_TOTAL = Counter(
+    "cluster_changes_total",
+    "Change log entries by direction: published or applied",
+    ("direction",),
+)
+SHARED_CACHE_LOOKUPS_TOTAL = Counter(
+    "shared_cache_lookups_total",
+    "Cross-worker cache lookups by outcome: hit or miss",
+    ("outcome",),
+)
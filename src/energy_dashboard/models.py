@@ -36,6 +36,37 @@ class EnergyType(str, Enum):
     NG = "Net generation"
 
 
+class ChartMode(str, Enum):
+    FULL = "full"
+    STREAM = "stream"
+
+
+class PacingMode(str, Enum):
+    ASAP = "asap"
+    FRAME_RATE = "fps"
+    REPLAY = "replay"
+
+
+class PacingPolicy(BaseModel):
+    mode: PacingMode = Field(
+        PacingMode.FRAME_RATE, description="How frames are timed on a stream"
+    )
+    frame_rate: float = Field(
+        2.0, gt=0, description="Frames per second in frame-rate mode"
+    )
+    speedup: float = Field(
+        3600.0,
+        gt=0,
+        description="Replay speed-up factor over the data's own hourly timeline",
+    )
+
+
+class WireFormat(str, Enum):
+    NDJSON = "application/x-ndjson"
+    MSGPACK = "application/msgpack"
+    ARROW = "application/vnd.apache.arrow.stream"
+
+
 class RetrieveEnergyDataRequest(BaseModel):
     respondent: str
     type_name: EnergyType
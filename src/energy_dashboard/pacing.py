@@ -0,0 +1,140 @@
+import asyncio
+import contextlib
+import logging
+import os
+from typing import AsyncGenerator, AsyncIterator, Callable, List, Optional
+
+from fastapi import Query
+
+from energy_dashboard.models import EnergyData, PacingMode, PacingPolicy
+
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+log = logging.getLogger(__name__)
+
+# Points read ahead of the client before the producer waits for it to catch up
+MAX_PENDING = 10_000
+
+DEFAULT_POLICY = PacingPolicy(
+    mode=os.getenv("STREAM_PACING", PacingMode.FRAME_RATE.value),
+    frame_rate=float(os.getenv("STREAM_FRAME_RATE", 2.0)),
+    speedup=float(os.getenv("STREAM_REPLAY_SPEEDUP", 3600.0)),
+)
+
+
+def pacing_policy(
+    pace: PacingMode = Query(DEFAULT_POLICY.mode),
+    frame_rate: float = Query(DEFAULT_POLICY.frame_rate, gt=0),
+    speedup: float = Query(DEFAULT_POLICY.speedup, gt=0),
+) -> PacingPolicy:
+    """
+    Dependency reading the pacing policy of a stream from its query string.
+    """
+    return PacingPolicy(mode=pace, frame_rate=frame_rate, speedup=speedup)
+
+
+class _Pending:
+    """
+    Points read from the source but not yet handed out as a frame.
+    """
+
+    def __init__(self, max_pending: int, on_drained: Optional[Callable[[], None]]):
+        self.points: List[EnergyData] = []
+        self.done = False
+        self.max_pending = max_pending
+        self.on_drained = on_drained
+        self.changed = asyncio.Condition()
+
+    async def fill(self, points: AsyncIterator[EnergyData]):
+        try:
+            async for point in points:
+                async with self.changed:
+                    await self.changed.wait_for(
+                        lambda: len(self.points) < self.max_pending
+                    )
+                    self.points.append(point)
+                    self.changed.notify_all()
+        finally:
+            async with self.changed:
+                self.done = True
+                self.changed.notify_all()
+            if hasattr(points, "aclose"):
+                await points.aclose()
+            if self.on_drained is not None:
+                self.on_drained()
+
+    async def wait_for_points(self):
+        async with self.changed:
+            await self.changed.wait_for(lambda: self.points or self.done)
+
+    async def take(self, count=None) -> List[EnergyData]:
+        async with self.changed:
+            if count is None:
+                count = len(self.points)
+            taken = self.points[:count]
+            del self.points[:count]
+            self.changed.notify_all()
+            return taken
+
+
+async def paced_batches(
+    points: AsyncIterator[EnergyData],
+    policy: PacingPolicy = DEFAULT_POLICY,
+    max_pending=MAX_PENDING,
+    on_drained: Optional[Callable[[], None]] = None,
+) -> AsyncGenerator[List[EnergyData], None]:
+    """
+    Group ``points`` into frames according to ``policy``.
+
+    The source is read ahead by a producer task, and each frame takes every
+    point that is due when it is built. A slow client therefore receives fewer,
+    larger frames rather than a growing queue of small ones, and the database
+    cursor is released as soon as the rows have been read. ``on_drained`` is
+    called once the source is exhausted or closed.
+    """
+    pending = _Pending(max_pending, on_drained)
+    producer = asyncio.create_task(pending.fill(points))
+    loop = asyncio.get_running_loop()
+    try:
+        if policy.mode is PacingMode.REPLAY:
+            started = None
+            origin = None
+            while True:
+                await pending.wait_for_points()
+                if not pending.points:
+                    break
+                if origin is None:
+                    started = loop.time()
+                    origin = pending.points[0].period
+
+                # Sleep until the oldest pending point is due on the replay clock
+                offset = (pending.points[0].period - origin).total_seconds()
+                await asyncio.sleep(
+                    max(0.0, started + offset / policy.speedup - loop.time())
+                )
+                elapsed = (loop.time() - started) * policy.speedup
+                due = sum(
+                    1
+                    for point in pending.points
+                    if (point.period - origin).total_seconds() <= elapsed
+                )
+                yield await pending.take(max(due, 1))
+        else:
+            interval = (
+                1.0 / policy.frame_rate if policy.mode is PacingMode.FRAME_RATE else 0.0
+            )
+            last_frame = None
+            while True:
+                await pending.wait_for_points()
+                if not pending.points:
+                    break
+                if last_frame is not None:
+                    await asyncio.sleep(max(0.0, last_frame + interval - loop.time()))
+                last_frame = loop.time()
+                yield await pending.take()
+    finally:
+        # Stop reading ahead; re-raises any error the source failed with
+        producer.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await producer
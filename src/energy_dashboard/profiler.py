@@ -0,0 +1,210 @@
+import functools
+import logging
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+from typing import Dict, Optional
+
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+log = logging.getLogger(__name__)
+
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "5"))
+# Most requests one profiling session may cover
+PROFILE_MAX_REQUESTS = 1000
+
+# Innermost frames of a thread parked until it has work, left out of samples
+IDLE_FRAMES = {
+    ("threading.py", "wait"),
+    ("queue.py", "get"),
+}
+
+
+@functools.lru_cache(maxsize=4096)
+def short_path(filename: str) -> str:
+    """
+    A source path relative to the sys.path entry it was imported from.
+    """
+    best = ""
+    for entry in sys.path:
+        if entry and filename.startswith(entry) and len(entry) > len(best):
+            best = entry
+    return filename[len(best) :].lstrip(os.sep) if best else filename
+
+
+def fold(frame) -> str:
+    """
+    A stack, outermost frame first, in the folded format flamegraph.pl,
+    speedscope and inferno read: ``function (file:line);...``.
+    """
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(
+            f"{code.co_qualname} ({short_path(code.co_filename)}:{code.co_firstlineno})"
+        )
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+
+def is_idle(frame) -> bool:
+    code = frame.f_code
+    return (os.path.basename(code.co_filename), code.co_name) in IDLE_FRAMES
+
+
+class ProfileSession:
+    """
+    Stacks sampled while any of the next ``requests`` requests to ``path``
+    were in flight.
+    """
+
+    def __init__(self, path: str, requests: int, interval: float):
+        self.path = path
+        self.requests = requests
+        self.interval = interval
+        self.armed_at = datetime.now()
+        self.finished_at: Optional[datetime] = None
+        self.remaining = requests
+        self.active = 0
+        self.samples = 0
+        self.stacks: Counter = Counter()
+        self.done = threading.Event()
+
+    @property
+    def finished(self) -> bool:
+        return self.done.is_set()
+
+    def status(self) -> Dict:
+        return {
+            "path": self.path,
+            "requests": self.requests,
+            "profiled": self.requests - self.remaining - self.active,
+            "active": self.active,
+            "interval_ms": self.interval * 1000,
+            "samples": self.samples,
+            "armed_at": self.armed_at,
+            "finished_at": self.finished_at,
+            "finished": self.finished,
+        }
+
+    def folded(self) -> str:
+        return "".join(
+            f"{stack} {count}\n" for stack, count in self.stacks.most_common()
+        )
+
+
+class SamplingProfiler:
+    """
+    A wall-clock sampling profiler armed for a number of requests to one
+    path. While one of them is in flight, a thread samples the stack of
+    every other busy thread each interval, rooted at the thread's name.
+
+    Samples cover the whole process, so requests to other paths running
+    at the same time show up too, and renders in the chart worker
+    processes do not. The event loop waiting in ``select`` is kept, as it
+    is time a request spent waiting on I/O.
+    """
+
+    def __init__(self):
+        self.session: Optional[ProfileSession] = None
+        self._lock = threading.Lock()
+        self._sampler: Optional[threading.Thread] = None
+
+    def arm(
+        self, path: str, requests: int, interval_ms: float = PROFILE_INTERVAL_MS
+    ) -> ProfileSession:
+        """
+        Profile the next ``requests`` requests to ``path``, replacing any
+        earlier session.
+        """
+        with self._lock:
+            if self.session is not None:
+                self.session.done.set()
+            self.session = ProfileSession(
+                path, min(requests, PROFILE_MAX_REQUESTS), interval_ms / 1000
+            )
+            log.info(f"Profiling the next {requests} requests to {path}")
+            return self.session
+
+    def disarm(self):
+        with self._lock:
+            if self.session is not None:
+                self._finish(self.session)
+            self.session = None
+
+    def claim(self, path: str) -> Optional[ProfileSession]:
+        """
+        The session a request to ``path`` belongs to, if it is profiled.
+        """
+        with self._lock:
+            session = self.session
+            if session is None or session.path != path or session.remaining <= 0:
+                return None
+            session.remaining -= 1
+            session.active += 1
+            if self._sampler is None:
+                self._sampler = threading.Thread(
+                    target=self._sample, name="profiler", daemon=True
+                )
+                self._sampler.start()
+            return session
+
+    def release(self, session: ProfileSession):
+        with self._lock:
+            session.active -= 1
+            if session.remaining <= 0 and session.active == 0:
+                self._finish(session)
+
+    def _finish(self, session: ProfileSession):
+        if not session.finished:
+            session.finished_at = datetime.now()
+            session.done.set()
+            log.info(f"Profiling finished: {session.status()}")
+
+    def _sample(self):
+        me = threading.get_ident()
+        while True:
+            with self._lock:
+                session = self.session
+                if session is None or session.finished:
+                    self._sampler = None
+                    return
+                active = session.active
+            if active:
+                names = {thread.ident: thread.name for thread in threading.enumerate()}
+                for ident, frame in sys._current_frames().items():
+                    if ident == me or is_idle(frame):
+                        continue
+                    name = names.get(ident, str(ident))
+                    session.stacks[f"{name};{fold(frame)}"] += 1
+                session.samples += 1
+            time.sleep(session.interval)
+
+
+class ProfilingMiddleware:
+    """
+    ASGI middleware marking the requests the profiler is armed for. It only
+    checks an attribute while nothing is being profiled.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        session = None
+        if scope["type"] == "http" and profiler.session is not None:
+            session = profiler.claim(scope["path"])
+        if session is None:
+            await self.app(scope, receive, send)
+            return
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            profiler.release(session)
+
+
+profiler = SamplingProfiler()
@@ -0,0 +1,193 @@
+import asyncio
+import json
+import logging
+import multiprocessing
+import os
+from collections import OrderedDict
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+from typing import Dict, Hashable, Tuple
+
+from energy_dashboard.metrics import (
+    CHART_RENDERS_IN_FLIGHT,
+    CHART_RENDERS_REJECTED_TOTAL,
+    STAGE_SECONDS,
+)
+
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+log = logging.getLogger(__name__)
+
+RENDER_EXECUTOR = os.getenv("CHART_RENDER_EXECUTOR", "process")
+RENDER_WORKERS = int(os.getenv("CHART_RENDER_WORKERS", min(4, os.cpu_count() or 1)))
+RENDER_MAX_PENDING = int(os.getenv("CHART_RENDER_MAX_PENDING", RENDER_WORKERS * 4))
+# Seconds a render waits for a slot in a saturated pool before it is refused
+RENDER_WAIT_TIMEOUT = float(os.getenv("CHART_RENDER_WAIT_TIMEOUT", 5))
+TEMPLATE_CACHE_SIZE = 256
+
+
+def template_key(params, title: str) -> Hashable:
+    """
+    Key a rendered figure template on (respondent, type, range) and its title.
+    Prompt queries carry no respondent/type, so those fall back to None.
+    """
+    type_name = getattr(params, "type_name", None)
+    return (
+        getattr(params, "respondent", None),
+        getattr(type_name, "value", type_name),
+        params.start_date,
+        params.end_date,
+        title,
+    )
+
+
+def render(name: str, *args, **kwargs) -> Tuple[str, str]:
+    """
+    Call the chart.py function ``name`` in a worker. Bokeh and pandas are
+    imported there on first use, so with the process pool the serving
+    process never loads them.
+    """
+    from energy_dashboard import chart
+
+    return getattr(chart, name)(*args, **kwargs)
+
+
+class RenderBusy(Exception):
+    """
+    The render pool stayed saturated for longer than a render may wait.
+    """
+
+
+class ChartRenderer:
+    """
+    Run Bokeh rendering in a bounded worker pool so it never blocks the event
+    loop. At most ``max_workers + max_pending`` renders are in flight; callers
+    beyond that wait up to ``wait_timeout`` for a slot and then get RenderBusy,
+    so a saturated pool sheds renders instead of queueing them without bound.
+    """
+
+    def __init__(
+        self,
+        executor: str = RENDER_EXECUTOR,
+        max_workers: int = RENDER_WORKERS,
+        max_pending: int = RENDER_MAX_PENDING,
+        cache_size: int = TEMPLATE_CACHE_SIZE,
+        wait_timeout: float = RENDER_WAIT_TIMEOUT,
+    ):
+        self.executor_kind = executor
+        self.max_workers = max_workers
+        self.capacity = max_workers + max_pending
+        self.wait_timeout = wait_timeout
+        self.cache_size = cache_size
+        self._executor: Executor | None = None
+        self._slots: asyncio.Semaphore | None = None
+        self._in_flight = 0
+        self._templates: OrderedDict[Hashable, Tuple[str, str]] = OrderedDict()
+        # Templates rendered by other worker processes, when there are any
+        self.shared_cache = None
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    @property
+    def saturated(self) -> bool:
+        return self._in_flight >= self.capacity
+
+    def _get_executor(self) -> Executor:
+        if self._executor is None:
+            if self.executor_kind == "thread":
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.max_workers, thread_name_prefix="chart-render"
+                )
+            else:
+                # Spawned workers avoid forking the running event loop
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+            self._slots = asyncio.Semaphore(self.capacity)
+        return self._executor
+
+    async def _run(self, name: str, *args, **kwargs):
+        executor = self._get_executor()
+        if self.saturated:
+            log.warning(f"Chart render pool saturated ({self._in_flight} in flight)")
+        try:
+            with STAGE_SECONDS.time(stage="render_wait"):
+                await asyncio.wait_for(self._slots.acquire(), self.wait_timeout)
+        except asyncio.TimeoutError:
+            CHART_RENDERS_REJECTED_TOTAL.inc()
+            raise RenderBusy(
+                f"No chart render slot within {self.wait_timeout}s"
+            ) from None
+        self._in_flight += 1
+        try:
+            loop = asyncio.get_running_loop()
+            with STAGE_SECONDS.time(stage="render"):
+                return await loop.run_in_executor(
+                    executor, partial(render, name, *args, **kwargs)
+                )
+        finally:
+            self._in_flight -= 1
+            self._slots.release()
+
+    async def render_chart(
+        self, chart_state: Dict, params, title="Chart Title"
+    ) -> Tuple[str, str]:
+        """
+        Render the full chart for ``chart_state`` off the event loop.
+        """
+        return await self._run("create_chart", chart_state, params, title=title)
+
+    async def render_analytics_chart(
+        self, chart_state: Dict, params, overlays: Dict, title="Chart Title"
+    ) -> Tuple[str, str]:
+        """
+        Render a full chart with analytics overlays off the event loop.
+        """
+        return await self._run(
+            "create_analytics_chart", chart_state, params, overlays, title=title
+        )
+
+    async def render_streaming_chart(
+        self, params, title="Chart Title"
+    ) -> Tuple[str, str]:
+        """
+        Render, or reuse from the template cache, the empty streaming chart.
+        """
+        key = template_key(params, title)
+        cached = self._templates.get(key)
+        if cached is not None:
+            self._templates.move_to_end(key)
+            return cached
+
+        shared_key = json.dumps(["streaming-chart", *key], default=str)
+        shared = (
+            await asyncio.to_thread(self.shared_cache.get, shared_key)
+            if self.shared_cache is not None
+            else None
+        )
+        if shared is not None:
+            rendered = tuple(json.loads(shared))
+        else:
+            rendered = await self._run("create_streaming_chart", params, title=title)
+            if self.shared_cache is not None:
+                await asyncio.to_thread(
+                    self.shared_cache.set, shared_key, json.dumps(rendered)
+                )
+        self._templates[key] = rendered
+        if len(self._templates) > self.cache_size:
+            self._templates.popitem(last=False)
+        return rendered
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+            self._slots = None
+
+
+renderer = ChartRenderer()
+CHART_RENDERS_IN_FLIGHT.collect_with(lambda: [({}, renderer.in_flight)])
@@ -1,28 +1,27 @@
 import logging
 import os
 from datetime import datetime
-from typing import AsyncGenerator
+from typing import AsyncGenerator, Dict, List, Optional, Sequence
 
 import httpx
-from dotenv import load_dotenv
 from energy_dashboard.database import (
     EnergyDataTable,
-    database,
     get_energy_data_schema,
 )
+from energy_dashboard.hot_store import hot_store
+from energy_dashboard.ingest import EIA_PAGE_LENGTH, ingest_items
 from energy_dashboard.llm import gen_async_client, streaming_gen_select_query
+from energy_dashboard.metrics import ROWS_STREAMED_TOTAL, StageTimer
 from energy_dashboard.models import (
     EnergyData,
     RetrieveEnergyDataRequest,
     SqlSelectQuery,
 )
-from energy_dashboard.utils import URLBuilder
-from sqlalchemy import insert, select, text, Row, and_
+from energy_dashboard.utils import URLBuilder, parse_date_range
+from sqlalchemy import select, text, Row, and_
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
-load_dotenv()
-
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 log = logging.getLogger(__name__)
@@ -47,7 +46,14 @@ class EnergyDataService:
         url_builder.add_api_key(self.api_key)
         return url_builder.build()
 
-    async def fetch_data(self, params) -> dict:
+    async def fetch_pages(self, params) -> AsyncGenerator[dict, None]:
+        """
+        Page through the EIA API, advancing params["offset"] past every page.
+        The API returns at most EIA_PAGE_LENGTH rows whatever params["length"]
+        asks for, so only a page shorter than that is the last one.
+        """
+        page_length = min(int(params["length"]), EIA_PAGE_LENGTH)
+        params["offset"] = int(params.get("offset", 0))
         while True:
             # Build the URL using the parameters
             url = self.build_url(params)
@@ -57,49 +63,104 @@ class EnergyDataService:
 
             # Parse the response as JSON
             data = response.json()
+            yield data
 
-            # Break the loop if there is no data in the response
-            if not data["response"]["data"]:
+            # Stop after the last (short or empty) page
+            rows = len(data["response"]["data"])
+            if rows < page_length:
                 break
 
-            # Process each item in the data
-            for item in data["response"]["data"]:
-                # Convert the value to float, or 0.0 if it is None
-                value = float(item["value"]) if item["value"] is not None else 0.0
-
-                # Parse the period string into a datetime object
-                period = datetime.strptime(item["period"], "%Y-%m-%dT%H")
-
-                # Create an insert query for the EnergyData table
-                query = insert(EnergyDataTable).values(
-                    value=value,
-                    period=period,
-                    respondent=item["respondent"],
-                    respondent_name=item["respondent-name"],
-                    type=item["type"],
-                    type_name=item["type-name"],
-                    value_units=item["value-units"],
-                )
-
-                # Execute the query
-                await database.execute(query)
-
             # Increment the offset parameter for the next iteration
-            params["offset"] += params["length"]
+            params["offset"] += rows
 
+    async def fetch_data(self, params) -> dict:
+        data = None
+        async for data in self.fetch_pages(params):
+            await ingest_items(self.async_db, data["response"]["data"])
         return data
 
+    async def ingest_new(self, params) -> List[EnergyData]:
+        """
+        Fetch from the EIA API and return only the rows that were not stored yet
+        """
+        inserted = []
+        async for data in self.fetch_pages(params):
+            inserted.extend(await ingest_items(self.async_db, data["response"]["data"]))
+        return inserted
+
     async def list_all(self, count=None, params=None):
         """
         Return rows from the EnergyDataTable based on the provided parameters.
         Filter out the US48 respondent by default.
         """
+        # Serve recent ranges from the in-memory hot store
+        points = hot_store.query(params) if params else None
+        if points is not None:
+            ROWS_STREAMED_TOTAL.inc(
+                len(points), operation="list_all", source="hot_store"
+            )
+            return [
+                {name: str(value) for name, value in point.model_dump().items()}
+                for point in points
+            ]
+
         # Prepare the SQL statement
-        stmt = await self.prepare_stmt(params, count)
+        stmt = self.prepare_stmt(params, count)
 
         # Execute the query and return the result
+        timer = StageTimer()
         result = await self.async_db.execute(stmt)
         rows = result.scalars().all()
+        timer.mark("sql")
+        timer.observe()
+        ROWS_STREAMED_TOTAL.inc(len(rows), operation="list_all", source="db")
+        return [self.row_to_dict(row) for row in rows]
+
+    async def list_page(
+        self,
+        params: RetrieveEnergyDataRequest,
+        after: Optional[datetime] = None,
+        limit: int = 100,
+    ) -> List[Dict]:
+        """
+        Up to ``limit`` rows for params in period order, following the period
+        ``after`` when given. Pages are keyed on the last period seen rather
+        than an offset, so a page deep into a long range costs what the first
+        one does.
+        """
+        points = hot_store.query(params, after, limit)
+        if points is not None:
+            ROWS_STREAMED_TOTAL.inc(
+                len(points), operation="list_page", source="hot_store"
+            )
+            return [
+                {name: str(value) for name, value in point.model_dump().items()}
+                for point in points
+            ]
+
+        start_date, end_date = parse_date_range(params.start_date, params.end_date)
+        conditions = [
+            EnergyDataTable.respondent == params.respondent,
+            # The type code rather than its name, so the page is a range scan
+            # of the (respondent, type, period) index that stops at the limit
+            # instead of a sort of the whole range
+            EnergyDataTable.type == params.type_name.name,
+            EnergyDataTable.period >= start_date,
+            EnergyDataTable.period <= end_date,
+        ]
+        if after is not None:
+            conditions.append(EnergyDataTable.period > after)
+        stmt = (
+            select(EnergyDataTable)
+            .where(*conditions)
+            .order_by(EnergyDataTable.period)
+            .limit(limit)
+        )
+        timer = StageTimer()
+        rows = (await self.async_db.scalars(stmt)).all()
+        timer.mark("sql")
+        timer.observe()
+        ROWS_STREAMED_TOTAL.inc(len(rows), operation="list_page", source="db")
         return [self.row_to_dict(row) for row in rows]
 
     async def stream_all_from_prompt(
@@ -108,53 +169,139 @@ class EnergyDataService:
         """
         Perform select query on the EnergyDataTable table from the prompt
         """
+        query = await self.generate_query(prompt)
+        async for data in self.stream_query(query, row_count):
+            yield data, query
+        yield None
+
+    async def generate_query(self, prompt: str) -> SqlSelectQuery:
+        """
+        Ask the LLM for a select query on the EnergyDataTable from the prompt
+        """
         schema_ddl = get_energy_data_schema()
         client = gen_async_client()
         query = await streaming_gen_select_query(client, schema_ddl, prompt)
-        log.info(f"Executing query: {query} from prompt: {prompt}")
+        log.info(f"Generated query: {query} from prompt: {prompt}")
+        return query
+
+    async def stream_query(
+        self, query: SqlSelectQuery, row_count=10
+    ) -> AsyncGenerator[EnergyData, None]:
+        """
+        Stream the rows of a generated select query as EnergyData
+        """
         stmt = text(query.select_stmt).execution_options(
             stream_results=True, max_row_buffer=row_count
         )
+        timer = StageTimer()
         rows = await self.async_db.stream(stmt)
         columns = [clmn.description for clmn in EnergyDataTable.__table__.columns]
-        async for row in rows:
-            row_data = dict(zip(columns, row))
-            data = EnergyData.model_validate(row_data)
-            yield data, query
-        yield None
+        count = 0
+        try:
+            async for row in rows:
+                timer.mark("sql")
+                row_data = dict(zip(columns, row))
+                data = EnergyData.model_validate(row_data)
+                timer.mark("validation")
+                count += 1
+                yield data
+                timer.reset()
+        finally:
+            # Release the cursor even when the consumer stops early
+            await rows.close()
+            timer.observe()
+            ROWS_STREAMED_TOTAL.inc(count, operation="stream_query", source="db")
 
     async def stream_all(
         self, chart_params: RetrieveEnergyDataRequest, row_count=10
     ) -> AsyncGenerator[EnergyData, None]:
-        stmt = self.prepare_stmt(chart_params, row_count)
-        stmt.execution_options(stream_results=True, max_row_buffer=row_count)
+        points = hot_store.query(chart_params)
+        if points is not None:
+            ROWS_STREAMED_TOTAL.inc(
+                len(points), operation="stream_all", source="hot_store"
+            )
+            for start in range(0, len(points), row_count):
+                yield points[start : start + row_count]
+            return
 
+        stmt = self.prepare_stmt(chart_params, row_count).execution_options(
+            stream_results=True, max_row_buffer=row_count
+        )
+
+        timer = StageTimer()
         results_stream = await self.async_db.stream(stmt)
         buffer = []
-        async for partition in results_stream.partitions(row_count):
-            for rows in partition:
-                for row in rows:
-                    row_dict = self.row_to_dict(row)
-                    data = EnergyData.model_validate(row_dict)
-                    buffer.append(data)
-                    if len(buffer) >= row_count:
-                        yield buffer
-                        buffer = []
+        count = 0
+        try:
+            async for partition in results_stream.partitions(row_count):
+                timer.mark("sql")
+                for rows in partition:
+                    for row in rows:
+                        row_dict = self.row_to_dict(row)
+                        data = EnergyData.model_validate(row_dict)
+                        buffer.append(data)
+                        count += 1
+                        if len(buffer) >= row_count:
+                            timer.mark("validation")
+                            yield buffer
+                            timer.reset()
+                            buffer = []
+                timer.mark("validation")
+        finally:
+            await results_stream.close()
+            timer.observe()
+            ROWS_STREAMED_TOTAL.inc(count, operation="stream_all", source="db")
         if buffer:
             yield buffer
 
+    async def stream_columns(
+        self,
+        params: RetrieveEnergyDataRequest,
+        columns: Sequence[str],
+        batch_size=1000,
+    ) -> AsyncGenerator[Dict[str, List], None]:
+        """
+        Stream the rows matching params as columnar batches of raw values,
+        skipping ORM objects, string conversion and model validation.
+        """
+        data = hot_store.columns(params, columns)
+        if data is not None:
+            rows = len(data[columns[0]]) if columns else 0
+            ROWS_STREAMED_TOTAL.inc(
+                rows, operation="stream_columns", source="hot_store"
+            )
+            for start in range(0, rows, batch_size):
+                yield {
+                    name: values[start : start + batch_size]
+                    for name, values in data.items()
+                }
+            return
+
+        table = EnergyDataTable.__table__
+        stmt = (
+            self.prepare_stmt(params, batch_size)
+            .with_only_columns(*(table.c[name] for name in columns))
+            .execution_options(stream_results=True, max_row_buffer=batch_size)
+        )
+        timer = StageTimer()
+        results_stream = await self.async_db.stream(stmt)
+        count = 0
+        try:
+            async for partition in results_stream.partitions(batch_size):
+                timer.mark("sql")
+                count += len(partition)
+                yield dict(zip(columns, map(list, zip(*partition))))
+                timer.reset()
+        finally:
+            await results_stream.close()
+            timer.observe()
+            ROWS_STREAMED_TOTAL.inc(count, operation="stream_columns", source="db")
+
     @staticmethod
     def prepare_stmt(params: RetrieveEnergyDataRequest, row_count):
         if params:
             # Convert start_date and end_date from string to datetime
-            try:
-                start_date = datetime.strptime(
-                    params.start_date, "%Y-%m-%d %H:%M:%S.%f"
-                )
-                end_date = datetime.strptime(params.end_date, "%Y-%m-%d %H:%M:%S.%f")
-            except ValueError:
-                start_date = datetime.strptime(params.start_date, "%Y-%m-%d")
-                end_date = datetime.strptime(params.end_date, "%Y-%m-%d")
+            start_date, end_date = parse_date_range(params.start_date, params.end_date)
 
             stmt = (
                 select(EnergyDataTable)
@@ -0,0 +1,301 @@
+import functools
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from datetime import datetime
+from typing import Dict, List, NamedTuple, Optional
+
+from sqlalchemy import (
+    Column,
+    DateTime,
+    Float,
+    Integer,
+    MetaData,
+    String,
+    Table,
+    Text,
+    create_engine,
+    delete,
+    event,
+    func,
+    insert,
+    select,
+)
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import SQLAlchemyError
+
+from energy_dashboard.database import async_engine, create_tables, engine
+from energy_dashboard.metrics import SLOW_QUERIES_TOTAL
+from energy_dashboard.utils import ROOT_DIR
+
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+log = logging.getLogger(__name__)
+
+SLOW_QUERY_ENABLED = os.getenv("SLOW_QUERY_ENABLED", "true").lower() == "true"
+# Statements taking longer than this are recorded
+SLOW_QUERY_SECONDS = float(os.getenv("SLOW_QUERY_SECONDS", "0.25"))
+SLOW_QUERY_DB_PATH = os.getenv("SLOW_QUERY_DB_PATH", f"{ROOT_DIR}/slow_queries.db")
+# Newest records kept in the store
+SLOW_QUERY_KEEP = int(os.getenv("SLOW_QUERY_KEEP", "10000"))
+
+# Slow queries waiting for their plan; more than this are dropped
+QUEUE_SIZE = 1000
+# Parameter sets stored for an executemany
+MAX_PARAMETER_SETS = 20
+
+metadata = MetaData()
+
+slow_queries = Table(
+    "slow_queries",
+    metadata,
+    Column("id", Integer, primary_key=True, autoincrement=True),
+    Column("recorded_at", DateTime, nullable=False, index=True),
+    Column("engine", String, nullable=False),
+    Column("seconds", Float, nullable=False),
+    Column("statement", Text, nullable=False),
+    Column("parameters", Text, nullable=True),
+    Column("executemany", Integer, nullable=False, default=0),
+    Column("plan", Text, nullable=True),
+)
+
+
+class SlowQuery(NamedTuple):
+    recorded_at: datetime
+    engine: str
+    seconds: float
+    statement: str
+    parameters: object
+    executemany: bool
+
+
+def format_plan(rows) -> str:
+    """
+    EXPLAIN QUERY PLAN rows as the indented tree the sqlite3 shell prints.
+    """
+    depth = {0: -1}
+    lines = []
+    for node, parent, _, detail in rows:
+        depth[node] = depth.get(parent, -1) + 1
+        lines.append("  " * depth[node] + detail)
+    return "\n".join(lines)
+
+
+class SlowQueryLog:
+    """
+    Times every statement run by the engines it is installed on and records
+    those over the threshold, with their EXPLAIN QUERY PLAN, in a SQLite
+    store of their own.
+
+    The hooks only compare timestamps; recording and explaining a slow
+    statement is handed to a writer thread, so it costs the request that
+    ran it nothing. Timing covers cursor execution, which for SQLite
+    includes stepping to the first row; rows fetched later from a
+    streamed cursor are not counted.
+    """
+
+    def __init__(
+        self,
+        path: str = SLOW_QUERY_DB_PATH,
+        threshold: float = SLOW_QUERY_SECONDS,
+        keep: int = SLOW_QUERY_KEEP,
+        explain_engine: Engine = engine,
+    ):
+        self.path = path
+        self.threshold = threshold
+        self.keep = keep
+        self.explain_engine = explain_engine
+        self.dropped = 0
+        self._queue: "queue.Queue[SlowQuery]" = queue.Queue(QUEUE_SIZE)
+        self._writer: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    @functools.cached_property
+    def store(self) -> Engine:
+        """
+        The store's engine, created with its table on first use.
+        """
+        store = create_engine(f"sqlite:///{self.path}")
+        create_tables(metadata, store)
+        return store
+
+    def install(self, bound: Engine, name: str):
+        """
+        Time the statements of an engine; pass ``sync_engine`` for an
+        async one.
+        """
+
+        @event.listens_for(bound, "before_cursor_execute")
+        def before_cursor_execute(
+            conn, cursor, statement, parameters, context, executemany
+        ):
+            if context is not None:
+                context.slow_query_started = time.perf_counter()
+
+        @event.listens_for(bound, "after_cursor_execute")
+        def after_cursor_execute(
+            conn, cursor, statement, parameters, context, executemany
+        ):
+            started = getattr(context, "slow_query_started", None)
+            if started is None:
+                return
+            seconds = time.perf_counter() - started
+            if seconds >= self.threshold and not statement.startswith("EXPLAIN"):
+                self.record(
+                    SlowQuery(
+                        datetime.now(),
+                        name,
+                        seconds,
+                        statement,
+                        parameters,
+                        executemany,
+                    )
+                )
+
+    def record(self, query: SlowQuery):
+        SLOW_QUERIES_TOTAL.inc(engine=query.engine)
+        log.warning(
+            f"Slow query on {query.engine} ({query.seconds:.3f}s): "
+            f"{' '.join(query.statement.split())[:200]}"
+        )
+        try:
+            self._queue.put_nowait(query)
+        except queue.Full:
+            self.dropped += 1
+            return
+        with self._lock:
+            if self._writer is None:
+                self._writer = threading.Thread(
+                    target=self._write, name="slow-query-log", daemon=True
+                )
+                self._writer.start()
+
+    def flush(self):
+        """
+        Wait until every slow query recorded so far is in the store.
+        """
+        self._queue.join()
+
+    def _write(self):
+        while True:
+            query = self._queue.get()
+            try:
+                self._store(query)
+            except Exception:
+                log.exception("Could not store slow query")
+            finally:
+                self._queue.task_done()
+
+    def _store(self, query: SlowQuery):
+        parameters = query.parameters
+        first = parameters[0] if query.executemany and parameters else parameters
+        if query.executemany:
+            parameters = list(parameters[:MAX_PARAMETER_SETS])
+        plan = self.explain(query.statement, first)
+        with self.store.begin() as connection:
+            result = connection.execute(
+                insert(slow_queries).values(
+                    recorded_at=query.recorded_at,
+                    engine=query.engine,
+                    seconds=query.seconds,
+                    statement=query.statement,
+                    parameters=json.dumps(parameters, default=str),
+                    executemany=len(query.parameters) if query.executemany else 0,
+                    plan=plan,
+                )
+            )
+            oldest = result.inserted_primary_key[0] - self.keep
+            if oldest > 0:
+                connection.execute(
+                    delete(slow_queries).where(slow_queries.c.id <= oldest)
+                )
+
+    def explain(self, statement: str, parameters) -> Optional[str]:
+        """
+        The query plan of a statement, or None if SQLite cannot explain it.
+        """
+        try:
+            with self.explain_engine.connect() as connection:
+                rows = connection.exec_driver_sql(
+                    f"EXPLAIN QUERY PLAN {statement}", parameters or ()
+                ).all()
+        except SQLAlchemyError as exc:
+            log.info(f"No query plan for slow query: {exc}")
+            return None
+        return format_plan(rows)
+
+    def recent(
+        self,
+        limit: int = 50,
+        min_seconds: float = 0.0,
+        since: Optional[datetime] = None,
+        contains: Optional[str] = None,
+    ) -> List[Dict]:
+        """
+        The newest slow queries, optionally filtered.
+        """
+        stmt = (
+            select(slow_queries)
+            .where(slow_queries.c.seconds >= min_seconds)
+            .order_by(slow_queries.c.id.desc())
+            .limit(limit)
+        )
+        if since is not None:
+            stmt = stmt.where(slow_queries.c.recorded_at >= since)
+        if contains:
+            stmt = stmt.where(slow_queries.c.statement.contains(contains))
+        with self.store.connect() as connection:
+            rows = connection.execute(stmt).mappings().all()
+        return [dict(row, parameters=json.loads(row["parameters"])) for row in rows]
+
+    def top(self, limit: int = 20, since: Optional[datetime] = None) -> List[Dict]:
+        """
+        Slow statements grouped by text, slowest total time first, with the
+        plan of their latest run.
+        """
+        stmt = (
+            select(
+                slow_queries.c.statement,
+                func.count().label("count"),
+                func.sum(slow_queries.c.seconds).label("total_seconds"),
+                func.avg(slow_queries.c.seconds).label("mean_seconds"),
+                func.max(slow_queries.c.seconds).label("max_seconds"),
+                func.max(slow_queries.c.recorded_at).label("last_recorded_at"),
+                func.max(slow_queries.c.id).label("last_id"),
+            )
+            .group_by(slow_queries.c.statement)
+            .order_by(func.sum(slow_queries.c.seconds).desc())
+            .limit(limit)
+        )
+        if since is not None:
+            stmt = stmt.where(slow_queries.c.recorded_at >= since)
+        with self.store.connect() as connection:
+            rows = connection.execute(stmt).mappings().all()
+            plans = dict(
+                connection.execute(
+                    select(slow_queries.c.id, slow_queries.c.plan).where(
+                        slow_queries.c.id.in_([row["last_id"] for row in rows])
+                    )
+                ).all()
+            )
+        return [
+            dict(
+                {key: value for key, value in row.items() if key != "last_id"},
+                plan=plans.get(row["last_id"]),
+            )
+            for row in rows
+        ]
+
+    def clear(self) -> int:
+        with self.store.begin() as connection:
+            return connection.execute(delete(slow_queries)).rowcount
+
+
+slow_query_log = SlowQueryLog()
+if SLOW_QUERY_ENABLED:
+    slow_query_log.install(async_engine.sync_engine, "async")
+    slow_query_log.install(engine, "sync")
@@ -0,0 +1,219 @@
+import asyncio
+import json
+import logging
+import os
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from sqlalchemy import and_, func, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from energy_dashboard.database import AsyncSessionLocal, EnergyDataTable
+from energy_dashboard.ingest import on_ingest
+from energy_dashboard.versions import Validators, process_token
+
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+log = logging.getLogger(__name__)
+
+SNAPSHOT_ENABLED = os.getenv("SNAPSHOT_ENABLED", "true").lower() == "true"
+
+HOUR = timedelta(hours=1)
+# The sparkline's hours, ending at a series' newest hour
+SPARKLINE_HOURS = 24
+# Enough hours to reach the value a day before the newest one
+WINDOW_HOURS = SPARKLINE_HOURS + 1
+# Series whose window rows are read by one statement at startup
+LOAD_SERIES_PER_QUERY = 200
+
+
+class SnapshotSeries:
+    """
+    The last day of one (respondent, type) series, ending at its own newest
+    hour, as respondents report with different delays.
+    """
+
+    __slots__ = (
+        "respondent",
+        "respondent_name",
+        "type",
+        "type_name",
+        "value_units",
+        "newest",
+        "values",
+    )
+
+    def __init__(self, point):
+        self.respondent = point.respondent
+        self.respondent_name = point.respondent_name
+        self.type = point.type
+        self.type_name = point.type_name
+        self.value_units = point.value_units
+        self.newest: datetime = point.period
+        self.values: List[Optional[float]] = [None] * WINDOW_HOURS
+
+    def store(self, period: datetime, value: Optional[float]):
+        ahead = int((period - self.newest) // HOUR)
+        if ahead > 0:
+            self.values = self.values[ahead:] + [None] * min(ahead, WINDOW_HOURS)
+            self.newest = period
+            ahead = 0
+        index = WINDOW_HOURS - 1 + ahead
+        if index >= 0 and value is not None:
+            self.values[index] = value
+
+    def entry(self) -> Dict:
+        value, previous = self.values[-1], self.values[0]
+        return {
+            "respondent": self.respondent,
+            "respondent_name": self.respondent_name,
+            "type": self.type,
+            "type_name": self.type_name,
+            "value_units": self.value_units,
+            "period": self.newest.isoformat(),
+            "value": value,
+            "previous_day_value": previous,
+            "change": (value - previous if None not in (value, previous) else None),
+            "sparkline": self.values[-SPARKLINE_HOURS:],
+        }
+
+
+class Snapshot:
+    """
+    The latest value, the value a day earlier and a 24 hour sparkline of
+    every series, kept current by ingest.
+
+    Ingest only touches the series it stored points for; their entries are
+    rebuilt, and the serialized body re-encoded, on the next read. Serving
+    an unchanged snapshot is a lookup, whatever the size of the table.
+    """
+
+    def __init__(self):
+        self.token = process_token(datetime.now(timezone.utc))
+        self.loaded = False
+        self.version = 0
+        self.modified = datetime.now(timezone.utc)
+        self._series: Dict[Tuple[str, str], SnapshotSeries] = {}
+        self._entries: Dict[Tuple[str, str], Dict] = {}
+        self._dirty: set = set()
+        self._body: Optional[bytes] = None
+        # Points ingested while loading, applied once the load has finished
+        self._pending: Optional[List] = None
+        # The highest row id when the last sync loaded the snapshot
+        self.newest_row: Optional[int] = None
+        self._syncing = asyncio.Lock()
+
+    async def load(self, async_db: AsyncSession):
+        """
+        Fill every series with its last day of rows from EnergyDataTable.
+        """
+        self.loaded = False
+        self._pending = []
+        self._series.clear()
+        self._entries.clear()
+        self._dirty.clear()
+        self._body = None
+        latest = (
+            await async_db.execute(
+                select(
+                    EnergyDataTable.respondent,
+                    EnergyDataTable.type,
+                    func.max(EnergyDataTable.period),
+                ).group_by(EnergyDataTable.respondent, EnergyDataTable.type)
+            )
+        ).all()
+        for first in range(0, len(latest), LOAD_SERIES_PER_QUERY):
+            windows = [
+                and_(
+                    EnergyDataTable.respondent == respondent,
+                    EnergyDataTable.type == type_,
+                    EnergyDataTable.period >= newest - (WINDOW_HOURS - 1) * HOUR,
+                )
+                for respondent, type_, newest in latest[
+                    first : first + LOAD_SERIES_PER_QUERY
+                ]
+            ]
+            rows = await async_db.scalars(select(EnergyDataTable).where(or_(*windows)))
+            self._store(rows.all())
+        pending, self._pending = self._pending, None
+        self.loaded = True
+        self._store(pending)
+        log.info(f"Snapshot loaded: {len(self._series)} series")
+
+    async def sync(self, async_db: AsyncSession):
+        """
+        Load the snapshot again if rows were stored since the last sync, for
+        a process that does not see every ingest. Rows are only ever added,
+        so the highest row id moves with every write; checking it reads one
+        index entry.
+        """
+        async with self._syncing:
+            newest = await async_db.scalar(select(func.max(EnergyDataTable.id)))
+            if not self.loaded or newest != self.newest_row:
+                await self.load(async_db)
+                self.newest_row = newest
+
+    def add(self, points: Sequence):
+        """
+        Ingest listener keeping the snapshot current.
+        """
+        if self._pending is not None:
+            self._pending.extend(points)
+        elif self.loaded:
+            self._store(points)
+
+    def _store(self, points: Sequence):
+        if not points:
+            return
+        for point in points:
+            key = (point.respondent, point.type_name)
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = SnapshotSeries(point)
+            series.store(point.period, point.value)
+            self._dirty.add(key)
+        self.version += 1
+        self.modified = datetime.now(timezone.utc)
+        self._body = None
+
+    def body(self) -> bytes:
+        """
+        The snapshot as JSON, series in (respondent, type) order.
+        """
+        if self._body is None:
+            for key in self._dirty:
+                self._entries[key] = self._series[key].entry()
+            self._dirty.clear()
+            self._body = json.dumps(
+                {
+                    "version": self.version,
+                    "series": [self._entries[key] for key in sorted(self._entries)],
+                }
+            ).encode("utf-8")
+        return self._body
+
+    def validators(self) -> Validators:
+        return Validators(
+            etag=f'W/"{self.token}-{self.version}"',
+            last_modified=self.modified,
+            closed=False,
+        )
+
+
+async def load_snapshot():
+    if not SNAPSHOT_ENABLED:
+        return
+    async with AsyncSessionLocal() as async_db:
+        await snapshot.load(async_db)
+
+
+async def sync_snapshot():
+    if not SNAPSHOT_ENABLED:
+        return
+    async with AsyncSessionLocal() as async_db:
+        await snapshot.sync(async_db)
+
+
+snapshot = Snapshot()
+on_ingest(snapshot.add)
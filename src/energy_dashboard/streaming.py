@@ -0,0 +1,247 @@
+import asyncio
+import contextlib
+import json
+import logging
+from datetime import timezone
+from typing import AsyncGenerator, AsyncIterator, Dict, Iterable, List, Optional
+
+from fastapi import Request
+from fastapi.templating import Jinja2Templates
+
+from energy_dashboard.metrics import (
+    SSE_FRAMES_TOTAL,
+    SSE_STREAMS_ACTIVE,
+    SSE_STREAMS_TOTAL,
+    STAGE_SECONDS,
+)
+from energy_dashboard.models import ChartMode, EnergyData
+from energy_dashboard.rendering import RenderBusy, renderer
+from energy_dashboard.utils import TEMPLATES_DIR
+
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+log = logging.getLogger(__name__)
+
+HX_SSE_LISTENER = "hx-sse-listener"
+CHART_TOPIC = "chart"
+DELTA_TOPIC = "chart-delta"
+TERMINATE = "Terminate"
+
+# Seconds between checks for a client that has gone away
+DISCONNECT_POLL_INTERVAL = 0.5
+
+CHART_ATTRS = {"id": "linechart", "hx-swap-oob": "true"}
+TERMINATE_ATTRS = {"id": HX_SSE_LISTENER, "hx-swap-oob": "true"}
+
+templates = Jinja2Templates(directory=TEMPLATES_DIR)
+
+
+def create_context(div, script):
+    context = {
+        "script": script.replace("\n", " "),
+        "div": div.replace("\n", " "),
+    }
+    return context
+
+
+def chart_delta(points: Iterable[EnergyData]) -> Dict:
+    """
+    Build the columnar payload for ``ColumnDataSource.stream`` on the client,
+    with periods as milliseconds since the epoch like Bokeh's own encoding.
+    """
+    hours = []
+    values = []
+    for point in points:
+        hours.append(point.period.replace(tzinfo=timezone.utc).timestamp() * 1000)
+        values.append(point.value)
+    return {"hours": hours, "values": values}
+
+
+def render_sse_html_chunk(event, chunk, attrs=None):
+    if attrs is None:
+        attrs = {}
+    tmpl = templates.get_template("partials/streaming_chunk.jinja2")
+    html_chunk = tmpl.render(event=event, chunk=chunk, attrs=attrs)
+    return html_chunk
+
+
+def render_chunk(event: str, context: Dict, attrs: Dict):
+    chunk = render_sse_html_chunk(
+        event,
+        context,
+        attrs=attrs,
+    )
+    return f"{chunk}\n\n".encode("utf-8")
+
+
+def render_event(event: str, data: Dict) -> bytes:
+    """
+    Encode a JSON payload as a single SSE event.
+    """
+    payload = json.dumps(data, separators=(",", ":"))
+    return f"event: {event}\ndata: {payload}\n\n".encode("utf-8")
+
+
+class ChartEncoder:
+    """
+    Encode batches of points into the SSE frames of one chart.
+
+    In ``STREAM`` mode the figure is rendered once and every batch after that
+    is sent as a small JSON delta. ``FULL`` mode re-renders the whole figure
+    per batch. With ``keep_history`` the streamed points are kept so a late
+    subscriber can be caught up from ``snapshot``; a single connection leaves
+    it off and holds nothing once a delta has been sent.
+    """
+
+    def __init__(
+        self,
+        params,
+        title: str,
+        mode: ChartMode = ChartMode.STREAM,
+        keep_history=False,
+    ):
+        self.params = params
+        self.title = title
+        self.mode = mode
+        self.keep_history = keep_history
+        self.chart_frame: Optional[bytes] = None
+        self.history = {"hours": [], "values": []}
+        self.chart_state = {
+            "x_state": [],
+            "y_state": [],
+        }
+
+    async def start(self) -> Optional[bytes]:
+        """
+        Render the initial frame, if the mode has one.
+        """
+        if self.mode is ChartMode.STREAM:
+            div, script = await renderer.render_streaming_chart(
+                self.params, title=self.title
+            )
+            self.chart_frame = render_chunk(
+                CHART_TOPIC, create_context(div, script), CHART_ATTRS
+            )
+        return self.chart_frame
+
+    async def encode(self, batch: List[EnergyData]) -> bytes:
+        if self.mode is ChartMode.STREAM:
+            delta = chart_delta(batch)
+            if self.keep_history:
+                self.history["hours"].extend(delta["hours"])
+                self.history["values"].extend(delta["values"])
+            return render_event(DELTA_TOPIC, delta)
+
+        for energy_data in batch:
+            self.chart_state["y_state"].append(energy_data.value)
+            self.chart_state["x_state"].append(energy_data.period)
+        div, script = await renderer.render_chart(
+            self.chart_state, self.params, title=self.title
+        )
+        self.chart_frame = render_chunk(
+            CHART_TOPIC, create_context(div, script), CHART_ATTRS
+        )
+        return self.chart_frame
+
+    def snapshot(self) -> List[bytes]:
+        """
+        Frames that bring a new client up to the current state of the chart.
+        """
+        frames = [] if self.chart_frame is None else [self.chart_frame]
+        if self.mode is ChartMode.STREAM and self.history["hours"]:
+            frames.append(render_event(DELTA_TOPIC, self.history))
+        return frames
+
+    @staticmethod
+    def terminate() -> bytes:
+        return render_chunk(TERMINATE, {}, TERMINATE_ATTRS)
+
+
+async def chart_frames(
+    batches: AsyncIterator[List[EnergyData]],
+    params,
+    title: str,
+    mode: ChartMode = ChartMode.STREAM,
+):
+    """
+    Yield the SSE frames that draw ``batches`` of points as a line chart,
+    one frame per batch. A render refused by a saturated pool ends the
+    stream early, still with its Terminate frame.
+    """
+    async with contextlib.aclosing(batches):
+        encoder = ChartEncoder(params, title, mode)
+        try:
+            frame = await encoder.start()
+            if frame is not None:
+                yield frame
+            async for batch in batches:
+                log.info(f"Sending {len(batch)} points to client...")
+                yield await encoder.encode(batch)
+        except RenderBusy as exc:
+            # End the client's stream so it does not reconnect into the queue
+            log.warning(f"Chart stream {title!r} refused: {exc}")
+        yield encoder.terminate()
+
+
+async def until_disconnected(request: Request):
+    while not await request.is_disconnected():
+        await asyncio.sleep(DISCONNECT_POLL_INTERVAL)
+
+
+async def _cancel(task: Optional[asyncio.Future]):
+    if task is not None and not task.done():
+        task.cancel()
+        with contextlib.suppress(asyncio.CancelledError, StopAsyncIteration):
+            await task
+
+
+async def guard_stream(
+    request: Request, frames: AsyncGenerator[bytes, None], endpoint: str
+) -> AsyncGenerator[bytes, None]:
+    """
+    Relay ``frames`` while the client is connected.
+
+    Once the client goes away the pending step of the pipeline is cancelled
+    and ``frames`` is closed, which unwinds everything behind it: pacing
+    producers, database cursors and sessions, queued chart renders and hub
+    subscriptions. Outcomes are counted in ``SSE_STREAMS_TOTAL``.
+    """
+    SSE_STREAMS_ACTIVE.inc(endpoint=endpoint)
+    outcome = "failed"
+    watcher = asyncio.create_task(until_disconnected(request))
+    try:
+        async with contextlib.aclosing(frames):
+            next_frame = None
+            try:
+                while True:
+                    next_frame = asyncio.ensure_future(anext(frames))
+                    await asyncio.wait(
+                        {next_frame, watcher}, return_when=asyncio.FIRST_COMPLETED
+                    )
+                    if watcher.done():
+                        outcome = "abandoned"
+                        break
+                    try:
+                        frame = next_frame.result()
+                    except StopAsyncIteration:
+                        outcome = "completed"
+                        break
+                    next_frame = None
+                    # Resuming waits on the response write to the client
+                    with STAGE_SECONDS.time(stage="sse_write"):
+                        yield frame
+                    SSE_FRAMES_TOTAL.inc(endpoint=endpoint)
+            finally:
+                # The frame being produced must stop before frames is closed
+                await _cancel(next_frame)
+    except (asyncio.CancelledError, GeneratorExit):
+        # Cancelled by the server or closed while the client was away
+        outcome = "abandoned"
+        raise
+    finally:
+        await _cancel(watcher)
+        SSE_STREAMS_ACTIVE.dec(endpoint=endpoint)
+        SSE_STREAMS_TOTAL.inc(endpoint=endpoint, outcome=outcome)
+        if outcome == "abandoned":
+            log.info(f"Client left {endpoint}, stream resources released")
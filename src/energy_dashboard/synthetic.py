@@ -0,0 +1,81 @@
+import logging
+from datetime import datetime, timedelta
+from typing import Dict, Iterator, List, Sequence
+
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.engine import Engine
+
+from energy_dashboard.database import EnergyDataTable
+from energy_dashboard.fakes import RESPONDENTS, respondent_info, synthetic_value
+from energy_dashboard.models import EnergyType
+
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+log = logging.getLogger(__name__)
+
+HOURS_PER_YEAR = 24 * 365
+INSERT_BATCH_SIZE = 10_000
+
+
+def respondent_codes(count: int) -> List[str]:
+    """
+    ``count`` respondent codes: the known balancing authorities first, then
+    made-up ones.
+    """
+    known = sorted(RESPONDENTS)[:count]
+    return known + [f"SYN{index:03d}" for index in range(count - len(known))]
+
+
+def synthetic_rows(
+    respondents: Sequence[str], start: datetime, hours: int
+) -> Iterator[Dict]:
+    """
+    EnergyDataTable rows for every respondent and type, hour by hour, with
+    the same values the fake EIA API serves.
+    """
+    names = {respondent: respondent_info(respondent)[0] for respondent in respondents}
+    for offset in range(hours):
+        period = start + timedelta(hours=offset)
+        for respondent in respondents:
+            for energy_type in EnergyType:
+                yield dict(
+                    period=period,
+                    respondent=respondent,
+                    respondent_name=names[respondent],
+                    type=energy_type.name,
+                    type_name=energy_type.value,
+                    value=synthetic_value(respondent, energy_type.name, period),
+                    value_units="megawatthours",
+                )
+
+
+def populate(
+    engine: Engine,
+    respondents: Sequence[str],
+    start: datetime,
+    hours: int,
+    batch_size=INSERT_BATCH_SIZE,
+) -> int:
+    """
+    Write synthetic rows straight into energy_data, leaving hours that are
+    already stored alone. Returns the number of rows generated.
+    """
+    table = EnergyDataTable.__table__
+    stmt = sqlite_insert(table).on_conflict_do_nothing(
+        index_elements=["period", "respondent", "type"]
+    )
+    generated = 0
+    batch = []
+    with engine.begin() as connection:
+        for row in synthetic_rows(respondents, start, hours):
+            batch.append(row)
+            if len(batch) >= batch_size:
+                connection.execute(stmt, batch)
+                generated += len(batch)
+                batch = []
+        if batch:
+            connection.execute(stmt, batch)
+            generated += len(batch)
+    log.info(f"Generated {generated} rows for {len(respondents)} respondents")
+    return generated
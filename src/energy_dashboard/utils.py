@@ -1,12 +1,28 @@
+import os
+from datetime import datetime
 from pathlib import Path
+from typing import Tuple
 from urllib.parse import urlencode
 
 ROOT_DIR = Path(__file__).parent.parent.parent
 TEMPLATES_DIR = f"{Path(__file__).parent}/templates"
 
 
+def parse_date_range(start_date: str, end_date: str) -> Tuple[datetime, datetime]:
+    """
+    Parse the start and end dates of a data request, with or without a time.
+    """
+    try:
+        start = datetime.strptime(start_date, "%Y-%m-%d %H:%M:%S.%f")
+        end = datetime.strptime(end_date, "%Y-%m-%d %H:%M:%S.%f")
+    except ValueError:
+        start = datetime.strptime(start_date, "%Y-%m-%d")
+        end = datetime.strptime(end_date, "%Y-%m-%d")
+    return start, end
+
+
 class URLBuilder:
-    BASE_URL = "https://api.eia.gov/v2"
+    BASE_URL = os.getenv("EIA_BASE_URL", "https://api.eia.gov/v2")
     ROUTE = "/electricity/rto/region-data/data/"
 
     def __init__(self):
@@ -18,7 +34,8 @@ class URLBuilder:
         return self
 
     def build(self) -> str:
-        query_string = urlencode(self._params)
+        # List values, such as several facets, repeat the key
+        query_string = urlencode(self._params, doseq=True)
         return f"{self._url}?{query_string}"
 
     def add_api_key(self, key: str) -> "URLBuilder":
@@ -0,0 +1,166 @@
+import logging
+import os
+import zlib
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Dict, NamedTuple, Optional, Sequence, Tuple
+
+from fastapi import Request, Response
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from energy_dashboard.database import EnergyDataTable, async_engine
+from energy_dashboard.ingest import utc_hour
+from energy_dashboard.models import EnergyType
+
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+log = logging.getLogger(__name__)
+
+# Seconds shared caches may serve a closed range without asking again
+CACHE_MAX_AGE = int(os.getenv("CACHE_MAX_AGE", 24 * 3600))
+# A range is closed once its end is this far in the past, as EIA fills in
+# the most recent hours late
+CACHE_CLOSED_AFTER = timedelta(hours=int(os.getenv("CACHE_CLOSED_AFTER_HOURS", 48)))
+
+
+class Validators(NamedTuple):
+    """
+    The validators of one representation of a range, and whether the range
+    is closed so the response may be cached without revalidation.
+    """
+
+    etag: str
+    last_modified: datetime
+    closed: bool
+
+    @property
+    def headers(self) -> Dict[str, str]:
+        return {
+            "ETag": self.etag,
+            "Last-Modified": format_datetime(self.last_modified, usegmt=True),
+            "Cache-Control": (
+                f"public, max-age={CACHE_MAX_AGE}" if self.closed else "no-cache"
+            ),
+        }
+
+    def matches(self, request: Request) -> bool:
+        """
+        Whether the client's cached copy is current: If-None-Match when it is
+        sent, If-Modified-Since otherwise.
+        """
+        if_none_match = request.headers.get("if-none-match")
+        if if_none_match is not None:
+            tags = {_opaque(tag) for tag in if_none_match.split(",")}
+            return "*" in tags or _opaque(self.etag) in tags
+        if_modified_since = request.headers.get("if-modified-since")
+        if if_modified_since:
+            try:
+                since = parsedate_to_datetime(if_modified_since)
+            except (TypeError, ValueError):
+                return False
+            return (
+                since.tzinfo is not None
+                and self.last_modified.replace(microsecond=0) <= since
+            )
+        return False
+
+    def not_modified(self) -> Response:
+        return Response(status_code=304, headers=self.headers)
+
+
+def _opaque(tag: str) -> str:
+    """
+    An entity tag without its weak prefix, for weak comparison.
+    """
+    tag = tag.strip()
+    return tag[2:] if tag.startswith("W/") else tag
+
+
+def process_token(started: datetime) -> str:
+    """
+    A tag prefix unique to this process and start, as worker processes
+    count versions independently of each other.
+    """
+    return f"{int(started.timestamp()):x}.{os.getpid():x}"
+
+
+class DataVersions:
+    """
+    Versions of stored ranges, read from the database so that every process
+    agrees on them, whichever process stored the rows.
+
+    Stored rows are only ever added, never changed, so the number of rows
+    in a range and the highest row id among them change exactly when the
+    range does. Both are counted from the (respondent, type, period) index
+    without reading a row or running the query that serves the range.
+
+    A range's Last-Modified is the time this process first saw its current
+    version. That time is never earlier than the change itself, so a client
+    is never told a changed range is unmodified.
+    """
+
+    def __init__(self, engine: AsyncEngine = async_engine, remembered: int = 4096):
+        self.engine = engine
+        self.remembered = remembered
+        self._seen: OrderedDict[Tuple, Tuple[str, datetime]] = OrderedDict()
+
+    async def current(
+        self,
+        start: datetime,
+        end: datetime,
+        respondents: Optional[Sequence[str]] = None,
+        type_name: Optional[str] = None,
+    ) -> Tuple[str, datetime]:
+        """
+        The version of the range, for the given respondents and type or all
+        of them, and when this process first saw it.
+        """
+        table = EnergyDataTable.__table__
+        stmt = select(func.count(), func.max(table.c.id)).where(
+            table.c.period >= start, table.c.period <= end
+        )
+        if respondents:
+            stmt = stmt.where(table.c.respondent.in_(respondents))
+        if type_name:
+            stmt = stmt.where(table.c.type == EnergyType(type_name).name)
+        async with self.engine.connect() as connection:
+            rows, newest = (await connection.execute(stmt)).one()
+        version = f"{rows:x}.{newest or 0:x}"
+
+        key = (start, end, tuple(respondents or ()), type_name)
+        seen = self._seen.pop(key, None)
+        if seen is None or seen[0] != version:
+            seen = (version, datetime.now(timezone.utc))
+        self._seen[key] = seen
+        if len(self._seen) > self.remembered:
+            self._seen.popitem(last=False)
+        return seen
+
+    async def validators(
+        self,
+        request: Request,
+        start: datetime,
+        end: datetime,
+        respondents: Optional[Sequence[str]] = None,
+        type_name: Optional[str] = None,
+        variant: str = "",
+    ) -> Validators:
+        """
+        Validators for the response to ``request`` over a range. The tag
+        covers the path and query, plus ``variant`` for anything else the
+        representation depends on, such as a negotiated format.
+        """
+        version, modified = await self.current(start, end, respondents, type_name)
+        representation = f"{request.url.path}?{request.url.query}|{variant}"
+        digest = zlib.crc32(representation.encode("utf-8"))
+        return Validators(
+            etag=f'W/"{version}-{digest:08x}"',
+            last_modified=modified,
+            closed=end < utc_hour() - CACHE_CLOSED_AFTER,
+        )
+
+
+data_versions = DataVersions()
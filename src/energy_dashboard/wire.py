@@ -0,0 +1,192 @@
+import io
+import json
+import logging
+import zlib
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from energy_dashboard.models import WireFormat
+
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+log = logging.getLogger(__name__)
+
+# Columns sent on the data stream, in order
+WIRE_COLUMNS = (
+    "period",
+    "respondent",
+    "respondent_name",
+    "type",
+    "type_name",
+    "value",
+    "value_units",
+)
+
+EPOCH = datetime(1970, 1, 1)
+
+
+class UnsupportedWireFormat(Exception):
+    pass
+
+
+def epoch_seconds(periods: List[datetime]) -> List[int]:
+    """
+    Periods are stored as naive UTC hours; send them as integer epoch seconds.
+    """
+    return [int((period - EPOCH).total_seconds()) for period in periods]
+
+
+class NdjsonEncoder:
+    """
+    One JSON object of column arrays per line and batch.
+    """
+
+    def __init__(self):
+        try:
+            import orjson
+
+            self._dumps = orjson.dumps
+        except ImportError:
+            self._dumps = lambda obj: json.dumps(obj, separators=(",", ":")).encode(
+                "utf-8"
+            )
+
+    def header(self) -> bytes:
+        return b""
+
+    def encode(self, batch: Dict[str, List]) -> bytes:
+        batch = dict(batch, period=epoch_seconds(batch["period"]))
+        return self._dumps(batch) + b"\n"
+
+    def footer(self) -> bytes:
+        return b""
+
+
+class MsgpackEncoder:
+    """
+    A stream of MessagePack maps of column arrays, one per batch.
+    """
+
+    def __init__(self):
+        try:
+            import msgpack
+        except ImportError as exc:
+            raise UnsupportedWireFormat("msgpack is not installed") from exc
+        self._packer = msgpack.Packer()
+
+    def header(self) -> bytes:
+        return b""
+
+    def encode(self, batch: Dict[str, List]) -> bytes:
+        batch = dict(batch, period=epoch_seconds(batch["period"]))
+        return self._packer.pack(batch)
+
+    def footer(self) -> bytes:
+        return b""
+
+
+class ArrowEncoder:
+    """
+    An Arrow IPC stream with one record batch per batch.
+    """
+
+    def __init__(self):
+        try:
+            import pyarrow as pa
+        except ImportError as exc:
+            raise UnsupportedWireFormat("pyarrow is not installed") from exc
+        self._pa = pa
+        self._schema = pa.schema(
+            [
+                ("period", pa.timestamp("s")),
+                ("respondent", pa.string()),
+                ("respondent_name", pa.string()),
+                ("type", pa.string()),
+                ("type_name", pa.string()),
+                ("value", pa.float64()),
+                ("value_units", pa.string()),
+            ]
+        )
+        self._sink = io.BytesIO()
+        self._writer = None
+
+    def _drain(self) -> bytes:
+        data = self._sink.getvalue()
+        self._sink.seek(0)
+        self._sink.truncate()
+        return data
+
+    def header(self) -> bytes:
+        self._writer = self._pa.ipc.new_stream(self._sink, self._schema)
+        return self._drain()
+
+    def encode(self, batch: Dict[str, List]) -> bytes:
+        record_batch = self._pa.RecordBatch.from_pydict(batch, schema=self._schema)
+        self._writer.write_batch(record_batch)
+        return self._drain()
+
+    def footer(self) -> bytes:
+        self._writer.close()
+        return self._drain()
+
+
+FORMAT_ALIASES = {
+    "ndjson": WireFormat.NDJSON,
+    "msgpack": WireFormat.MSGPACK,
+    "arrow": WireFormat.ARROW,
+}
+
+ENCODERS = {
+    WireFormat.NDJSON: NdjsonEncoder,
+    WireFormat.MSGPACK: MsgpackEncoder,
+    WireFormat.ARROW: ArrowEncoder,
+}
+
+
+def negotiate(accept: Optional[str], alias: Optional[str] = None):
+    """
+    Pick the wire format from an explicit alias or the Accept header,
+    falling back to NDJSON. Returns the format and a fresh encoder for it.
+    """
+    requested = None
+    if alias:
+        if alias.lower() not in FORMAT_ALIASES:
+            raise UnsupportedWireFormat(f"Unknown format {alias!r}")
+        requested = FORMAT_ALIASES[alias.lower()]
+    elif accept:
+        for media_range in accept.split(","):
+            media_type = media_range.split(";")[0].strip().lower()
+            if media_type in {wire_format.value for wire_format in WireFormat}:
+                requested = WireFormat(media_type)
+                break
+    wire_format = requested or WireFormat.NDJSON
+    return wire_format, ENCODERS[wire_format]()
+
+
+class GzipStream:
+    """
+    Incremental gzip compression, flushed per batch so consumers can decode
+    every batch as soon as it arrives.
+    """
+
+    def __init__(self, level=6):
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.compress(data) + self._compressor.flush(
+            zlib.Z_SYNC_FLUSH
+        )
+
+    def close(self) -> bytes:
+        return self._compressor.flush(zlib.Z_FINISH)
+
+
+def accepts_gzip(accept_encoding: Optional[str]) -> bool:
+    if not accept_encoding:
+        return False
+    for coding in accept_encoding.split(","):
+        name, _, q = coding.strip().partition(";")
+        if name.strip().lower() == "gzip":
+            return q.strip().replace(" ", "") not in ("q=0", "q=0.0")
+    return False
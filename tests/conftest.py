@@ -0,0 +1,20 @@
+import atexit
+import os
+import shutil
+import tempfile
+
+# Settings are read when the energy_dashboard modules are imported, so point
+# every file the app writes at a throwaway directory before any test does
+WORKDIR = tempfile.mkdtemp(prefix="energy-dashboard-tests-")
+atexit.register(shutil.rmtree, WORKDIR, ignore_errors=True)
+
+os.environ.update(
+    DATABASE_PATH=os.path.join(WORKDIR, "energy.db"),
+    DATABASE_ECHO="false",
+    SLOW_QUERY_DB_PATH=os.path.join(WORKDIR, "slow_queries.db"),
+    CLUSTER_DB_PATH=os.path.join(WORKDIR, "cluster.db"),
+    CLUSTER_LOCK_PATH=os.path.join(WORKDIR, "ingest-leader.lock"),
+    CLUSTER_ENABLED="false",
+    LIVE_TAIL_ENABLED="false",
+    CHART_RENDER_EXECUTOR="thread",
+)
@@ -0,0 +1,61 @@
+import asyncio
+from typing import Callable, List, Optional
+
+
+class AsgiStream:
+    """
+    One streamed GET driven through an ASGI app, so a test can read frames as
+    they are sent and disconnect whenever it likes.
+    """
+
+    def __init__(
+        self,
+        app,
+        path: str,
+        query: bytes,
+        on_chunk: Optional[Callable[["AsgiStream"], None]] = None,
+    ):
+        self.app = app
+        self.scope = {
+            "type": "http",
+            "asgi": {"version": "3.0", "spec_version": "2.3"},
+            "http_version": "1.1",
+            "method": "GET",
+            "scheme": "http",
+            "path": path,
+            "raw_path": path.encode("utf-8"),
+            "root_path": "",
+            "query_string": query,
+            "headers": [(b"host", b"testserver")],
+            "client": ("127.0.0.1", 50000),
+            "server": ("testserver", 80),
+        }
+        self.on_chunk = on_chunk
+        self.chunks: List[bytes] = []
+        self.left = asyncio.Event()
+
+    async def receive(self):
+        await self.left.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(self, message):
+        if message["type"] == "http.response.body" and message.get("body"):
+            self.chunks.append(message["body"])
+            if self.on_chunk is not None:
+                self.on_chunk(self)
+
+    def leave(self):
+        self.left.set()
+
+    async def run(self):
+        await self.app(self.scope, self.receive, self.send)
+
+
+async def until(condition, timeout=5.0):
+    """
+    Wait for ``condition()`` to hold, failing the test after ``timeout``.
+    """
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not condition():
+        assert asyncio.get_running_loop().time() < deadline, "timed out"
+        await asyncio.sleep(0.01)
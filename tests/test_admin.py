@@ -0,0 +1,35 @@
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from energy_dashboard import admin
+
+
+@pytest.fixture
+def client():
+    app = FastAPI()
+    app.include_router(admin.router)
+    return TestClient(app)
+
+
+def test_admin_api_is_not_served_without_a_token(client, monkeypatch):
+    monkeypatch.setattr(admin, "ADMIN_TOKEN", None)
+
+    assert client.get("/api/v1/admin/slow-queries").status_code == 404
+    assert client.delete("/api/v1/admin/slow-queries").status_code == 404
+    assert client.post("/api/v1/admin/profile?path=/").status_code == 404
+    # Sending a token does not help while none is configured
+    headers = {"X-Admin-Token": ""}
+    assert client.get("/api/v1/admin/cluster", headers=headers).status_code == 404
+
+
+def test_admin_api_needs_the_configured_token(client, monkeypatch):
+    monkeypatch.setattr(admin, "ADMIN_TOKEN", "s3cret")
+
+    assert client.get("/api/v1/admin/admission").status_code == 403
+    wrong = {"X-Admin-Token": "guess"}
+    assert client.get("/api/v1/admin/admission", headers=wrong).status_code == 403
+    right = {"X-Admin-Token": "s3cret"}
+    response = client.get("/api/v1/admin/admission", headers=right)
+    assert response.status_code == 200
+    assert "lanes" in response.json()
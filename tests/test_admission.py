@@ -0,0 +1,51 @@
+import asyncio
+
+from fastapi import Request
+from helpers import AsgiStream, until
+
+from energy_dashboard.admission import (
+    PROMPT,
+    AdmissionMiddleware,
+    admission,
+    admission_release,
+)
+
+
+async def test_stream_holds_its_slot_until_it_hands_it_back():
+    query_done = asyncio.Event()
+
+    async def prompt_stream(scope, receive, send):
+        await send(
+            {
+                "type": "http.response.start",
+                "status": 200,
+                "headers": [(b"content-type", b"text/event-stream")],
+            }
+        )
+        await send(
+            {"type": "http.response.body", "body": b"data: 1\n\n", "more_body": True}
+        )
+        # Stands in for the query behind the chart
+        await query_done.wait()
+        admission_release(Request(scope))()
+        message = await receive()
+        assert message["type"] == "http.disconnect"
+        await send({"type": "http.response.body", "body": b""})
+
+    lane = admission.lanes[PROMPT]
+    stream = AsgiStream(
+        AdmissionMiddleware(prompt_stream), "/instruct-stream-chart", b"prompt=x"
+    )
+    task = asyncio.create_task(stream.run())
+
+    await until(lambda: stream.chunks)
+    # The first frame is out, but the query is still running
+    assert lane.active == 1
+    query_done.set()
+    # The viewer keeps watching, but the lane is free for the next prompt
+    await until(lambda: lane.active == 0)
+    assert admission.active == 0
+
+    stream.leave()
+    await asyncio.wait_for(task, 5)
+    assert lane.active == 0
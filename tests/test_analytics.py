@@ -0,0 +1,201 @@
+import math
+from datetime import datetime
+
+import pandas as pd
+import pytest
+from fastapi.testclient import TestClient
+
+from energy_dashboard import analytics
+from energy_dashboard.database import engine, init_db
+from energy_dashboard.synthetic import populate
+
+EMPTY = pd.DataFrame(
+    index=pd.DatetimeIndex([], name="period"),
+    columns=pd.Index(["CISO"], name="respondent"),
+    dtype="float64",
+)
+
+
+def hourly(start: str, **columns) -> pd.DataFrame:
+    frame = pd.DataFrame(
+        columns,
+        index=pd.date_range(start, periods=len(next(iter(columns.values()))), freq="h"),
+        dtype="float64",
+    )
+    frame.index.name = "period"
+    frame.columns.name = "respondent"
+    return frame
+
+
+# CISO: flat at 10 with a 40 MWh spike at 18:00, then flat at 20 all next day.
+# ERCO: no data the first day, then a ramp from 0 to 23.
+KNOWN = hourly(
+    "2023-01-01",
+    CISO=[40.0 if hour == 18 else 10.0 for hour in range(24)] + [20.0] * 24,
+    ERCO=[math.nan] * 24 + [float(hour) for hour in range(24)],
+)
+
+
+def test_ramp_rates_of_a_known_frame():
+    ramps = analytics.ramp_rates(KNOWN).set_index("respondent")
+
+    ciso = ramps.loc["CISO"]
+    assert ciso["max_ramp_up"] == 30.0
+    assert ciso["max_ramp_up_at"] == pd.Timestamp("2023-01-01 18:00")
+    assert ciso["max_ramp_down"] == -30.0
+    assert ciso["max_ramp_down_at"] == pd.Timestamp("2023-01-01 19:00")
+    # +30, -30 and +10 into the second day over 47 hour-over-hour changes
+    assert ciso["mean_abs_ramp"] == pytest.approx(70 / 47)
+    assert ramps.loc["ERCO", "max_ramp_up"] == 1.0
+    assert ramps.loc["ERCO", "mean_abs_ramp"] == 1.0
+
+
+def test_daily_load_factor_of_a_known_frame():
+    factors = analytics.daily_load_factor(KNOWN)
+
+    assert factors.to_dict("records") == [
+        {
+            "day": pd.Timestamp("2023-01-01"),
+            "respondent": "CISO",
+            "load_factor": pytest.approx((23 * 10 + 40) / 24 / 40),
+        },
+        {"day": pd.Timestamp("2023-01-02"), "respondent": "CISO", "load_factor": 1.0},
+        {
+            "day": pd.Timestamp("2023-01-02"),
+            "respondent": "ERCO",
+            "load_factor": pytest.approx(11.5 / 23),
+        },
+    ]
+
+
+def test_daily_peaks_of_a_known_frame():
+    peaks = analytics.daily_peaks(KNOWN)
+
+    # A day without data has no peak; a flat day peaks at its first hour
+    assert peaks.sort_values(["day", "respondent"]).to_dict("records") == [
+        {
+            "day": pd.Timestamp("2023-01-01"),
+            "respondent": "CISO",
+            "peak_at": pd.Timestamp("2023-01-01 18:00"),
+            "peak_value": 40.0,
+        },
+        {
+            "day": pd.Timestamp("2023-01-02"),
+            "respondent": "CISO",
+            "peak_at": pd.Timestamp("2023-01-02 00:00"),
+            "peak_value": 20.0,
+        },
+        {
+            "day": pd.Timestamp("2023-01-02"),
+            "respondent": "ERCO",
+            "peak_at": pd.Timestamp("2023-01-02 23:00"),
+            "peak_value": 23.0,
+        },
+    ]
+
+
+def test_anomaly_zscores_of_a_known_frame():
+    frame = hourly("2023-01-01", CISO=[10.0, 12.0] * 3 + [40.0])
+
+    flagged = analytics.anomalies(frame, window=6, threshold=3.0)
+
+    # The six hours before have a mean of 11 and a sample variance of 1.2
+    assert flagged.to_dict("records") == [
+        {
+            "period": pd.Timestamp("2023-01-01 06:00"),
+            "respondent": "CISO",
+            "value": 40.0,
+            "zscore": pytest.approx(29 / math.sqrt(1.2)),
+        }
+    ]
+    # The spike is about 26 standard deviations out
+    assert analytics.anomalies(frame, window=6, threshold=27.0).empty
+
+
+@pytest.mark.parametrize(
+    "summary, columns",
+    [
+        (
+            analytics.ramp_rates,
+            [
+                "respondent",
+                "max_ramp_up",
+                "max_ramp_up_at",
+                "max_ramp_down",
+                "max_ramp_down_at",
+                "mean_abs_ramp",
+            ],
+        ),
+        (analytics.daily_load_factor, ["day", "respondent", "load_factor"]),
+        (analytics.daily_peaks, ["day", "respondent", "peak_at", "peak_value"]),
+        (analytics.anomalies, ["period", "respondent", "value", "zscore"]),
+    ],
+)
+def test_summaries_of_an_empty_range(summary, columns):
+    result = summary(EMPTY)
+
+    assert result.empty
+    assert list(result.columns) == columns
+
+
+@pytest.mark.parametrize("route", ["ramps", "load-factor", "peaks", "anomalies"])
+def test_reversed_range_is_empty(route):
+    from energy_dashboard.app import app
+
+    init_db()
+    response = TestClient(app).get(
+        f"/api/v1/analytics/{route}",
+        params={
+            "start_date": "2023-01-02",
+            "end_date": "2023-01-01",
+            "respondent": "CISO",
+        },
+    )
+
+    assert response.status_code == 200
+    assert response.json() == []
+
+
+def test_peaks_revalidate_against_rows_stored_by_other_processes():
+    from energy_dashboard.app import app
+
+    init_db()
+    populate(engine, ["PJM"], datetime(2022, 3, 1), 24)
+    client = TestClient(app)
+    params = {"start_date": "2022-03-01", "end_date": "2022-03-03", "respondent": "PJM"}
+
+    first = client.get("/api/v1/analytics/peaks", params=params)
+    cached = {"If-None-Match": first.headers["etag"]}
+    unchanged = client.get("/api/v1/analytics/peaks", params=params, headers=cached)
+    # Stored by another process, such as fast_api's seed endpoint
+    populate(engine, ["PJM"], datetime(2022, 3, 2), 24)
+    changed = client.get("/api/v1/analytics/peaks", params=params, headers=cached)
+
+    assert len(first.json()) == 1
+    assert unchanged.status_code == 304
+    assert changed.status_code == 200
+    assert len(changed.json()) == 2
+
+
+def test_anomalies_revalidate_against_their_baseline_hours():
+    from energy_dashboard.app import app
+
+    init_db()
+    populate(engine, ["SWPP"], datetime(2022, 5, 3), 24)
+    client = TestClient(app)
+    params = {
+        "start_date": "2022-05-03",
+        "end_date": "2022-05-03",
+        "respondent": "SWPP",
+        "window": 48,
+    }
+
+    first = client.get("/api/v1/analytics/anomalies", params=params)
+    cached = {"If-None-Match": first.headers["etag"]}
+    # Before the range, but within the window its first hours are judged by
+    populate(engine, ["SWPP"], datetime(2022, 5, 1), 24)
+    changed = client.get("/api/v1/analytics/anomalies", params=params, headers=cached)
+
+    assert first.status_code == 200
+    assert changed.status_code == 200
+    assert changed.headers["etag"] != first.headers["etag"]
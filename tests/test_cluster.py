@@ -0,0 +1,18 @@
+from energy_dashboard.cluster_check import ClusterStack, parse_args, run_checks
+
+
+def test_workers_run_as_one_deployment():
+    # A fake EIA API, a fast_api process and two dashboard workers, each a
+    # uvicorn subprocess sharing one database in a temporary directory
+    args = parse_args(["--workers", "2", "--respondents", "2", "--days", "1"])
+    with ClusterStack(args) as stack:
+        checks = run_checks(stack, args.timeout)
+
+    assert [check.name for check in checks] == [
+        "single_leader",
+        "coherent",
+        "only_leader_ingests",
+        "failover",
+        "coherent_after_failover",
+    ]
+    assert {check.name: check.detail for check in checks if not check.ok} == {}
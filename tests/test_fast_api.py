@@ -0,0 +1,137 @@
+import re
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi.testclient import TestClient
+
+from energy_dashboard import services
+from energy_dashboard.database import AsyncSessionLocal, engine, init_db
+from energy_dashboard.hot_store import HotStore, hot_store
+from energy_dashboard.models import EnergyData, EnergyType, RetrieveEnergyDataRequest
+from energy_dashboard.services import EnergyDataService
+from energy_dashboard.synthetic import populate, synthetic_rows
+
+TABLE_QUERY = {
+    "respondent": "NYIS",
+    "type_name": "Demand",
+    "start_date": "2024-06-01",
+    "end_date": "2024-06-03",
+}
+HOUR = timedelta(hours=1)
+# Two runs of hours with 10:00 and 11:00 missing in between
+PAGED_RUNS = [(datetime(2024, 7, 1), 10), (datetime(2024, 7, 1, 12), 20)]
+PAGED_HOURS = [
+    start + hour * HOUR for start, hours in PAGED_RUNS for hour in range(hours)
+]
+
+
+def test_table_reads_hours_stored_by_other_processes(monkeypatch):
+    from energy_dashboard.fast_api import app
+
+    init_db()
+    populate(engine, ["NYIS"], datetime(2024, 6, 1), 24)
+    monkeypatch.setattr(hot_store, "loaded", False)
+    with TestClient(app) as client:
+        # Stored by the dashboard app, whose ingest listeners are not ours
+        populate(engine, ["NYIS"], datetime(2024, 6, 2), 24)
+        response = client.get("/energy_data", params=TABLE_QUERY)
+
+    assert response.status_code == 200
+    assert response.text.count("<td>2024-06-01 ") == 24
+    assert response.text.count("<td>2024-06-02 ") == 24
+
+
+def test_table_revalidates_against_hours_stored_by_other_processes(monkeypatch):
+    from energy_dashboard.fast_api import app
+
+    init_db()
+    query = {**TABLE_QUERY, "respondent": "ISNE"}
+    populate(engine, ["ISNE"], datetime(2024, 6, 1), 24)
+    monkeypatch.setattr(hot_store, "loaded", False)
+    with TestClient(app) as client:
+        first = client.get("/energy_data", params=query)
+        unchanged = client.get(
+            "/energy_data",
+            params=query,
+            headers={"If-None-Match": first.headers["etag"]},
+        )
+        # Stored by the dashboard app, whose ingests never reach this process
+        populate(engine, ["ISNE"], datetime(2024, 6, 2), 24)
+        changed = client.get(
+            "/energy_data",
+            params=query,
+            headers={"If-None-Match": first.headers["etag"]},
+        )
+
+    assert unchanged.status_code == 304
+    assert changed.status_code == 200
+    assert changed.headers["etag"] != first.headers["etag"]
+    assert changed.text.count("<td>2024-06-02 ") == 24
+
+
+@pytest.fixture(params=["db", "hot_store"])
+def paged_source(request, monkeypatch):
+    init_db()
+    for start, hours in PAGED_RUNS:
+        populate(engine, ["PAGE"], start, hours)
+    monkeypatch.setattr(hot_store, "loaded", False)
+    if request.param == "hot_store":
+        store = HotStore(hours=24 * 3)
+        store.loaded = True
+        rows = [
+            row
+            for start, hours in PAGED_RUNS
+            for row in synthetic_rows(["PAGE"], start, hours)
+        ]
+        store.add([EnergyData(id=index, **row) for index, row in enumerate(rows, 1)])
+        monkeypatch.setattr(services, "hot_store", store)
+    return request.param
+
+
+@pytest.mark.parametrize("limit", [1, 7, 10, 30])
+async def test_keyset_pages_are_contiguous(paged_source, limit):
+    params = RetrieveEnergyDataRequest(
+        respondent="PAGE",
+        type_name=EnergyType.D,
+        start_date="2024-07-01",
+        end_date="2024-07-03",
+    )
+    pages, after = [], None
+    async with AsyncSessionLocal() as async_db:
+        service = EnergyDataService(async_db, None, None)
+        while page := await service.list_page(params, after, limit):
+            pages.append([datetime.fromisoformat(row["period"]) for row in page])
+            after = pages[-1][-1]
+
+    # Every page but the last is full, and each starts right after the last
+    # row of the one before: together they hold every stored hour once, in
+    # order, across the hole
+    assert all(len(page) == limit for page in pages[:-1])
+    assert [period for page in pages for period in page] == PAGED_HOURS
+
+
+def test_table_pages_link_up(monkeypatch):
+    from energy_dashboard import fast_api
+
+    init_db()
+    populate(engine, ["PAGE"], datetime(2024, 8, 1), 48)
+    monkeypatch.setattr(hot_store, "loaded", False)
+    monkeypatch.setattr(fast_api, "TABLE_PAGE_SIZE", 20)
+    query = {
+        **TABLE_QUERY,
+        "respondent": "PAGE",
+        "start_date": "2024-08-01",
+        "end_date": "2024-08-03",
+    }
+    periods = []
+    with TestClient(fast_api.app) as client:
+        response = client.get("/energy_data", params=query)
+        while True:
+            assert response.status_code == 200
+            periods += re.findall(r"<td>(2024-08-\d\d \d\d:00:00)</td>", response.text)
+            next_url = re.search(r'hx-get="([^"]+)"', response.text)
+            if next_url is None:
+                break
+            response = client.get(next_url.group(1).replace("&amp;", "&"))
+
+    assert periods == [str(datetime(2024, 8, 1) + hour * HOUR) for hour in range(48)]
@@ -0,0 +1,115 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from energy_dashboard.database import AsyncSessionLocal, engine, init_db
+from energy_dashboard.gaps import FetchWindow, Gap, plan_windows, scan_gaps
+from energy_dashboard.synthetic import populate
+
+HOUR = timedelta(hours=1)
+DAY = datetime(2024, 6, 1)
+
+
+@pytest.fixture(scope="module", autouse=True)
+def stored_series():
+    init_db()
+    # GAPA is missing 10:00 to 14:00, GAPB only has 05:00 to 09:00
+    populate(engine, ["GAPA"], DAY, 10)
+    populate(engine, ["GAPA"], DAY + 15 * HOUR, 5)
+    populate(engine, ["GAPB"], DAY + 5 * HOUR, 5)
+
+
+async def scan(**kwargs):
+    async with AsyncSessionLocal() as async_db:
+        return await scan_gaps(async_db, **kwargs)
+
+
+async def test_interior_gaps_of_each_series():
+    gaps = await scan(respondents=["GAPA"])
+
+    assert gaps == [
+        Gap("GAPA", "D", DAY + 10 * HOUR, DAY + 14 * HOUR),
+        Gap("GAPA", "NG", DAY + 10 * HOUR, DAY + 14 * HOUR),
+    ]
+    assert gaps[0].hours == 5
+
+
+async def test_leading_and_trailing_gaps():
+    gaps = await scan(start=DAY, end=DAY + 23 * HOUR, respondents=["GAPB"], types=["D"])
+
+    assert gaps == [
+        Gap("GAPB", "D", DAY, DAY + 4 * HOUR),
+        Gap("GAPB", "D", DAY + 10 * HOUR, DAY + 23 * HOUR),
+    ]
+
+
+async def test_the_range_defaults_to_the_stored_hours():
+    gaps = await scan(respondents=["GAPA", "GAPB"], types=["NG"])
+
+    # GAPA spans 00:00 to 19:00, so GAPB is missing hours at both ends
+    assert gaps == [
+        Gap("GAPA", "NG", DAY + 10 * HOUR, DAY + 14 * HOUR),
+        Gap("GAPB", "NG", DAY, DAY + 4 * HOUR),
+        Gap("GAPB", "NG", DAY + 10 * HOUR, DAY + 19 * HOUR),
+    ]
+
+
+async def test_requested_series_without_rows_miss_the_whole_range():
+    end = DAY + 23 * HOUR
+
+    assert await scan(
+        start=DAY, end=end, respondents=["GAPB", "GAPZ"], types=["NG"]
+    ) == [
+        Gap("GAPB", "NG", DAY, DAY + 4 * HOUR),
+        Gap("GAPB", "NG", DAY + 10 * HOUR, end),
+        Gap("GAPZ", "NG", DAY, end),
+    ]
+    # Without types, every type is missing
+    assert await scan(start=DAY, end=end, respondents=["GAPZ"]) == [
+        Gap("GAPZ", "D", DAY, end),
+        Gap("GAPZ", "NG", DAY, end),
+    ]
+    # Nothing stored and no range given: there is no range to be missing
+    assert await scan(respondents=["GAPZ"]) == []
+
+
+def test_nearby_gaps_of_a_series_share_a_window():
+    gaps = [
+        Gap("GAPA", "D", DAY, DAY + 2 * HOUR),
+        Gap("GAPA", "D", DAY + 20 * HOUR, DAY + 22 * HOUR),
+    ]
+
+    assert plan_windows(gaps, merge_hours=24) == [
+        FetchWindow(DAY, DAY + 22 * HOUR, ("GAPA",), ("D",))
+    ]
+    # Too far apart to merge as one series, yet one page covers both
+    assert plan_windows(gaps, merge_hours=12) == [
+        FetchWindow(DAY, DAY + 22 * HOUR, ("GAPA",), ("D",))
+    ]
+
+
+def test_gaps_of_different_series_share_a_window():
+    gaps = [
+        Gap("GAPB", "NG", DAY, DAY + 5 * HOUR),
+        Gap("GAPA", "D", DAY + 2 * HOUR, DAY + 9 * HOUR),
+    ]
+
+    (window,) = plan_windows(gaps)
+
+    assert window == FetchWindow(DAY, DAY + 9 * HOUR, ("GAPA", "GAPB"), ("D", "NG"))
+    # Every combination of the facets is fetched
+    assert window.rows == 10 * 2 * 2
+
+
+def test_distant_gaps_are_fetched_separately():
+    long_gap = Gap("GAPA", "D", DAY, DAY + 3999 * HOUR)
+    late_gap = Gap("GAPA", "D", DAY + 3 * 365 * 24 * HOUR, DAY + 3 * 365 * 24 * HOUR)
+
+    windows = plan_windows([late_gap, long_gap])
+
+    # One window spanning both would need far more pages than two
+    assert windows == [
+        FetchWindow(long_gap.start, long_gap.end, ("GAPA",), ("D",)),
+        FetchWindow(late_gap.start, late_gap.end, ("GAPA",), ("D",)),
+    ]
+    assert [window.pages for window in windows] == [1, 1]
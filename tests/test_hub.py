@@ -0,0 +1,98 @@
+import asyncio
+
+from energy_dashboard.hub import BroadcastHub, ChartBroadcast, stream_key
+from energy_dashboard.models import (
+    ChartMode,
+    EnergyType,
+    PacingPolicy,
+    RetrieveEnergyDataRequest,
+)
+
+POLICY = PacingPolicy()
+
+
+def request(respondent: str) -> RetrieveEnergyDataRequest:
+    return RetrieveEnergyDataRequest(
+        respondent=respondent,
+        type_name=EnergyType.D,
+        start_date="2023-01-01",
+        end_date="2023-01-02",
+    )
+
+
+class FakeEncoder:
+    def __init__(self):
+        self.batches = []
+
+    async def start(self):
+        return b"chart"
+
+    async def encode(self, batch):
+        self.batches.append(batch)
+        return b"points"
+
+    def snapshot(self):
+        return [b"chart"]
+
+    @staticmethod
+    def terminate():
+        return b"end"
+
+
+def test_key_params_are_normalized():
+    key = stream_key(request(" miso "), ChartMode.STREAM, POLICY)
+
+    assert key == stream_key(request("MISO"), ChartMode.STREAM, POLICY)
+    assert key.params() == request("MISO")
+
+
+async def test_cancelled_broadcast_is_replaced():
+    hub = BroadcastHub()
+    key = stream_key(request("MISO"), ChartMode.STREAM, POLICY)
+    release = asyncio.Event()
+    started = []
+
+    async def batches():
+        await release.wait()
+        yield [1]
+
+    def factory():
+        broadcast = ChartBroadcast(key, FakeEncoder(), batches)
+        started.append(broadcast)
+        return broadcast
+
+    async with hub.subscribe(key, factory):
+        await asyncio.sleep(0)
+    # The last subscriber left, and the producer has yet to unwind
+    assert started[0].task.cancelling() and not started[0].task.done()
+
+    async with hub.subscribe(key, factory) as subscriber:
+        assert len(started) == 2
+        release.set()
+        frames = [frame async for frame in subscriber.frames()]
+
+    assert frames == [b"chart", b"points", b"end"]
+
+
+async def test_subscribers_hear_once_the_rows_are_read():
+    hub = BroadcastHub()
+    key = stream_key(request("MISO"), ChartMode.STREAM, POLICY)
+    history_read = asyncio.Event()
+    released = []
+
+    async def batches():
+        yield [1]
+        broadcast.rows_read()
+        history_read.set()
+        # A live stream stays open after its history
+        await asyncio.Event().wait()
+
+    broadcast = ChartBroadcast(key, FakeEncoder(), batches)
+    async with hub.subscribe(key, lambda: broadcast) as first:
+        first.broadcast.when_rows_read(lambda: released.append("first"))
+        assert released == []
+        await history_read.wait()
+        assert released == ["first"]
+        async with hub.subscribe(key, lambda: broadcast) as late:
+            late.broadcast.when_rows_read(lambda: released.append("late"))
+            assert released == ["first", "late"]
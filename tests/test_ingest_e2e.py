@@ -0,0 +1,127 @@
+import asyncio
+import json
+from datetime import datetime, timedelta, timezone
+
+import httpx
+import pytest
+from helpers import AsgiStream, until
+from sqlalchemy import func, select
+
+from energy_dashboard.database import EnergyDataTable, SessionLocal, engine, init_db
+from energy_dashboard.fakes import fake_eia, offline_app
+from energy_dashboard.ingest import EIA_PAGE_LENGTH, LiveTailPoller
+from energy_dashboard.synthetic import populate
+from energy_dashboard.utils import URLBuilder
+
+# End-to-end runs of ingest against the fake EIA API, served in process
+FAKE_URL = "http://fakes"
+
+
+def fake_client() -> httpx.AsyncClient:
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=offline_app))
+
+
+def stored_rows(respondents, start: datetime, end: datetime) -> int:
+    with SessionLocal() as db:
+        return db.scalar(
+            select(func.count()).where(
+                EnergyDataTable.respondent.in_(respondents),
+                EnergyDataTable.period >= start,
+                EnergyDataTable.period <= end,
+            )
+        )
+
+
+def delta_hours(chunks) -> list:
+    hours = []
+    for chunk in chunks:
+        for event in chunk.decode("utf-8").split("\n\n"):
+            if event.startswith("event: chart-delta"):
+                payload = json.loads(event.split("data: ", 1)[1])
+                hours.extend(payload["hours"])
+    return [
+        datetime.fromtimestamp(hour / 1000, timezone.utc).replace(tzinfo=None)
+        for hour in hours
+    ]
+
+
+@pytest.fixture(autouse=True)
+def fake_eia_api(monkeypatch):
+    init_db()
+    monkeypatch.setattr(URLBuilder, "BASE_URL", f"{FAKE_URL}/eia/v2")
+    return fake_eia
+
+
+async def test_seed_pages_past_the_eia_page_cap():
+    from energy_dashboard.app import app, get_energy_service
+    from energy_dashboard.database import AsyncSessionLocal
+    from energy_dashboard.services import EnergyDataService
+
+    respondents = ["ERCO", "ISNE", "NYIS", "PJM", "SWPP"]
+    start = datetime(2023, 3, 1)
+    end = start + timedelta(days=24) - timedelta(hours=1)
+    expected = len(respondents) * 2 * 24 * 24
+    assert expected > EIA_PAGE_LENGTH
+
+    async def energy_service():
+        async with AsyncSessionLocal() as async_db, fake_client() as client:
+            yield EnergyDataService(async_db, None, client)
+
+    app.dependency_overrides[get_energy_service] = energy_service
+    try:
+        async with httpx.AsyncClient(
+            transport=httpx.ASGITransport(app=app), base_url="http://testserver"
+        ) as client:
+            response = await client.post(
+                "/api/v1/seed-data/",
+                json={
+                    "params": {
+                        "frequency": "hourly",
+                        "data[0]": "value",
+                        "facets[respondent][]": respondents,
+                        "start": start.strftime("%Y-%m-%dT%H"),
+                        "end": end.strftime("%Y-%m-%dT%H"),
+                        "offset": 0,
+                        # More than the API serves per page
+                        "length": 2 * EIA_PAGE_LENGTH,
+                    }
+                },
+            )
+    finally:
+        app.dependency_overrides.clear()
+
+    assert response.status_code == 200
+    assert stored_rows(respondents, start, end) == expected
+
+
+async def test_live_tail_reaches_an_open_chart_within_its_range(monkeypatch):
+    from energy_dashboard.app import app
+
+    populate(engine, ["CISO"], datetime(2023, 1, 1), 48)
+    # The fake's clock stands two days after the stored history
+    monkeypatch.setattr(fake_eia, "latest_hour", lambda: datetime(2023, 1, 4, 23))
+    end = datetime(2023, 1, 4)
+
+    query = (
+        b"respondent=CISO&type_name=Demand&start_date=2023-01-01"
+        b"&end_date=2023-01-04&pace=asap&live=true"
+    )
+    stream = AsgiStream(app, "/stream-chart", query)
+    streaming = asyncio.create_task(stream.run())
+    try:
+        await until(lambda: len(delta_hours(stream.chunks)) == 48)
+
+        poller = LiveTailPoller(respondents=["CISO"], client_factory=fake_client)
+        assert await poller.poll_once() == 2 * 48
+
+        # Every new hour up to the chart's end, and none after it
+        await until(lambda: len(delta_hours(stream.chunks)) == 48 + 25)
+        await asyncio.sleep(0.2)
+        hours = delta_hours(stream.chunks)
+        assert hours == [
+            datetime(2023, 1, 1) + timedelta(hours=offset) for offset in range(73)
+        ]
+        assert max(hours) == end
+    finally:
+        stream.leave()
+        await asyncio.wait_for(streaming, 10)
@@ -0,0 +1,159 @@
+import asyncio
+import contextlib
+from datetime import datetime, timedelta
+
+import pytest
+
+from energy_dashboard.models import EnergyData, PacingMode, PacingPolicy
+from energy_dashboard.pacing import paced_batches
+
+HOUR = timedelta(hours=1)
+FIRST = datetime(2023, 1, 1)
+
+
+def point(hour: int) -> EnergyData:
+    return EnergyData(
+        id=hour + 1,
+        period=FIRST + hour * HOUR,
+        respondent="MISO",
+        respondent_name="Midcontinent Independent System Operator, Inc.",
+        type="D",
+        type_name="Demand",
+        value=float(hour),
+        value_units="megawatthours",
+    )
+
+
+class Source:
+    """
+    Points read one at a time, as from a database cursor, counting reads.
+    """
+
+    def __init__(self, hours, delay=0.0):
+        self.hours = hours
+        self.delay = delay
+        self.read = 0
+
+    async def __aiter__(self):
+        for hour in self.hours:
+            await asyncio.sleep(self.delay)
+            self.read += 1
+            yield point(hour)
+
+
+async def frames_of(source, policy, **kwargs):
+    """
+    The frames of ``source`` with the loop time each one arrived at.
+    """
+    loop = asyncio.get_running_loop()
+    frames = []
+    async for frame in paced_batches(aiter(source), policy, **kwargs):
+        frames.append((loop.time(), [p.value for p in frame]))
+    return frames
+
+
+async def test_asap_frames_keep_every_point_in_order():
+    frames = await frames_of(Source(range(50)), PacingPolicy(mode=PacingMode.ASAP))
+
+    assert all(values for _, values in frames)
+    assert [value for _, values in frames for value in values] == list(
+        map(float, range(50))
+    )
+
+
+async def test_frame_rate_spaces_frames_and_batches_what_is_due():
+    policy = PacingPolicy(mode=PacingMode.FRAME_RATE, frame_rate=20)
+
+    frames = await frames_of(Source(range(20), delay=0.01), policy)
+
+    gaps = [later - earlier for (earlier, _), (later, _) in zip(frames, frames[1:])]
+    assert min(gaps) >= 0.045
+    # Points arriving between frames share the next one
+    assert len(frames) < 20
+    assert [value for _, values in frames for value in values] == list(
+        map(float, range(20))
+    )
+
+
+async def test_a_slow_client_gets_fewer_larger_frames():
+    policy = PacingPolicy(mode=PacingMode.ASAP)
+    source = Source(range(40), delay=0.001)
+    frames = []
+
+    async with contextlib.aclosing(paced_batches(aiter(source), policy)) as batches:
+        async for frame in batches:
+            frames.append(len(frame))
+            # Read ahead while the client is busy
+            await asyncio.sleep(0.3)
+
+    assert sum(frames) == 40
+    assert len(frames) == 2
+
+
+async def test_replay_sends_each_hour_when_it_is_due():
+    # An hour of data every 50ms
+    policy = PacingPolicy(mode=PacingMode.REPLAY, speedup=3600 * 20)
+
+    frames = await frames_of(Source([0, 1, 1, 2, 4]), policy)
+
+    # Points of the same hour go out together, each hour on its own schedule
+    assert [values for _, values in frames] == [[0.0], [1.0, 1.0], [2.0], [4.0]]
+    started = frames[0][0]
+    offsets = [arrived - started for arrived, _ in frames]
+    # Never early; the hour missing at 3 is waited out rather than skipped
+    assert all(
+        offset >= hours * 0.05 - 0.005 for offset, hours in zip(offsets, [0, 1, 2, 4])
+    )
+
+
+async def test_read_ahead_stops_at_max_pending():
+    source = Source(range(100))
+    batches = paced_batches(aiter(source), PacingPolicy(mode=PacingMode.ASAP), 10)
+
+    first = await anext(batches)
+    await asyncio.sleep(0.05)
+    read = source.read
+    await batches.aclose()
+
+    assert read <= len(first) + 10 + 1
+    assert read < 100
+
+
+async def test_on_drained_runs_once_the_source_is_read():
+    drained = []
+    source = Source(range(5))
+    batches = paced_batches(
+        aiter(source),
+        PacingPolicy(mode=PacingMode.FRAME_RATE, frame_rate=1),
+        on_drained=lambda: drained.append(source.read),
+    )
+
+    await anext(batches)
+    await asyncio.sleep(0.05)
+    # Every point has been read, though a second frame is not yet due
+    assert drained == [5]
+    await batches.aclose()
+    assert drained == [5]
+
+
+async def test_on_drained_runs_when_the_client_leaves_early():
+    drained = []
+    batches = paced_batches(
+        aiter(Source(range(100), delay=0.01)),
+        PacingPolicy(mode=PacingMode.ASAP),
+        on_drained=lambda: drained.append(True),
+    )
+
+    await anext(batches)
+    await batches.aclose()
+
+    assert drained == [True]
+
+
+async def test_source_errors_reach_the_client():
+    async def failing():
+        yield point(0)
+        raise RuntimeError("cursor lost")
+
+    with pytest.raises(RuntimeError, match="cursor lost"):
+        await frames_of(failing(), PacingPolicy(mode=PacingMode.ASAP))
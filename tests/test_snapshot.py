@@ -0,0 +1,86 @@
+import json
+from datetime import datetime, timedelta
+
+from fastapi.testclient import TestClient
+
+from energy_dashboard.database import engine, init_db
+from energy_dashboard.models import EnergyData
+from energy_dashboard.snapshot import SPARKLINE_HOURS, Snapshot
+from energy_dashboard.synthetic import populate
+
+HOUR = timedelta(hours=1)
+
+
+def point(period: datetime, value: float) -> EnergyData:
+    return EnergyData(
+        id=0,
+        period=period,
+        respondent="AZPS",
+        respondent_name="Arizona Public Service Company",
+        type="D",
+        type_name="Demand",
+        value=value,
+        value_units="megawatthours",
+    )
+
+
+def series_entry(body: bytes, respondent: str, type_name="Demand") -> dict:
+    return next(
+        series
+        for series in json.loads(body)["series"]
+        if (series["respondent"], series["type_name"]) == (respondent, type_name)
+    )
+
+
+async def test_ingest_moves_the_window_of_a_loaded_series():
+    first = datetime(2025, 5, 1)
+    loaded = Snapshot()
+    loaded.loaded = True
+    loaded.add([point(first + hour * HOUR, 100.0 + hour) for hour in range(25)])
+    version = loaded.version
+
+    newest = first + 26 * HOUR
+    loaded.add([point(newest, 200.0)])
+    entry = series_entry(loaded.body(), "AZPS")
+
+    assert loaded.version == version + 1
+    assert entry["period"] == newest.isoformat()
+    assert entry["value"] == 200.0
+    # 24 hours before the newest hour, which has been stored
+    assert entry["previous_day_value"] == 102.0
+    assert entry["change"] == 98.0
+    assert len(entry["sparkline"]) == SPARKLINE_HOURS
+    # The skipped hour shows as a hole
+    assert entry["sparkline"][-2:] == [None, 200.0]
+
+
+async def test_late_hours_fill_in_without_moving_the_window():
+    newest = datetime(2025, 5, 2)
+    loaded = Snapshot()
+    loaded.loaded = True
+    loaded.add([point(newest, 300.0)])
+    loaded.add([point(newest - 3 * HOUR, 150.0), point(newest - 30 * HOUR, 1.0)])
+    entry = series_entry(loaded.body(), "AZPS")
+
+    assert entry["period"] == newest.isoformat()
+    assert entry["sparkline"][-4:] == [150.0, None, None, 300.0]
+    assert entry["previous_day_value"] is None
+
+
+def test_snapshot_includes_rows_stored_by_other_processes():
+    from energy_dashboard.app import app
+
+    init_db()
+    populate(engine, ["BPAT"], datetime(2025, 3, 1), 24)
+    with TestClient(app) as client:
+        first = client.get("/api/v1/snapshot")
+        cached = {"If-None-Match": first.headers["etag"]}
+        unchanged = client.get("/api/v1/snapshot", headers=cached)
+        # Stored by another process, whose ingests this one never sees
+        populate(engine, ["BPAT"], datetime(2025, 3, 2), 24)
+        changed = client.get("/api/v1/snapshot", headers=cached)
+
+    assert series_entry(first.content, "BPAT")["period"] == "2025-03-01T23:00:00"
+    assert unchanged.status_code == 304
+    assert changed.status_code == 200
+    assert series_entry(changed.content, "BPAT")["period"] == "2025-03-02T23:00:00"
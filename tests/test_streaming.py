@@ -0,0 +1,317 @@
+import asyncio
+import json
+from datetime import datetime, timedelta
+
+import pytest
+from helpers import AsgiStream, until
+
+from energy_dashboard import streaming
+from energy_dashboard.admission import PROMPT, admission
+from energy_dashboard.database import async_engine, engine, init_db
+from energy_dashboard.hot_store import hot_store
+from energy_dashboard.hub import hub
+from energy_dashboard.ingest import live_feed
+from energy_dashboard.metrics import SSE_STREAMS_ACTIVE, SSE_STREAMS_TOTAL
+from energy_dashboard.models import (
+    ChartMode,
+    EnergyData,
+    EnergyType,
+    PacingMode,
+    PacingPolicy,
+    RetrieveEnergyDataRequest,
+    SqlSelectQuery,
+)
+from energy_dashboard.rendering import RenderBusy, renderer
+from energy_dashboard.services import EnergyDataService
+from energy_dashboard.synthetic import populate
+
+CHART_QUERY = (
+    b"respondent=MISO&type_name=Demand&start_date=2023-01-01"
+    b"&end_date=2023-01-11&pace=fps&frame_rate=20&live=true"
+)
+HOUR = timedelta(hours=1)
+PROMPT_QUERY = SqlSelectQuery(
+    select_stmt=(
+        "SELECT * FROM energy_data WHERE respondent = 'MISO' "
+        "AND type = 'D' ORDER BY period LIMIT 48"
+    ),
+    explain_stmt="",
+    start_date="2023-01-01",
+    end_date="2023-01-02",
+)
+
+
+def point(period: datetime, value: float) -> EnergyData:
+    return EnergyData(
+        id=0,
+        period=period,
+        respondent="MISO",
+        respondent_name="Midcontinent Independent System Operator, Inc.",
+        type="D",
+        type_name="Demand",
+        value=value,
+        value_units="megawatthours",
+    )
+
+
+def event_data(frame: bytes, topic: str) -> str:
+    # One event line and one data line, or the browser splits the payload
+    event, data = frame.decode("utf-8").strip().split("\n")
+    assert event == f"event: {topic}"
+    return data.removeprefix("data: ")
+
+
+def delta_payload(frame: bytes) -> dict:
+    return json.loads(event_data(frame, streaming.DELTA_TOPIC))
+
+
+@pytest.fixture
+def renders(monkeypatch):
+    """
+    Stand in for Bokeh, recording the chart states of full renders.
+    """
+    calls = {"streaming": 0, "full": []}
+
+    async def render_streaming_chart(params, title="Chart Title"):
+        calls["streaming"] += 1
+        return "<div>empty chart</div>", "<script>\n</script>"
+
+    async def render_chart(chart_state, params, title="Chart Title"):
+        calls["full"].append(list(chart_state["y_state"]))
+        return f"<div>{len(chart_state['y_state'])} points</div>", "<script></script>"
+
+    monkeypatch.setattr(renderer, "render_streaming_chart", render_streaming_chart)
+    monkeypatch.setattr(renderer, "render_chart", render_chart)
+    return calls
+
+
+class FakeRequest:
+    def __init__(self):
+        self.disconnected = False
+
+    async def is_disconnected(self) -> bool:
+        return self.disconnected
+
+
+@pytest.fixture(autouse=True)
+def fast_disconnect_checks(monkeypatch):
+    monkeypatch.setattr(streaming, "DISCONNECT_POLL_INTERVAL", 0.01)
+
+
+@pytest.fixture(scope="module")
+def stored_history():
+    init_db()
+    populate(engine, ["MISO"], datetime(2023, 1, 1), 24 * 14)
+
+
+async def test_guard_stream_closes_frames_when_client_leaves():
+    request = FakeRequest()
+    closed = asyncio.Event()
+
+    async def frames():
+        try:
+            while True:
+                yield b"frame"
+                await asyncio.sleep(0.05)
+        finally:
+            closed.set()
+
+    abandoned = SSE_STREAMS_TOTAL.value(endpoint="test", outcome="abandoned")
+    guarded = streaming.guard_stream(request, frames(), "test")
+    assert await anext(guarded) == b"frame"
+    assert SSE_STREAMS_ACTIVE.value(endpoint="test") == 1
+
+    request.disconnected = True
+    with pytest.raises(StopAsyncIteration):
+        await anext(guarded)
+
+    assert closed.is_set()
+    assert SSE_STREAMS_ACTIVE.value(endpoint="test") == 0
+    assert (
+        SSE_STREAMS_TOTAL.value(endpoint="test", outcome="abandoned") == abandoned + 1
+    )
+
+
+async def test_disconnect_mid_stream_releases_resources(stored_history):
+    from energy_dashboard.app import app
+
+    held = {}
+
+    def on_chunk(stream: AsgiStream):
+        # Leave after the chart and a couple of deltas, mid-history
+        if len(stream.chunks) == 3:
+            held.update(
+                broadcasts=len(hub),
+                connections=async_engine.pool.checkedout(),
+                live_feeds=len(live_feed._queues),
+            )
+            stream.leave()
+
+    stream = AsgiStream(app, "/stream-chart", CHART_QUERY, on_chunk)
+    abandoned = SSE_STREAMS_TOTAL.value(endpoint="stream-chart", outcome="abandoned")
+    await asyncio.wait_for(stream.run(), 30)
+
+    assert held == {"broadcasts": 1, "connections": 1, "live_feeds": 1}
+    # The producer, its database session and its live feed subscription
+    await until(lambda: len(hub) == 0)
+    await until(lambda: async_engine.pool.checkedout() == 0)
+    assert not live_feed._queues
+    assert b"event: Terminate" not in b"".join(stream.chunks)
+    assert renderer.in_flight == 0
+    assert admission.active == 0
+    assert SSE_STREAMS_ACTIVE.value(endpoint="stream-chart") == 0
+    assert (
+        SSE_STREAMS_TOTAL.value(endpoint="stream-chart", outcome="abandoned")
+        == abandoned + 1
+    )
+
+
+async def test_chart_reads_hours_stored_by_other_processes(monkeypatch):
+    from energy_dashboard.app import app, stored_batches
+
+    init_db()
+    # Newer than anything else the suite stores, so a hot store loaded now
+    # would end at this day
+    populate(engine, ["TVA"], datetime(2030, 1, 1), 24)
+    monkeypatch.setattr(hot_store, "loaded", False)
+    params = RetrieveEnergyDataRequest(
+        respondent="TVA",
+        type_name=EnergyType.D,
+        start_date="2030-01-01",
+        end_date="2030-01-03",
+    )
+    async with app.router.lifespan_context(app):
+        # Stored by another process, whose ingests this one never sees
+        populate(engine, ["TVA"], datetime(2030, 1, 2), 24)
+        batches = stored_batches(params, PacingPolicy(mode=PacingMode.ASAP))
+        points = [point async for batch in batches for point in batch]
+
+    assert len(points) == 48
+
+
+async def test_prompt_stream_terminates_when_renders_are_refused(
+    monkeypatch, stored_history
+):
+    from energy_dashboard.app import app
+
+    async def generate_query(self, prompt: str) -> SqlSelectQuery:
+        return PROMPT_QUERY
+
+    async def refuse(*args, **kwargs):
+        raise RenderBusy("No chart render slot within 0s")
+
+    # The completion call needs a model; the query it would return is fixed
+    monkeypatch.setattr(EnergyDataService, "generate_query", generate_query)
+    monkeypatch.setattr(renderer, "render_streaming_chart", refuse)
+    endpoint = "instruct-stream-chart"
+    completed = SSE_STREAMS_TOTAL.value(endpoint=endpoint, outcome="completed")
+
+    stream = AsgiStream(app, "/instruct-stream-chart", b"prompt=MISO+demand")
+    await asyncio.wait_for(stream.run(), 10)
+
+    # A Terminate frame stops the browser's EventSource from reconnecting
+    assert stream.chunks
+    assert b"event: Terminate" in b"".join(stream.chunks)
+    assert SSE_STREAMS_TOTAL.value(endpoint=endpoint, outcome="completed") == (
+        completed + 1
+    )
+
+
+async def test_prompt_stream_holds_its_slot_while_the_query_runs(
+    monkeypatch, stored_history
+):
+    from energy_dashboard.app import app
+
+    lane = admission.lanes[PROMPT]
+    stream_query = EnergyDataService.stream_query
+    query_started = asyncio.Event()
+    finish_query = asyncio.Event()
+    held = {}
+
+    async def generate_query(self, prompt: str) -> SqlSelectQuery:
+        return PROMPT_QUERY
+
+    async def slow_query(self, query: SqlSelectQuery, row_count=10):
+        query_started.set()
+        await finish_query.wait()
+        async for point in stream_query(self, query, row_count):
+            yield point
+
+    def on_chunk(stream: AsgiStream):
+        if b"event: Terminate" in stream.chunks[-1]:
+            held["terminate"] = lane.active
+
+    monkeypatch.setattr(EnergyDataService, "generate_query", generate_query)
+    monkeypatch.setattr(EnergyDataService, "stream_query", slow_query)
+    stream = AsgiStream(app, "/instruct-stream-chart", b"prompt=MISO+demand", on_chunk)
+    task = asyncio.create_task(stream.run())
+
+    await asyncio.wait_for(query_started.wait(), 10)
+    # The empty chart is already out, but the query still holds the slot
+    assert stream.chunks
+    assert lane.active == 1
+    finish_query.set()
+    await asyncio.wait_for(task, 10)
+
+    # Released once the rows were read, before the stream ended
+    assert held == {"terminate": 0}
+    assert lane.active == 0
+
+
+def test_chart_delta_sends_periods_as_epoch_milliseconds():
+    first = datetime(2023, 1, 1)
+    delta = streaming.chart_delta([point(first, 10.5), point(first + HOUR, 11.0)])
+
+    # Naive periods are UTC hours
+    assert delta == {
+        "hours": [1672531200000.0, 1672531200000.0 + 3600 * 1000],
+        "values": [10.5, 11.0],
+    }
+    assert streaming.chart_delta([]) == {"hours": [], "values": []}
+
+
+async def test_stream_mode_renders_once_then_sends_deltas(renders):
+    first = datetime(2023, 1, 1)
+    encoder = streaming.ChartEncoder(None, "MISO", ChartMode.STREAM)
+
+    chart = await encoder.start()
+    frames = [
+        await encoder.encode([point(first, 1.0), point(first + HOUR, 2.0)]),
+        await encoder.encode([point(first + 2 * HOUR, 3.0)]),
+    ]
+
+    assert 'id="linechart"' in event_data(chart, streaming.CHART_TOPIC)
+    assert renders == {"streaming": 1, "full": []}
+    # Each delta holds only its own batch
+    assert [delta_payload(frame)["values"] for frame in frames] == [[1.0, 2.0], [3.0]]
+    # Without history a late subscriber only gets the empty chart
+    assert encoder.snapshot() == [chart]
+
+
+async def test_stream_mode_snapshot_replays_the_history(renders):
+    first = datetime(2023, 1, 1)
+    encoder = streaming.ChartEncoder(None, "MISO", ChartMode.STREAM, keep_history=True)
+
+    chart = await encoder.start()
+    await encoder.encode([point(first, 1.0)])
+    await encoder.encode([point(first + HOUR, 2.0), point(first + 2 * HOUR, 3.0)])
+    snapshot = encoder.snapshot()
+
+    assert snapshot[0] == chart
+    assert delta_payload(snapshot[1]) == streaming.chart_delta(
+        [point(first + hour * HOUR, 1.0 + hour) for hour in range(3)]
+    )
+
+
+async def test_full_mode_rerenders_every_point_so_far(renders):
+    first = datetime(2023, 1, 1)
+    encoder = streaming.ChartEncoder(None, "MISO", ChartMode.FULL)
+
+    assert await encoder.start() is None
+    await encoder.encode([point(first, 1.0)])
+    frame = await encoder.encode([point(first + HOUR, 2.0)])
+
+    assert renders == {"streaming": 0, "full": [[1.0], [1.0, 2.0]]}
+    assert "2 points" in event_data(frame, streaming.CHART_TOPIC)
+    # The latest figure already shows everything
+    assert encoder.snapshot() == [frame]
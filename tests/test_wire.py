@@ -0,0 +1,148 @@
+import io
+import json
+import zlib
+from datetime import datetime
+
+import pytest
+
+from energy_dashboard.models import WireFormat
+from energy_dashboard.wire import (
+    ArrowEncoder,
+    GzipStream,
+    MsgpackEncoder,
+    NdjsonEncoder,
+    UnsupportedWireFormat,
+    accepts_gzip,
+    negotiate,
+)
+
+BATCHES = [
+    {
+        "period": [datetime(2023, 1, 1, 0), datetime(2023, 1, 1, 1)],
+        "respondent": ["MISO", "MISO"],
+        "respondent_name": ["Midcontinent", "Midcontinent"],
+        "type": ["D", "D"],
+        "type_name": ["Demand", "Demand"],
+        "value": [100.0, 101.5],
+        "value_units": ["megawatthours", "megawatthours"],
+    },
+    {
+        "period": [datetime(2023, 1, 1, 2)],
+        "respondent": ["MISO"],
+        "respondent_name": ["Midcontinent"],
+        "type": ["D"],
+        "type_name": ["Demand"],
+        "value": [99.0],
+        "value_units": ["megawatthours"],
+    },
+]
+# 2023-01-01T00:00:00 as epoch seconds
+JAN_1 = 1672531200
+
+
+def encode(encoder) -> bytes:
+    return (
+        encoder.header()
+        + b"".join(encoder.encode(batch) for batch in BATCHES)
+        + encoder.footer()
+    )
+
+
+@pytest.mark.parametrize(
+    "accept, alias, expected",
+    [
+        (None, None, WireFormat.NDJSON),
+        ("text/html, */*", None, WireFormat.NDJSON),
+        ("application/msgpack", None, WireFormat.MSGPACK),
+        (
+            "text/html;q=0.9, application/vnd.apache.arrow.stream;q=0.8",
+            None,
+            WireFormat.ARROW,
+        ),
+        ("Application/MsgPack; q=1", None, WireFormat.MSGPACK),
+        # An explicit format wins over the Accept header
+        ("application/msgpack", "Arrow", WireFormat.ARROW),
+        ("application/msgpack", "ndjson", WireFormat.NDJSON),
+    ],
+)
+def test_negotiate_picks_the_requested_format(accept, alias, expected):
+    if expected is not WireFormat.NDJSON:
+        pytest.importorskip("msgpack" if expected is WireFormat.MSGPACK else "pyarrow")
+
+    wire_format, encoder = negotiate(accept, alias)
+
+    assert wire_format is expected
+    assert encoder is not negotiate(accept, alias)[1]
+
+
+def test_negotiate_refuses_unknown_formats():
+    with pytest.raises(UnsupportedWireFormat):
+        negotiate("application/x-ndjson", "csv")
+
+
+@pytest.mark.parametrize(
+    "accept_encoding, expected",
+    [
+        (None, False),
+        ("", False),
+        ("gzip", True),
+        ("deflate, GZIP;q=0.5, br", True),
+        ("gzip;q=0", False),
+        ("gzip; q=0.0", False),
+        ("deflate, br", False),
+        ("x-gzip", False),
+    ],
+)
+def test_accepts_gzip(accept_encoding, expected):
+    assert accepts_gzip(accept_encoding) is expected
+
+
+def test_ndjson_round_trip():
+    lines = encode(NdjsonEncoder()).splitlines()
+
+    decoded = [json.loads(line) for line in lines]
+    assert [batch["period"] for batch in decoded] == [
+        [JAN_1, JAN_1 + 3600],
+        [JAN_1 + 7200],
+    ]
+    assert decoded[0]["value"] == [100.0, 101.5]
+    assert decoded[1]["respondent"] == ["MISO"]
+
+
+def test_msgpack_round_trip():
+    msgpack = pytest.importorskip("msgpack")
+
+    unpacker = msgpack.Unpacker()
+    unpacker.feed(encode(MsgpackEncoder()))
+    decoded = list(unpacker)
+
+    assert [batch["period"] for batch in decoded] == [
+        [JAN_1, JAN_1 + 3600],
+        [JAN_1 + 7200],
+    ]
+    assert decoded[0]["value_units"] == ["megawatthours"] * 2
+
+
+def test_arrow_round_trip():
+    pa = pytest.importorskip("pyarrow")
+
+    reader = pa.ipc.open_stream(io.BytesIO(encode(ArrowEncoder())))
+    record_batches = list(reader)
+
+    assert [batch.num_rows for batch in record_batches] == [2, 1]
+    table = pa.Table.from_batches(record_batches).to_pydict()
+    assert table["period"] == [datetime(2023, 1, 1, hour) for hour in range(3)]
+    assert table["value"] == [100.0, 101.5, 99.0]
+
+
+def test_gzip_batches_decode_as_they_arrive():
+    stream = GzipStream()
+    decompressor = zlib.decompressobj(31)
+    encoder = NdjsonEncoder()
+
+    for batch in BATCHES:
+        # Each flushed chunk decodes without waiting for the rest of the stream
+        line = decompressor.decompress(stream.compress(encoder.encode(batch)))
+        assert json.loads(line)["value"] == batch["value"]
+    assert decompressor.decompress(stream.close()) == b""
+    assert decompressor.eof